@@ -0,0 +1,129 @@
+import hashlib
+import json
+import marshal
+import os
+import struct
+import sys
+import tempfile
+from datetime import datetime
+from typing import Any, Dict, Optional
+from pathlib import Path
+
+from Controller.config import config_manager
+from utils.logger import logger
+
+BUNDLE_FILE = "catalog.bundle"
+BUNDLE_MAGIC = b"SACB"
+BUNDLE_FORMAT = 2
+_HEADER = struct.Struct("<4sHHBB")  # magic, bundle format, marshal version, Python major and minor version
+
+# marshal data is only guaranteed to load in the Python version that wrote it
+_RUNTIME = (marshal.version, sys.version_info[0], sys.version_info[1])
+
+
+def bundle_path() -> Path:
+    return config_manager.get_functions_path() / BUNDLE_FILE
+
+
+def atomic_write_bytes(path: Path, data: bytes) -> None:
+    """Write a file through a temp file and a rename, so readers see either the old or the new file."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def source_checksum(catalogs: Dict[str, Any]) -> str:
+    """Checksum of the catalog contents, independent of how they are encoded."""
+    canonical = json.dumps(catalogs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def load_bundle(path: Optional[Path] = None) -> Optional[Dict[str, Any]]:
+    """
+    Load the catalog bundle, or None if it is missing. A bundle written in another format or by
+    another Python/marshal version, or one that does not load, is stale: it is rebuilt from the
+    JSON exports next to it (see rebuild_bundle).
+    """
+    path = Path(path) if path else bundle_path()
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        logger.warning(f"Could not read catalog bundle {path}: {e}", file=Path(__file__).name)
+        return None
+    try:
+        magic, bundle_format, *runtime = _HEADER.unpack_from(raw)
+        if magic != BUNDLE_MAGIC or bundle_format != BUNDLE_FORMAT or tuple(runtime) != _RUNTIME:
+            logger.warning("Catalog bundle %s was written by another format or Python version, rebuilding it", path, file=Path(__file__).name)
+            return rebuild_bundle(path)
+        bundle = marshal.loads(raw[_HEADER.size:])
+        if not isinstance(bundle, dict):
+            raise ValueError(f"unexpected {type(bundle).__name__} payload")
+        return bundle
+    except Exception as e:
+        logger.warning("Could not load catalog bundle %s, rebuilding it: %s", path, e, file=Path(__file__).name)
+        return rebuild_bundle(path)
+
+
+def rebuild_bundle(path: Optional[Path] = None) -> Optional[Dict[str, Any]]:
+    """
+    Replace a stale bundle with one built from the JSON exports in its directory. It holds no table
+    checksums, so the next catalog sync fetches every table again. Returns None if there are no
+    exports to build from or the bundle cannot be written.
+    """
+    path = Path(path) if path else bundle_path()
+    catalogs = {}
+    for json_path in sorted(path.parent.glob("*.json")):
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                catalogs[json_path.name] = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping {json_path.name} while rebuilding the catalog bundle: {e}", file=Path(__file__).name)
+    if not catalogs:
+        return None
+    try:
+        return write_bundle(catalogs, {}, path=path)
+    except OSError as e:
+        logger.error(f"Could not rebuild catalog bundle {path}: {e}", file=Path(__file__).name)
+        return None
+
+
+def write_bundle(catalogs: Dict[str, Any], checksums: Dict[str, Any], previous: Optional[Dict[str, Any]] = None,
+                 path: Optional[Path] = None) -> Dict[str, Any]:
+    """
+    Atomically write a new bundle holding every catalog (keyed by JSON file name) plus metadata:
+    an increasing version, the fetch time, the table checksums and a checksum of the contents.
+    """
+    # Normalize to what the JSON files hold (e.g. Decimal/datetime become strings)
+    catalogs = json.loads(json.dumps(catalogs, ensure_ascii=False, default=str))
+    bundle = {
+        "version": int((previous or {}).get("version", 0)) + 1,
+        "fetched_at": datetime.now().isoformat(timespec="seconds"),
+        "checksums": dict(checksums),
+        "source_checksum": source_checksum(catalogs),
+        "catalogs": catalogs,
+    }
+    data = _HEADER.pack(BUNDLE_MAGIC, BUNDLE_FORMAT, *_RUNTIME) + marshal.dumps(bundle)
+    atomic_write_bytes(Path(path) if path else bundle_path(), data)
+    logger.info(f"Wrote catalog bundle version {bundle['version']} ({len(data)} bytes)", file=Path(__file__).name)
+    return bundle
+
+
+def export_json(file_name: str, data: Any) -> None:
+    """Write one catalog as an indented JSON file under Functions/ for people to read."""
+    text = json.dumps(data, ensure_ascii=False, indent=4, default=str)
+    atomic_write_bytes(config_manager.get_functions_path() / file_name, text.encode("utf-8"))
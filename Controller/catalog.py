@@ -0,0 +1,151 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Optional
+from pathlib import Path
+
+from Controller.bundle import export_json, load_bundle, write_bundle
+from Controller.config import config_manager
+from Controller.repository import catalog_repository
+from Controller.mysql import (
+    open_mysql_connection, fetch_programs, fetch_group_policy, fetch_python_dependencies,
+    fetch_uninstall_programs, fetch_windows_settings, select_table_checksums
+)
+from utils.logger import logger
+
+# Catalog name -> (MySQL table, function that fetches and maps it, JSON file under Functions/)
+CATALOG_LOADERS = {
+    "programs": ("PROGRAMS", fetch_programs, "DependenciesWinget.json"),
+    "group_policy": ("POLICIES", fetch_group_policy, "GroupPolicy.json"),
+    "python_dependencies": ("PYTHON", fetch_python_dependencies, "PythonDependencies.json"),
+    "uninstall_programs": ("UNINSTALL_PROGRAMS", fetch_uninstall_programs, "UninstallPrograms.json"),
+    "windows_settings": ("WIN_SETTINGS", fetch_windows_settings, "WindowsSetting.json"),
+}
+
+
+def _load_json_export(file_name: str):
+    """The current JSON export of a catalog, used when the bundle does not hold it yet."""
+    try:
+        with open(config_manager.get_functions_path() / file_name, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class CatalogSync:
+    """Fetches all catalogs from MySQL concurrently, off the UI thread."""
+
+    def __init__(self, max_workers: int = len(CATALOG_LOADERS)):
+        self.max_workers = max_workers
+        self._thread: Optional[threading.Thread] = None
+        self.results: Dict[str, bool] = {}
+        self.done = threading.Event()
+
+    def sync(self, on_progress: Optional[Callable[[str, bool, int, int], None]] = None) -> Dict[str, bool]:
+        """
+        Open the MySQL connection if needed and fetch every changed catalog, each on its own pooled connection.
+        A catalog whose table checksum matches the local snapshot is neither queried nor rewritten.
+        `on_progress(name, ok, finished, total)` is called from the sync threads as catalogs arrive.
+        """
+        total = len(CATALOG_LOADERS)
+        results: Dict[str, bool] = {}
+        started = time.monotonic()
+        try:
+            open_mysql_connection()
+        except Exception as e:
+            logger.error(f"Catalog sync skipped, MySQL is not reachable: {e}", file=Path(__file__).name)
+            return {name: False for name in CATALOG_LOADERS}
+
+        previous = load_bundle() or {}
+        bundled = previous.get("catalogs", {})
+        stored = previous.get("checksums", {})
+        checksum_started = time.monotonic()
+        current = select_table_checksums([table for table, _, _ in CATALOG_LOADERS.values()])
+        logger.info(f"Read table checksums in {time.monotonic() - checksum_started:.2f}s", file=Path(__file__).name)
+
+        changed = []
+        for name, (table, _, json_file) in CATALOG_LOADERS.items():
+            checksum = current.get(table)
+            if checksum is not None and stored.get(table) == checksum and json_file in bundled:
+                results[name] = True
+                logger.info(f"Catalog '{name}' unchanged (checksum {checksum}), skipped", file=Path(__file__).name)
+                if on_progress:
+                    on_progress(name, True, len(results), total)
+            else:
+                changed.append(name)
+
+        def load(name):
+            loader_started = time.monotonic()
+            _, fetch, _ = CATALOG_LOADERS[name]
+            data = fetch()
+            return data, time.monotonic() - loader_started
+
+        fetched = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(load, name): name for name in changed}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    fetched[name], elapsed = future.result()
+                    results[name] = True
+                    logger.info(f"Catalog '{name}' synced in {elapsed:.2f}s", file=Path(__file__).name)
+                except Exception as e:
+                    results[name] = False
+                    logger.error(f"Catalog '{name}' sync failed: {e}", file=Path(__file__).name)
+                if on_progress:
+                    on_progress(name, results[name], len(results), total)
+
+        if fetched:
+            # Build the next bundle from the previous one plus everything fetched now
+            catalogs = dict(bundled)
+            checksums = {}
+            for name, (table, _, json_file) in CATALOG_LOADERS.items():
+                if name in fetched:
+                    catalogs[json_file] = fetched[name]
+                elif json_file not in catalogs:
+                    export = _load_json_export(json_file)
+                    if export is not None:
+                        catalogs[json_file] = export
+                # Remember checksums only for catalogs that are now up to date
+                if results.get(name) and current.get(table) is not None:
+                    checksums[table] = current[table]
+            try:
+                write_bundle(catalogs, checksums, previous)
+                for name in fetched:
+                    json_file = CATALOG_LOADERS[name][2]
+                    export_json(json_file, catalogs[json_file])
+            except Exception as e:
+                logger.error(f"Could not write catalog snapshot: {e}", file=Path(__file__).name)
+                for name in fetched:
+                    results[name] = False
+            catalog_repository.invalidate()
+
+        logger.info(
+            f"Catalog sync finished in {time.monotonic() - started:.2f}s ({len(changed)} changed, {total - len(changed)} unchanged)",
+            file=Path(__file__).name
+        )
+        return results
+
+    def start(self, on_progress=None, on_complete: Optional[Callable[[Dict[str, bool]], None]] = None) -> threading.Thread:
+        """Run sync() in a background thread and call `on_complete(results)` from it when done."""
+        self.done.clear()
+
+        def run():
+            try:
+                self.results = self.sync(on_progress)
+            except Exception as e:
+                logger.error(f"Catalog sync failed: {e}", file=Path(__file__).name)
+                self.results = {name: False for name in CATALOG_LOADERS}
+            finally:
+                self.done.set()
+            if on_complete:
+                on_complete(self.results)
+
+        self._thread = threading.Thread(target=run, name="CatalogSync", daemon=True)
+        self._thread.start()
+        return self._thread
+
+
+# Global instance
+catalog_sync = CatalogSync()
@@ -69,10 +69,71 @@ class ConfigManager:
         
         return {field: config[field] for field in required_fields}
     
+    def get_mysql_pool_size(self) -> int:
+        """Get the size of the MySQL connection pool."""
+        try:
+            return max(1, int(self.get_config().get('mysql_pool_size', 5)))
+        except (TypeError, ValueError):
+            return 5
+    
     def get_windows_key(self) -> str:
         """Get Windows activation key."""
         return self.get_config().get('windows_key', '')
     
+    def get_max_parallel_installs(self) -> int:
+        """Get how many winget packages may be processed at the same time."""
+        try:
+            return max(1, int(self.get_config().get('max_parallel_installs', 4)))
+        except (TypeError, ValueError):
+            return 4
+    
+    def get_powershell_hosts(self) -> int:
+        """Get how many PowerShell sessions may run commands at the same time."""
+        try:
+            return max(1, int(self.get_config().get('powershell_hosts', 3)))
+        except (TypeError, ValueError):
+            return 3
+    
+    def get_serialize_unknown_installers(self) -> bool:
+        """Whether packages of unknown installer type hold the "msi" resource, like MSI-based ones."""
+        return bool(self.get_config().get('serialize_unknown_installers', False))
+    
+    def get_retry_attempts(self) -> int:
+        """Get how many times a winget command that failed with a transient error is tried in total."""
+        try:
+            return max(1, int(self.get_config().get('retry_attempts', 3)))
+        except (TypeError, ValueError):
+            return 3
+    
+    def get_timeout_factor(self) -> float:
+        """Get the multiple of a command's historical p99 duration it may run before it is killed."""
+        try:
+            return max(1.0, float(self.get_config().get('timeout_factor', 3.0)))
+        except (TypeError, ValueError):
+            return 3.0
+
+    def get_log_json(self) -> bool:
+        """Whether the log is also written as JSON lines (app.log.jsonl)."""
+        return bool(self.get_config().get('log_json', False))
+    
+    def get_resume_after_reboot(self) -> bool:
+        """Whether an unfinished run is resumed automatically at the next logon (RunOnce)."""
+        return bool(self.get_config().get('resume_after_reboot', False))
+    
+    def get_prefetch_parallel_downloads(self) -> int:
+        """Get how many winget installers are downloaded at the same time."""
+        try:
+            return max(1, int(self.get_config().get('prefetch_parallel_downloads', 3)))
+        except (TypeError, ValueError):
+            return 3
+    
+    def get_wheelhouse_max_bytes(self) -> int:
+        """Get the size cap of the local Python wheelhouse (config value in MB)."""
+        try:
+            return max(1, int(self.get_config().get('wheelhouse_max_mb', 2048))) * 1024 * 1024
+        except (TypeError, ValueError):
+            return 2048 * 1024 * 1024
+    
     def get_computer_name(self) -> str:
         """Get computer name."""
         return self.get_data().get('Naziv računala', '')
@@ -0,0 +1,114 @@
+import random
+import subprocess
+import time
+from typing import Callable, Dict, Hashable, Optional, Tuple
+from pathlib import Path
+
+from Controller.config import config_manager
+from Controller.metrics import run_metrics
+from utils.logger import logger
+
+# What an exit code means for the task
+SUCCESS = "success"            # the command did what was asked
+ALREADY_DONE = "already done"  # nothing to do: installed already, not installed any more, ...
+TRANSIENT = "transient"        # may work if tried again shortly: download failed, another install running, ...
+PERMANENT = "permanent"        # trying again will not help
+
+# Seconds before the first retry of a transient failure; doubled for each further one, up to the cap
+RETRY_BASE_DELAY = 15.0
+RETRY_MAX_DELAY = 120.0
+
+# Codes common to the winget commands and the installers winget or the installer cache run.
+# winget codes are HRESULTs; cmd.exe reports them signed, Python unsigned, so they are stored
+# unsigned and looked up as such.
+_COMMON_CODES: Dict[int, str] = {
+    0: SUCCESS,
+    1641: SUCCESS,                 # MSI: installed, restart started
+    3010: SUCCESS,                 # MSI: installed, restart required
+    1618: TRANSIENT,               # MSI: another installation is in progress
+    0x8A150008: TRANSIENT,         # download failed
+    0x8A15000F: TRANSIENT,         # source data missing, source update needed
+    0x8A150101: TRANSIENT,         # package in use
+    0x8A150102: TRANSIENT,         # another installation is in progress
+    0x8A150103: TRANSIENT,         # file in use
+    0x8A150107: TRANSIENT,         # no network
+    0x8A150109: SUCCESS,           # installed, restart required to finish
+    0x8A150111: TRANSIENT,         # package in use by an application
+}
+
+# winget install
+WINGET_INSTALL_CODES: Dict[int, str] = {
+    **_COMMON_CODES,
+    0x8A15002B: ALREADY_DONE,      # no applicable update, the installed version is current
+    0x8A150054: ALREADY_DONE,
+    0x8A15010D: ALREADY_DONE,      # already installed
+    0x8A15010E: ALREADY_DONE,      # a newer version is installed
+}
+
+# winget uninstall
+WINGET_UNINSTALL_CODES: Dict[int, str] = {
+    **WINGET_INSTALL_CODES,
+    0x8A150014: ALREADY_DONE,      # no installed package found
+    0x8A150015: ALREADY_DONE,
+    0x8A150017: ALREADY_DONE,      # no manifest found
+    0x8A150035: ALREADY_DONE,
+}
+
+CODE_TABLES = {"install": WINGET_INSTALL_CODES, "uninstall": WINGET_UNINSTALL_CODES}
+
+
+def classify_exit_code(code: Optional[int], command: str = "install") -> str:
+    """SUCCESS, ALREADY_DONE, TRANSIENT or PERMANENT for the exit code of a winget `command` (install/uninstall)."""
+    if code is None:
+        return PERMANENT
+    return CODE_TABLES[command].get(code & 0xFFFFFFFF, PERMANENT)
+
+
+def succeeded(outcome: str) -> bool:
+    return outcome in (SUCCESS, ALREADY_DONE)
+
+
+def backoff_delay(attempt: int, base: float = RETRY_BASE_DELAY, cap: float = RETRY_MAX_DELAY, rng: random.Random = random) -> float:
+    """
+    Seconds to wait after failed attempt `attempt` (1-based): a random time up to base * 2^(attempt-1),
+    at most `cap` ("full jitter"), so retries of packages that failed together do not line up again.
+    """
+    return rng.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+_retry_sleep: Callable[[float], None] = time.sleep
+
+
+def set_retry_sleep(sleep: Callable[[float], None]) -> Callable[[float], None]:
+    """Replace how run_with_retry waits between attempts (e.g. scaled in a simulation); returns the previous function."""
+    global _retry_sleep
+    previous, _retry_sleep = _retry_sleep, sleep
+    return previous
+
+
+def run_with_retry(run: Callable[[], subprocess.CompletedProcess], command: str = "install", key: Optional[Hashable] = None,
+                   max_attempts: Optional[int] = None) -> Tuple[subprocess.CompletedProcess, str, int]:
+    """
+    Call `run()` until its exit code is not TRANSIENT or `max_attempts` (default: the retry_attempts
+    setting) is used up, waiting backoff_delay() between attempts. Returns (last result, its outcome,
+    attempts made). The exit code and attempts are noted in run_metrics under `key`.
+    A timeout (subprocess.TimeoutExpired) is not retried.
+    """
+    max_attempts = max(1, max_attempts if max_attempts is not None else config_manager.get_retry_attempts())
+    attempt = 0
+    while True:
+        attempt += 1
+        if key is not None:
+            run_metrics.note_attempts(key, attempt)
+        result = run()
+        outcome = classify_exit_code(result.returncode, command)
+        if key is not None:
+            run_metrics.note_exit_code(key, result.returncode)
+        if outcome != TRANSIENT or attempt >= max_attempts:
+            return result, outcome, attempt
+        delay = backoff_delay(attempt)
+        logger.warning(
+            "%s exited with %s (transient), attempt %d of %d; retrying in %.0f s",
+            key or "Command", result.returncode, attempt, max_attempts, delay, file=Path(__file__).name
+        )
+        _retry_sleep(delay)
@@ -0,0 +1,317 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from pathlib import Path
+
+from Controller.bundle import atomic_write_bytes
+from Controller.config import config_manager
+from Controller.exitcodes import classify_exit_code, succeeded
+from Controller.inventory import inventory
+from Controller.metrics import run_metrics
+from Controller.runner import get_command_runner
+from utils.logger import logger
+
+INSTALLER_CACHE_DIR = Path("Storage") / "installers"
+INDEX_FILE = "index.json"
+
+# Seconds one `winget download` may take
+DOWNLOAD_TIMEOUT = 900
+# Seconds an install waits for a prefetch download of its package before it downloads on its own
+LOOKUP_WAIT = 60
+
+# Switches winget itself uses for an installer type when the manifest gives none (its default
+# "silent with progress" mode, as `winget install` runs without --silent). Types not listed here
+# (msix, zip, portable, ...) and "exe" installers without manifest switches always go through winget.
+DEFAULT_SWITCHES = {
+    "msi": ["/passive", "/norestart"],
+    "wix": ["/passive", "/norestart"],
+    "burn": ["/passive", "/norestart"],
+    "inno": ["/SP-", "/SILENT", "/SUPPRESSMSGBOXES", "/NORESTART"],
+    "nullsoft": ["/S"],
+}
+MSIEXEC_TYPES = ("msi", "wix")
+
+
+def _yaml_scalar(value: str) -> str:
+    """A plain or quoted YAML scalar as text."""
+    if len(value) >= 2 and value[0] == value[-1] == "'":
+        return value[1:-1].replace("''", "'")
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+    return value
+
+
+def parse_installer_manifest(text: str) -> Dict[str, str]:
+    """
+    Read the fields of the (single installer) manifest written by `winget download` that are needed to
+    run the installer like winget does: {"type", "scope", "sha256", "silent", "silent_with_progress",
+    "custom"}. Values under the installer entry override the manifest-wide ones above it, as in winget;
+    missing fields are left out.
+    """
+    fields = {"InstallerType": "type", "Scope": "scope", "InstallerSha256": "sha256"}
+    switch_fields = {"Silent": "silent", "SilentWithProgress": "silent_with_progress", "Custom": "custom"}
+    info: Dict[str, str] = {}
+    switches_indent = None
+    for raw in (text or "").splitlines():
+        if not raw.strip() or raw.lstrip().startswith("#"):
+            continue
+        line = raw.replace("- ", "  ", 1) if raw.lstrip().startswith("- ") else raw
+        indent = len(line) - len(line.lstrip())
+        key, _, value = line.strip().partition(":")
+        value = _yaml_scalar(value.strip())
+        if switches_indent is not None and indent <= switches_indent:
+            switches_indent = None
+        if key == "InstallerSwitches" and not value:
+            switches_indent = indent
+        elif switches_indent is not None:
+            if key in switch_fields and value:
+                info[switch_fields[key]] = value
+        elif key in fields and value:
+            info[fields[key]] = value if key == "Scope" else value.lower()
+    return info
+
+
+def split_switches(text: str) -> List[str]:
+    """
+    Split installer switches into arguments the way a Windows program splits its command line
+    (CommandLineToArgvW): whitespace outside quotes separates arguments, quotes group and are removed,
+    and backslashes are literal unless they precede a quote. subprocess.list2cmdline is the inverse,
+    so `/DIR="C:\\Program Files\\App"` reaches the installer as the same argument.
+    """
+    args: List[str] = []
+    current: List[str] = []
+    in_argument = in_quotes = False
+    backslashes = 0
+    for char in text or "":
+        if char == "\\":
+            backslashes += 1
+            continue
+        if char == '"':
+            current.append("\\" * (backslashes // 2))
+            if backslashes % 2:
+                current.append('"')
+            else:
+                in_quotes = not in_quotes
+            backslashes = 0
+            in_argument = True
+            continue
+        current.append("\\" * backslashes)
+        backslashes = 0
+        if char in " \t" and not in_quotes:
+            if in_argument:
+                args.append("".join(current))
+            current, in_argument = [], False
+        else:
+            current.append(char)
+            in_argument = True
+    current.append("\\" * backslashes)
+    if in_argument or backslashes:
+        args.append("".join(current))
+    return args
+
+
+def silent_install_command(file: str, manifest: Dict[str, str]) -> Optional[List[str]]:
+    """
+    The arguments winget would run a downloaded installer with: the manifest's silent-with-progress
+    (else silent) switches or the type's defaults, its custom switches, and ALLUSERS=1 for machine-wide
+    MSI packages. None for installer types that cannot be run outside winget.
+    """
+    installer_type = manifest.get("type", "")
+    if installer_type not in DEFAULT_SWITCHES and installer_type != "exe":
+        return None
+    switches = manifest.get("silent_with_progress") or manifest.get("silent")
+    if switches:
+        args = split_switches(switches)
+    elif installer_type in DEFAULT_SWITCHES:
+        args = list(DEFAULT_SWITCHES[installer_type])
+    else:
+        return None
+    args += split_switches(manifest.get("custom", ""))
+    if installer_type in MSIEXEC_TYPES:
+        if manifest.get("scope") == "machine":
+            args.append("ALLUSERS=1")
+        return ["msiexec", "/i", file, *args]
+    return [file, *args]
+
+
+class InstallerCache:
+    """
+    Installers staged with `winget download` while the earlier phases run: the payload and the manifest
+    winget picked for this machine. The install phases look a package up here first and run the staged
+    installer with the manifest's switches (see silent_install_command); on a miss (not downloaded in
+    this run, installer type winget has to handle, bad hash) they fall back to `winget install`.
+    """
+
+    def __init__(self, path: Path = INSTALLER_CACHE_DIR):
+        self.path = Path(path)
+        self._index: Optional[Dict[str, Dict[str, Any]]] = None
+        self._in_flight: Dict[str, threading.Event] = {}
+        self._outcomes: Dict[str, str] = {}
+        # Packages downloaded by this run; older downloads may be an outdated version
+        self._fetched = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        if self._index is None:
+            try:
+                with open(self.path / INDEX_FILE, "r", encoding="utf-8") as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _save_index(self) -> None:
+        atomic_write_bytes(self.path / INDEX_FILE, json.dumps(self._index, indent=4).encode("utf-8"))
+
+    def prefetch_async(self, winget_ids: Iterable[str], runner=None) -> threading.Thread:
+        """Start downloading the installers of `winget_ids` in the background."""
+        self._thread = threading.Thread(target=self.prefetch, args=(list(winget_ids), runner), name="InstallerPrefetch", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def prefetch(self, winget_ids: Iterable[str], runner=None) -> Dict[str, bool]:
+        """Download the installers of all packages that are not installed yet, prefetch_parallel_downloads at a time."""
+        started = time.monotonic()
+        inventory.ensure_loaded(runner)
+        winget_ids = [winget_id for winget_id in dict.fromkeys(winget_ids) if not inventory.is_installed(winget_id)]
+        with ThreadPoolExecutor(max_workers=config_manager.get_prefetch_parallel_downloads()) as executor:
+            results = dict(zip(winget_ids, executor.map(lambda winget_id: self.fetch(winget_id, runner, prefetch=True), winget_ids)))
+        logger.info(
+            "Installer prefetch finished in %.1fs: %d/%d cached",
+            time.monotonic() - started, sum(results.values()), len(results), file=Path(__file__).name
+        )
+        return results
+
+    def fetch(self, winget_id: str, runner=None, prefetch: bool = False) -> bool:
+        """
+        Stage the installer of a package; True if it can be run from the cache. Does nothing while
+        another download of it is running, or (with `prefetch`) once the install phase looked it up.
+        """
+        with self._lock:
+            if winget_id in self._in_flight or (prefetch and winget_id in self._outcomes):
+                return False
+            done = self._in_flight[winget_id] = threading.Event()
+        try:
+            entry = self._download(winget_id, runner)
+            if entry is None:
+                return False
+            with self._lock:
+                self._load_index()[winget_id] = entry
+                self._fetched.add(winget_id)
+                self._save_index()
+            return True
+        except Exception as e:
+            logger.warning("Downloading the installer of %s failed: %s", winget_id, e, file=Path(__file__).name)
+            return False
+        finally:
+            with self._lock:
+                self._in_flight.pop(winget_id, None)
+            done.set()
+
+    def _download(self, winget_id: str, runner=None) -> Optional[Dict[str, Any]]:
+        runner = runner or get_command_runner()
+        target = self.path / winget_id
+        partial = self.path / f"{winget_id}.part"
+        shutil.rmtree(partial, ignore_errors=True)
+        started = time.monotonic()
+        result = runner.run(
+            ["winget", "download", "--id", winget_id, "--exact", "--download-directory", str(partial),
+             "--accept-source-agreements", "--accept-package-agreements", "--disable-interactivity"],
+            timeout=DOWNLOAD_TIMEOUT
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"winget download exited with {result.returncode}")
+        files = sorted(path for path in partial.iterdir() if path.is_file())
+        manifests = [path for path in files if path.suffix.lower() in (".yaml", ".yml")]
+        installers = [path for path in files if path not in manifests]
+        if len(manifests) != 1 or len(installers) != 1:
+            raise RuntimeError(f"unexpected download contents: {[path.name for path in files]}")
+        manifest = parse_installer_manifest(manifests[0].read_text(encoding="utf-8-sig"))
+        if silent_install_command(str(installers[0]), manifest) is None:
+            logger.debug("Not caching %s: installer type %s is installed through winget", winget_id, manifest.get("type") or "unknown", file=Path(__file__).name)
+            shutil.rmtree(partial, ignore_errors=True)
+            return None
+        digest = hashlib.sha256()
+        with open(installers[0], "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        if manifest.get("sha256") and digest.hexdigest() != manifest["sha256"]:
+            shutil.rmtree(partial, ignore_errors=True)
+            raise ValueError("sha256 mismatch")
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(partial, target)
+        size = (target / installers[0].name).stat().st_size
+        logger.info("Prefetched %s (%d bytes in %.1fs)", winget_id, size, time.monotonic() - started, file=Path(__file__).name)
+        return {
+            "file": f"{winget_id}/{installers[0].name}", "manifest": manifest, "type": manifest.get("type", ""),
+            "sha256": digest.hexdigest(), "size": size, "fetched_at": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    def _verify(self, entry: Dict[str, Any]) -> bool:
+        path = self.path / entry["file"]
+        try:
+            if path.stat().st_size != entry["size"]:
+                return False
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            return digest.hexdigest() == entry["sha256"]
+        except OSError:
+            return False
+
+    def lookup(self, winget_id: str, wait: float = LOOKUP_WAIT) -> Optional[Dict[str, Any]]:
+        """
+        The verified cache entry of a package downloaded in this run, or None. Waits up to `wait`
+        seconds for a download of it that is already running; records the lookup as a hit or a miss.
+        """
+        with self._lock:
+            done = self._in_flight.get(winget_id)
+        if done is not None and not done.wait(wait):
+            logger.warning("Download of %s still running after %.0fs, installing without the cache", winget_id, wait, file=Path(__file__).name)
+        with self._lock:
+            entry = self._load_index().get(winget_id) if winget_id in self._fetched else None
+        hit = entry is not None and self._verify(entry)
+        with self._lock:
+            self._outcomes[winget_id] = "hit" if hit else "miss"
+        logger.info("Installer cache %s for %s", "hit" if hit else "miss", winget_id, file=Path(__file__).name)
+        return entry if hit else None
+
+    def install(self, winget_id: str, entry: Dict[str, Any], runner=None, timeout: float = 600) -> bool:
+        """Run a cached installer with the switches from its manifest, as winget would."""
+        runner = runner or get_command_runner()
+        command = silent_install_command(str((self.path / entry["file"]).resolve()), entry["manifest"])
+        result = runner.run(command, timeout=timeout)
+        run_metrics.note_exit_code(winget_id, result.returncode)
+        # A failure, transient or not, falls back to winget install, which retries transient ones
+        if not succeeded(classify_exit_code(result.returncode)):
+            logger.warning("Cached installer of %s exited with %s", winget_id, result.returncode, file=Path(__file__).name)
+            return False
+        return True
+
+    def task_summary(self, winget_ids: Iterable[str]) -> Tuple[int, int]:
+        """(hits, misses) of the cache lookups made for these packages."""
+        with self._lock:
+            outcomes = [self._outcomes.get(winget_id) for winget_id in winget_ids]
+        return outcomes.count("hit"), outcomes.count("miss")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            outcomes = list(self._outcomes.values())
+        return {"hits": outcomes.count("hit"), "misses": outcomes.count("miss")}
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._outcomes = {}
+
+
+# Global instance shared by the prefetch and the install phases
+installer_cache = InstallerCache()
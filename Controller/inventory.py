@@ -0,0 +1,171 @@
+import json
+import os
+import re
+import subprocess
+import tempfile
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Sequence
+from pathlib import Path
+
+from Controller.runner import get_command_runner
+from utils.logger import logger
+
+
+def parse_winget_export(text: str) -> Dict[str, str]:
+    """Parse the JSON written by `winget export --include-versions` into an ID -> version index."""
+    data = json.loads(text or "{}")
+    index: Dict[str, str] = {}
+    for source in data.get("Sources", []):
+        for package in source.get("Packages", []):
+            package_id = package.get("PackageIdentifier")
+            if package_id:
+                index[package_id] = package.get("Version") or ""
+    return index
+
+
+def _display_width(char: str) -> int:
+    """Terminal columns a character takes: two for East Asian wide characters, as winget pads them."""
+    return 2 if unicodedata.east_asian_width(char) in ("W", "F") else 1
+
+
+def _split_columns(line: str, starts: Sequence[int]) -> List[str]:
+    """Cut a table line at the given display columns (not character indexes)."""
+    cells = [""] * len(starts)
+    column = 0
+    for char in line:
+        cell = sum(1 for start in starts if start <= column) - 1
+        if cell >= 0:
+            cells[cell] += char
+        column += _display_width(char)
+    return [cell.strip() for cell in cells]
+
+
+def parse_winget_list(text: str) -> Dict[str, str]:
+    """
+    Parse the table printed by `winget list` into an ID -> version index.
+    Columns are located from the header above the dashed separator line, so localized headers work too.
+    winget pads the columns by display width, so positions are counted in terminal columns: a name with
+    wide (e.g. CJK) characters takes fewer characters than its column is wide.
+    """
+    # winget draws its progress spinner with carriage returns before the table
+    lines = [line.rsplit('\r', 1)[-1].rstrip() for line in (text or "").splitlines()]
+    index: Dict[str, str] = {}
+    separator = next((i for i, line in enumerate(lines) if line and set(line) == {'-'}), None)
+    if separator is None or separator == 0:
+        return index
+    header = lines[separator - 1]
+    columns = [sum(_display_width(char) for char in header[:match.start()]) for match in re.finditer(r'\S+', header)]
+    if len(columns) < 3:
+        return index
+    # Name, Id, Version and (if present) everything after it
+    starts = columns[:4]
+    for line in lines[separator + 1:]:
+        if not line.strip():
+            continue
+        cells = _split_columns(line, starts)
+        package_id, version = cells[1], cells[2]
+        # Truncated IDs ("Microsoft.VisualStudio…") can never match a catalog entry
+        if not package_id or ' ' in package_id or package_id.endswith('…'):
+            continue
+        index[package_id] = version.split(' ')[0] if version else ""
+    return index
+
+
+class InventoryIndex:
+    """Snapshot of the packages winget reports as installed, indexed by package ID."""
+
+    def __init__(self):
+        self._versions: Dict[str, str] = {}
+        self._pending_refresh = set()
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def ensure_loaded(self, runner=None) -> None:
+        """Take the inventory snapshot once per run."""
+        with self._lock:
+            if self.loaded:
+                return
+            self._versions = {package_id.lower(): version for package_id, version in self._snapshot(runner).items()}
+            self.loaded = True
+            logger.info(f"Winget inventory loaded with {len(self._versions)} packages", file=Path(__file__).name)
+
+    def invalidate(self) -> None:
+        """Drop the snapshot so the next run takes a fresh one."""
+        with self._lock:
+            self._versions = {}
+            self.loaded = False
+
+    def is_installed(self, winget_id: str) -> bool:
+        with self._lock:
+            return winget_id.lower() in self._versions
+
+    def get_version(self, winget_id: str) -> Optional[str]:
+        with self._lock:
+            return self._versions.get(winget_id.lower())
+
+    def record_install(self, winget_id: str, version: str = "") -> None:
+        """Mark a package as installed without asking winget again; its version is read on the next refresh."""
+        with self._lock:
+            self._versions.setdefault(winget_id.lower(), version)
+            self._pending_refresh.add(winget_id)
+
+    def refresh(self, winget_ids: Iterable[str], runner=None) -> None:
+        """Re-read only the given packages and update their entries in the index."""
+        runner = runner or get_command_runner()
+        for winget_id in winget_ids:
+            try:
+                result = runner.run(
+                    ["winget", "list", "--id", winget_id, "--exact", "--accept-source-agreements", "--disable-interactivity"],
+                    timeout=120
+                )
+            except subprocess.TimeoutExpired:
+                logger.warning(f"Refreshing inventory for {winget_id} timed out", file=Path(__file__).name)
+                continue
+            found = {package_id.lower(): version for package_id, version in parse_winget_list(result.stdout).items()}
+            with self._lock:
+                if winget_id.lower() in found:
+                    self._versions[winget_id.lower()] = found[winget_id.lower()]
+                else:
+                    self._versions.pop(winget_id.lower(), None)
+
+    def refresh_pending_async(self, runner=None) -> None:
+        """Refresh the packages installed since the last refresh, in the background."""
+        with self._lock:
+            winget_ids, self._pending_refresh = sorted(self._pending_refresh), set()
+        if winget_ids:
+            threading.Thread(target=self.refresh, args=(winget_ids, runner), daemon=True).start()
+
+    @staticmethod
+    def _snapshot(runner=None) -> Dict[str, str]:
+        """Read the installed packages from `winget export`, falling back to `winget list`."""
+        runner = runner or get_command_runner()
+        fd, export_path = tempfile.mkstemp(suffix=".json", prefix="winget_export_")
+        os.close(fd)
+        try:
+            runner.run(
+                ["winget", "export", "-o", export_path, "--include-versions", "--accept-source-agreements", "--disable-interactivity"],
+                timeout=180
+            )
+            with open(export_path, "r", encoding="utf-8-sig") as f:
+                text = f.read()
+            if text.strip():
+                return parse_winget_export(text)
+        except Exception as e:
+            logger.warning(f"winget export failed, falling back to winget list: {e}", file=Path(__file__).name)
+        finally:
+            try:
+                os.remove(export_path)
+            except OSError:
+                pass
+        try:
+            # The whole list is parsed, so keep all of the output
+            result = runner.run(["winget", "list", "--accept-source-agreements", "--disable-interactivity"], timeout=180, max_lines=None)
+            return parse_winget_list(result.stdout)
+        except Exception as e:
+            logger.error(f"Could not read winget inventory: {e}", file=Path(__file__).name)
+            return {}
+
+
+# Global instance shared by the install phases
+inventory = InventoryIndex()
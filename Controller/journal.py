@@ -0,0 +1,211 @@
+import json
+import os
+import subprocess
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from pathlib import Path
+
+from Controller.bundle import atomic_write_bytes
+from Controller.powershell import get_powershell_host
+from Controller.registry import _ps_quote
+from Controller.repository import content_digest
+from utils.logger import logger
+
+JOURNAL_FILE = Path("Storage") / "checkpoint.jsonl"
+
+# Task statuses that count as completed work; anything else is run again on resume
+DONE_STATUSES = ("success", "already compliant")
+
+# An unfinished run registers itself here to be started again at the next logon
+RUN_ONCE_KEY = r"HKLM:\Software\Microsoft\Windows\CurrentVersion\RunOnce"
+RUN_ONCE_NAME = "ProvisioningResume"
+
+
+class CheckpointJournal:
+    """
+    Journal of the current run on this machine, one JSON record per line, flushed to disk as each
+    task completes so it survives reboots, crashes and a closed window. A run can be resumed until
+    its "finished" record is written: tasks whose catalog entry is unchanged since they completed
+    are skipped, and so are phases whose catalog is unchanged since all of their tasks completed.
+    Until begin() is called the journal is inactive, so nothing is skipped or written.
+    """
+
+    def __init__(self, path: Path = JOURNAL_FILE):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._file = None
+        self.active = False
+        self.resumed = False
+        self.relaunch_registered = False
+        # (phase, task) -> digest of the catalog entry it completed with
+        self._tasks: Dict[Tuple[str, str], str] = {}
+        # phase -> (catalog version, task names) once every task of the phase completed
+        self._phases: Dict[str, Tuple[Optional[str], List[str]]] = {}
+
+    def _read(self) -> List[Dict[str, Any]]:
+        records = []
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # A line torn by a power loss; the task is simply run again
+                        continue
+        except OSError:
+            pass
+        return records
+
+    @staticmethod
+    def _is_unfinished(records: List[Dict[str, Any]]) -> bool:
+        return bool(records) and records[0].get("record") == "run" and not any(record.get("record") == "finished" for record in records)
+
+    def unfinished_run(self) -> Optional[Dict[str, Any]]:
+        """The start record (computer, started) of the journaled run if it has not finished, else None."""
+        records = self._read()
+        return records[0] if self._is_unfinished(records) else None
+
+    def begin(self, computer: str, resume: bool = False, relaunch: Optional[Sequence[str]] = None) -> bool:
+        """
+        Start journaling a run. With `resume`, an unfinished run of the same computer is continued;
+        otherwise (or if there is none) the journal starts over. With `relaunch` (a command line), the
+        run is started again at the next logon until it finishes. Returns whether a run is resumed.
+        """
+        with self._lock:
+            self._close()
+            self._tasks, self._phases = {}, {}
+            records = self._read() if resume else []
+            self.resumed = self._is_unfinished(records) and records[0].get("computer") == computer
+            if self.resumed:
+                for record in records:
+                    if record.get("record") == "task":
+                        self._tasks[(record["phase"], record["task"])] = record["entry"]
+                    elif record.get("record") == "phase":
+                        self._phases[record["phase"]] = (record.get("catalog"), record["tasks"])
+                records.append({"record": "resumed", "ts": _now()})
+            else:
+                records = [{"record": "run", "computer": computer, "started": _now()}]
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                # Rewritten without torn lines, so appended records start on a line of their own
+                atomic_write_bytes(self.path, "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode("utf-8"))
+                self._file = open(self.path, "a", encoding="utf-8")
+                self.active = True
+            except OSError as e:
+                logger.error(f"Checkpoint journal unavailable, this run cannot be resumed: {e}", file=Path(__file__).name)
+                self.active = False
+        if self.resumed:
+            logger.info(
+                "Resuming the run started %s: %d tasks and %d phases already completed",
+                records[0].get("started"), len(self._tasks), len(self._phases), file=Path(__file__).name
+            )
+        if relaunch and self.active:
+            self.relaunch_registered = register_relaunch(relaunch)
+        return self.resumed
+
+    def is_done(self, phase: str, task: str, entry: Any) -> bool:
+        """Whether the task completed earlier in this run with the same catalog entry."""
+        if not self.active:
+            return False
+        with self._lock:
+            digest = self._tasks.get((phase, task))
+        return digest is not None and digest == content_digest(entry)
+
+    def task_done(self, phase: str, task: str, entry: Any, status: str, catalog_version: Optional[str] = None) -> None:
+        """Record a finished task; only completed ones (see DONE_STATUSES) are skipped on resume."""
+        if not self.active or status not in DONE_STATUSES:
+            return
+        digest = content_digest(entry)
+        with self._lock:
+            self._tasks[(phase, task)] = digest
+            self._append({"record": "task", "phase": phase, "task": task, "entry": digest, "catalog": catalog_version, "status": status, "ts": _now()})
+
+    def completed_phase(self, phase: str, catalog_version: Optional[str]) -> Optional[List[str]]:
+        """The task names of a phase that completed earlier in this run with the same catalog, else None."""
+        if not self.active:
+            return None
+        with self._lock:
+            completed = self._phases.get(phase)
+        if completed is None or completed[0] != catalog_version:
+            return None
+        return list(completed[1])
+
+    def phase_done(self, phase: str, catalog_version: Optional[str], tasks: Sequence[str]) -> bool:
+        """Record a phase as completed if every one of its tasks is. Returns whether it was."""
+        if not self.active:
+            return False
+        with self._lock:
+            if not tasks or not all((phase, task) in self._tasks for task in tasks):
+                return False
+            self._phases[phase] = (catalog_version, list(tasks))
+            self._append({"record": "phase", "phase": phase, "catalog": catalog_version, "tasks": list(tasks), "ts": _now()})
+        return True
+
+    def finish(self, complete: bool = True) -> None:
+        """
+        Stop journaling. A complete run is marked as finished, so it is not resumed; one with failed
+        tasks stays resumable, so running it again only repeats what did not complete.
+        """
+        if not self.active:
+            return
+        with self._lock:
+            self._append({"record": "finished" if complete else "ended", "ts": _now()})
+            self._close()
+            self.active = False
+        if self.relaunch_registered:
+            unregister_relaunch()
+            self.relaunch_registered = False
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        # Called with the lock held
+        if self._file is None:
+            return
+        try:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not write to the checkpoint journal: {e}", file=Path(__file__).name)
+
+    def _close(self) -> None:
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def register_relaunch(command: Sequence[str]) -> bool:
+    """Start `command` (in the current directory) once at the next logon. Windows only."""
+    if os.name != "nt":
+        return False
+    command_line = f'cmd /c cd /d "{os.getcwd()}" && {subprocess.list2cmdline(list(command))}'
+    script = f"Set-ItemProperty -Path {_ps_quote(RUN_ONCE_KEY)} -Name {_ps_quote(RUN_ONCE_NAME)} -Value {_ps_quote(command_line)} -Type String -Force"
+    try:
+        result = get_powershell_host().run(script, timeout=60)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr)
+    except Exception as e:
+        logger.error(f"Could not register the run to resume after a reboot: {e}", file=Path(__file__).name)
+        return False
+    logger.info("The run resumes at the next logon: %s", command_line, file=Path(__file__).name)
+    return True
+
+
+def unregister_relaunch() -> None:
+    """Remove the RunOnce entry of a run that finished without a reboot."""
+    script = f"Remove-ItemProperty -Path {_ps_quote(RUN_ONCE_KEY)} -Name {_ps_quote(RUN_ONCE_NAME)} -ErrorAction SilentlyContinue"
+    try:
+        get_powershell_host().run(script, timeout=60)
+    except Exception as e:
+        logger.warning(f"Could not remove the resume entry from RunOnce: {e}", file=Path(__file__).name)
+
+
+# Global instance for the current run
+checkpoint_journal = CheckpointJournal()
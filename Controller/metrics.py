@@ -0,0 +1,246 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+from pathlib import Path
+
+from Controller.bundle import atomic_write_bytes
+from utils.logger import logger
+
+METRICS_FILE = Path("Storage") / "metrics.prom"
+
+# Upper bounds (seconds) of the task and phase duration histograms
+DURATION_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+
+
+class Histogram:
+    """Cumulative duration histogram in the Prometheus layout (bucket counts include all smaller buckets)."""
+
+    def __init__(self, buckets: Sequence[float] = DURATION_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+@dataclass
+class TaskRecord:
+    """One finished task. Times are Unix timestamps, the duration is measured with a monotonic clock."""
+    phase: str
+    task: str
+    started: float
+    finished: float
+    duration: float
+    status: str
+    exit_code: Optional[int] = None
+    attempt: int = 1
+
+    @property
+    def duration_ms(self) -> int:
+        return int(round(self.duration * 1000))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def format_duration(seconds: float) -> str:
+    """1:05 style for the completion dialog; hours when needed."""
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+class RunMetrics:
+    """
+    Start/end time, exit code and attempt of every task and phase of a run, with per-phase duration
+    histograms. Exported as a Prometheus textfile (node_exporter textfile collector format) each time
+    a phase ends.
+    """
+
+    def __init__(self, path: Path = METRICS_FILE, buckets: Sequence[float] = DURATION_BUCKETS):
+        self.path = Path(path)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget the previous run."""
+        with self._lock:
+            self.run_started = time.time()
+            self._running: Dict[Tuple[str, str], Tuple[float, float]] = {}
+            self._exit_codes: Dict[Hashable, Optional[int]] = {}
+            self._attempts: Dict[Hashable, int] = {}
+            self.tasks: List[TaskRecord] = []
+            self.phases: Dict[str, Tuple[float, float, bool]] = {}
+            self.task_histograms: Dict[str, Histogram] = {}
+            self.phase_histogram = Histogram(self.buckets)
+
+    def task_started(self, phase: str, task: str) -> None:
+        with self._lock:
+            self._running[(phase, task)] = (time.time(), time.monotonic())
+
+    def task_finished(self, phase: str, task: str, status: str, exit_code: Optional[int] = None, attempt: int = 1) -> TaskRecord:
+        """Record the end of a task; a task that was never started gets a zero duration."""
+        now, now_monotonic = time.time(), time.monotonic()
+        with self._lock:
+            started, started_monotonic = self._running.pop((phase, task), (now, now_monotonic))
+            record = TaskRecord(phase, task, started, now, now_monotonic - started_monotonic, status, exit_code, attempt)
+            self.tasks.append(record)
+            self.task_histograms.setdefault(phase, Histogram(self.buckets)).observe(record.duration)
+        return record
+
+    def note_exit_code(self, key: Hashable, exit_code: Optional[int]) -> None:
+        """Remember the exit code of a command run for `key` (e.g. a winget ID) until the task ends."""
+        with self._lock:
+            self._exit_codes[key] = exit_code
+
+    def exit_code_of(self, keys: Iterable[Hashable]) -> Optional[int]:
+        """The exit code that describes a task made of several commands: the first non-zero one, else the last one."""
+        with self._lock:
+            codes = [self._exit_codes[key] for key in keys if key in self._exit_codes]
+        failing = [code for code in codes if code not in (0, None)]
+        if failing:
+            return failing[0]
+        return codes[-1] if codes else None
+
+    def note_attempts(self, key: Hashable, attempts: int) -> None:
+        """Remember how many attempts the command run for `key` has taken so far."""
+        with self._lock:
+            self._attempts[key] = attempts
+
+    def attempts_of(self, keys: Iterable[Hashable]) -> int:
+        """Attempts of a task made of several commands: those of the command tried most often."""
+        with self._lock:
+            return max([self._attempts[key] for key in keys if key in self._attempts], default=1)
+
+    def phase_finished(self, phase: str, started: float, duration: float, ok: bool) -> None:
+        """Record the end of a phase and write the textfile."""
+        with self._lock:
+            self.phases[phase] = (started, duration, ok)
+            self.phase_histogram.observe(duration)
+        self.write_textfile()
+
+    def succeeded(self) -> bool:
+        """Whether no task and no phase of the run failed so far."""
+        with self._lock:
+            return all(record.status != 'failure' for record in self.tasks) and all(ok for _, _, ok in self.phases.values())
+
+    def render(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        with self._lock:
+            tasks = list(self.tasks)
+            phases = dict(self.phases)
+            task_histograms = dict(self.task_histograms)
+            phase_histogram = self.phase_histogram
+            run_started = self.run_started
+        lines = [
+            "# HELP provisioning_run_start_timestamp_seconds Start of the provisioning run.",
+            "# TYPE provisioning_run_start_timestamp_seconds gauge",
+            f"provisioning_run_start_timestamp_seconds {run_started:.3f}",
+            "# HELP provisioning_task_duration_seconds Task durations per phase.",
+            "# TYPE provisioning_task_duration_seconds histogram",
+        ]
+        for phase, histogram in sorted(task_histograms.items()):
+            lines.extend(self._histogram_lines("provisioning_task_duration_seconds", histogram, phase=phase))
+        lines += [
+            "# HELP provisioning_tasks_total Finished tasks per phase and status.",
+            "# TYPE provisioning_tasks_total counter",
+        ]
+        totals: Dict[Tuple[str, str], int] = {}
+        for record in tasks:
+            totals[(record.phase, record.status)] = totals.get((record.phase, record.status), 0) + 1
+        for (phase, status), count in sorted(totals.items()):
+            lines.append(f"provisioning_tasks_total{_labels(phase=phase, status=status)} {count}")
+        lines += [
+            "# HELP provisioning_task_last_duration_seconds Duration of the last run of each task.",
+            "# TYPE provisioning_task_last_duration_seconds gauge",
+        ]
+        last = {(record.phase, record.task): record for record in tasks}
+        for (phase, task), record in sorted(last.items()):
+            lines.append(f"provisioning_task_last_duration_seconds{_labels(phase=phase, task=task, status=record.status)} {record.duration:.3f}")
+        lines += [
+            "# HELP provisioning_task_exit_code Exit code of the last run of each task (left out when no command ran or it timed out).",
+            "# TYPE provisioning_task_exit_code gauge",
+        ]
+        for (phase, task), record in sorted(last.items()):
+            if record.exit_code is not None:
+                lines.append(f"provisioning_task_exit_code{_labels(phase=phase, task=task)} {record.exit_code}")
+        lines += [
+            "# HELP provisioning_task_attempts Attempts of the last run of each task.",
+            "# TYPE provisioning_task_attempts gauge",
+        ]
+        for (phase, task), record in sorted(last.items()):
+            lines.append(f"provisioning_task_attempts{_labels(phase=phase, task=task)} {record.attempt}")
+        lines += [
+            "# HELP provisioning_phase_duration_seconds Duration of each phase.",
+            "# TYPE provisioning_phase_duration_seconds gauge",
+        ]
+        for phase, (_, duration, _) in sorted(phases.items()):
+            lines.append(f"provisioning_phase_duration_seconds{_labels(phase=phase)} {duration:.3f}")
+        lines += [
+            "# HELP provisioning_phase_success Whether each phase succeeded (1) or failed (0).",
+            "# TYPE provisioning_phase_success gauge",
+        ]
+        for phase, (_, _, ok) in sorted(phases.items()):
+            lines.append(f"provisioning_phase_success{_labels(phase=phase)} {1 if ok else 0}")
+        lines += [
+            "# HELP provisioning_phase_duration_histogram_seconds Phase durations.",
+            "# TYPE provisioning_phase_duration_histogram_seconds histogram",
+        ]
+        lines.extend(self._histogram_lines("provisioning_phase_duration_histogram_seconds", phase_histogram))
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _histogram_lines(name: str, histogram: Histogram, **labels) -> List[str]:
+        lines = [
+            f"{name}_bucket{_labels(**labels, le=bound)} {count}"
+            for bound, count in zip(histogram.buckets, histogram.counts)
+        ]
+        lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {histogram.count}")
+        lines.append(f"{name}_sum{_labels(**labels) if labels else ''} {histogram.sum:.3f}")
+        lines.append(f"{name}_count{_labels(**labels) if labels else ''} {histogram.count}")
+        return lines
+
+    def write_textfile(self) -> None:
+        """Write the textfile atomically, so a collector never reads half of it."""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_bytes(self.path, self.render().encode("utf-8"))
+        except OSError as e:
+            logger.error(f"Could not write metrics to {self.path}: {e}", file=Path(__file__).name)
+
+    def summary(self, slowest: int = 5) -> str:
+        """Short text for the completion dialog: totals, phase durations and the slowest tasks."""
+        with self._lock:
+            tasks = list(self.tasks)
+            phases = dict(self.phases)
+        succeeded = sum(1 for record in tasks if record.status != 'failure')
+        failed = len(tasks) - succeeded
+        lines = [f"Zadaci: {succeeded} uspješno, {failed} neuspješno, ukupno {format_duration(time.time() - self.run_started)}"]
+        if phases:
+            lines.append("Faze: " + ", ".join(
+                f"{phase} {format_duration(duration)}{'' if ok else ' (greška)'}"
+                for phase, (_, duration, ok) in sorted(phases.items(), key=lambda item: item[1][0])
+            ))
+        if tasks:
+            lines.append("Najsporiji zadaci:")
+            for record in sorted(tasks, key=lambda record: record.duration, reverse=True)[:slowest]:
+                lines.append(f"  {record.task} ({record.phase}) {format_duration(record.duration)}")
+        return "\n".join(lines)
+
+
+# Global instance for the current run
+run_metrics = RunMetrics()
@@ -1,20 +1,84 @@
-import json
+import threading
+import time
 import mysql.connector
 from mysql.connector import pooling
 from typing import Dict, List, Optional, Any
 from contextlib import contextmanager
 from pathlib import Path
 
+from Controller.bundle import export_json
 from Controller.config import config_manager
+from Controller.reports import ReportSink
+from Controller.spool import ReportSpool
 from utils.logger import logger
 
-_mysql_conn = None  # Private global connection
 _mysql_pool = None  # Connection pool<
+_pool_slots = None  # Limits checkouts to the size of the pool
+_pool_stats_lock = threading.Lock()
+_pool_stats = {"size": 0, "in_use": 0, "peak_in_use": 0, "checkouts": 0, "waits": 0, "wait_seconds": 0.0, "timeouts": 0, "reconnects": 0}
 
-def open_mysql_connection():
-    global _mysql_conn, _mysql_pool
-    if _mysql_conn is not None:
-        return _mysql_conn
+@contextmanager
+def checkout_connection(timeout: float = 10.0):
+    """
+    Check a connection out of the pool for one operation and return it afterwards.
+    Stale connections are reconnected on checkout; if the pool is exhausted, waits up to `timeout` seconds.
+    """
+    pool, slots = _mysql_pool, _pool_slots
+    if pool is None or slots is None:
+        raise RuntimeError("MySQL connection is not open.")
+    started = time.monotonic()
+    if not slots.acquire(blocking=False):
+        with _pool_stats_lock:
+            _pool_stats["waits"] += 1
+        if not slots.acquire(timeout=timeout):
+            with _pool_stats_lock:
+                _pool_stats["timeouts"] += 1
+            raise TimeoutError(f"No MySQL connection became free within {timeout} seconds")
+    connection = None
+    try:
+        connection = pool.get_connection()
+        if not connection.is_connected():
+            connection.reconnect(attempts=2, delay=1)
+            with _pool_stats_lock:
+                _pool_stats["reconnects"] += 1
+        with _pool_stats_lock:
+            _pool_stats["checkouts"] += 1
+            _pool_stats["wait_seconds"] += time.monotonic() - started
+            _pool_stats["in_use"] += 1
+            _pool_stats["peak_in_use"] = max(_pool_stats["peak_in_use"], _pool_stats["in_use"])
+        try:
+            yield connection
+        finally:
+            with _pool_stats_lock:
+                _pool_stats["in_use"] -= 1
+    finally:
+        if connection is not None:
+            try:
+                connection.close()  # Returns the connection to the pool
+            except Exception as e:
+                logger.warning(f"Error returning MySQL connection to the pool: {e}", file=Path(__file__).name)
+        slots.release()
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Pool utilization metrics of checkout_connection."""
+    with _pool_stats_lock:
+        stats = dict(_pool_stats)
+    stats["utilization"] = stats["in_use"] / stats["size"] if stats["size"] else 0.0
+    return stats
+
+_report_sink = ReportSink(  # Batched REPORT writer with an offline spool
+    checkout_connection,
+    spool=ReportSpool(Path("Storage") / "report_spool.sqlite3")
+)
+
+def open_mysql_connection() -> bool:
+    """
+    Open the connection pool used by checkout_connection. Returns False if it was already open.
+    Raises if the configuration is incomplete or the database cannot be reached.
+    """
+    global _mysql_pool, _pool_slots
+    if _mysql_pool is not None:
+        return False
     
     try:
         mysql_config = config_manager.get_mysql_config()
@@ -23,7 +87,7 @@ def open_mysql_connection():
         # Create connection pool for better performance
         pool_config = {
             'pool_name': 'automation_pool',
-            'pool_size': 5,
+            'pool_size': config_manager.get_mysql_pool_size(),
             'host': mysql_config['mysql_host'],
             'port': mysql_config['mysql_port'],
             'user': mysql_config['mysql_user'],
@@ -36,188 +100,183 @@ def open_mysql_connection():
         }
         
         _mysql_pool = mysql.connector.pooling.MySQLConnectionPool(**pool_config)
-        _mysql_conn = _mysql_pool.get_connection()
+        _pool_slots = threading.BoundedSemaphore(pool_config['pool_size'])
+        with _pool_stats_lock:
+            _pool_stats["size"] = pool_config['pool_size']
         logger.log_mysql_connection("opened", file=Path(__file__).name)
-        return _mysql_conn
+        _report_sink.detect_columns()
+        # Catch up on reports spooled while the database was unreachable
+        _report_sink.replay_spool_async()
+        return True
         
     except Exception as e:
         logger.error(f"Failed to open MySQL connection: {e}", file=Path(__file__).name)
         raise
 
-def get_connection():
-    return _mysql_conn
-
 def close_mysql_connection():
-    global _mysql_conn, _mysql_pool
-    if _mysql_conn is not None:
-        try:
-            _mysql_conn.close()
-            _mysql_conn = None
-            logger.log_mysql_connection("closed", file=Path(__file__).name)
-        except Exception as e:
-            logger.error(f"Error closing MySQL connection: {e}", file=Path(__file__).name)
-    
+    global _mysql_pool, _pool_slots
+    _pool_slots = None
     if _mysql_pool is not None:
         try:
-            _mysql_pool.close()
+            _mysql_pool._remove_connections()
             _mysql_pool = None
             logger.log_mysql_connection("pool closed", file=Path(__file__).name)
         except Exception as e:
             logger.error(f"Error closing MySQL connection pool: {e}", file=Path(__file__).name)
 
 def select_all_users():
-    if _mysql_conn is None:
-        raise RuntimeError("MySQL connection is not open.")
-    cursor = _mysql_conn.cursor(dictionary=True)
+    with checkout_connection() as connection:
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute("SELECT * FROM USER")
+            results = cursor.fetchall()
+            logger.info(f"Retrieved {len(results)} users from database", file=Path(__file__).name)
+            return results
+        except Exception as e:
+            logger.error(f"Error selecting users: {e}", file=Path(__file__).name)
+            return []
+
+def _fetch_rows(query):
+    with checkout_connection() as connection:
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute(query)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+def _with_timeout(mapped, timeout):
+    """Add the optional timeout override column (seconds); left out when empty so existing entries keep their digest."""
+    if timeout is not None:
+        mapped["timeout"] = timeout
+    return mapped
+
+def fetch_programs():
+    """Fetch PROGRAMS mapped to the DependenciesWinget.json structure."""
+    programs_dict = {}
+    for prog in _fetch_rows("SELECT * FROM PROGRAMS"):
+        # Map fields according to the required mapping
+        name = prog.get("program_name")
+        if not name:
+            continue
+        mapped = {
+            "id": prog.get("program_id"),
+            "category": prog.get("program_category"),
+            "Name": name,
+            "Desc": prog.get("program_desc"),
+            "winget": prog.get("program_package"),
+            "enable": bool(prog.get("program_enabled"))
+        }
+        programs_dict[name] = _with_timeout(mapped, prog.get("program_timeout"))
+    return programs_dict
+
+def fetch_group_policy():
+    """Fetch POLICIES mapped to the GroupPolicy.json structure."""
+    policies_list = []
+    for prog in _fetch_rows("SELECT * FROM POLICIES"):
+        mapped = {
+            "id": prog.get("policies_id"),
+            "name": prog.get("policies_name"),
+            "regPath": prog.get("policies_regPath"),
+            "regName": prog.get("policies_regName"),
+            "regValue": prog.get("policies_regVaule"),
+            "regValueRevert": prog.get("policies_regVauleRevert"),
+            "type": prog.get("policies_type"),
+            "enable": bool(prog.get("policies_enable")),
+        }
+        policies_list.append(mapped)
+    return policies_list
+
+def fetch_python_dependencies():
+    """Fetch PYTHON mapped to the PythonDependencies.json structure."""
+    results = _fetch_rows("SELECT python_name FROM PYTHON")
+    dependencies = [prog.get("python_name") for prog in results if prog.get("python_name")]
+    return {"dependencies": dependencies}
+
+def fetch_uninstall_programs():
+    """Fetch UNINSTALL_PROGRAMS mapped to the UninstallPrograms.json structure."""
+    policies_list = []
+    for prog in _fetch_rows("SELECT * FROM UNINSTALL_PROGRAMS"):
+        mapped = {
+            "id": prog.get("uninstall_id"),
+            "name": prog.get("uninstall_name"),
+            "name_program": prog.get("uninstall_name_program"),
+            "Source": prog.get("uninstall_source")
+        }
+        policies_list.append(_with_timeout(mapped, prog.get("uninstall_timeout")))
+    return policies_list
+
+def fetch_windows_settings():
+    """Fetch WIN_SETTINGS mapped to the WindowsSetting.json structure."""
+    policies_list = []
+    for prog in _fetch_rows("SELECT * FROM WIN_SETTINGS"):
+        mapped = {
+            "id": prog.get("settings_id"),
+            "name": prog.get("settings_name"),
+            "command": prog.get("settings_command"),
+            "enable": bool(prog.get("settings_enable"))
+        }
+        policies_list.append(_with_timeout(mapped, prog.get("settings_timeout")))
+    return policies_list
+
+def _select_and_export(fetch, file_name, description):
     try:
-        cursor.execute("SELECT * FROM USER")
-        results = cursor.fetchall()
-        logger.info(f"Retrieved {len(results)} users from database", file=Path(__file__).name)
-        return results
+        data = fetch()
+        export_json(file_name, data)
+        count = len(data["dependencies"]) if isinstance(data, dict) and "dependencies" in data else len(data)
+        logger.info(f"Updated {file_name} with {count} {description}", file=Path(__file__).name)
+        return data
     except Exception as e:
-        logger.error(f"Error selecting users: {e}", file=Path(__file__).name)
-        return []
+        logger.error(f"Error selecting {description}: {e}", file=Path(__file__).name)
+        return None
 
 def select_all_programs():
-    if _mysql_conn is None:
-        raise RuntimeError("MySQL connection is not open.")
-    cursor = _mysql_conn.cursor(dictionary=True)
-    try:
-        cursor.execute("SELECT * FROM PROGRAMS")
-        results = cursor.fetchall()
-
-        json_path = config_manager.get_functions_path() / "DependenciesWinget.json"
-        programs_dict = {}
-        for prog in results:
-            # Map fields according to the required mapping
-            name = prog.get("program_name")
-            if not name:
-                continue
-            mapped = {
-                "id": prog.get("program_id"),
-                "category": prog.get("program_category"),
-                "Name": name,
-                "Desc": prog.get("program_desc"),
-                "winget": prog.get("program_package"),
-                "enable": bool(prog.get("program_enabled"))
-            }
-            programs_dict[name] = mapped
-        with open(json_path, "w", encoding="utf-8") as f:
-            json.dump(programs_dict, f, ensure_ascii=False, indent=4)
-
-        logger.info(f"Updated programs JSON with {len(programs_dict)} programs", file=Path(__file__).name)
-        return results
-    except Exception as e:
-        logger.error(f"Error selecting programs: {e}", file=Path(__file__).name)
-        return []
+    return _select_and_export(fetch_programs, "DependenciesWinget.json", "programs")
 
 def select_all_group_policy():
-    if _mysql_conn is None:
-        raise RuntimeError("MySQL connection is not open.")
-    cursor = _mysql_conn.cursor(dictionary=True)
-    try:
-        cursor.execute("SELECT * FROM POLICIES")
-        results = cursor.fetchall()
-
-        json_path = config_manager.get_functions_path() / 'GroupPolicy.json'
-        policies_list = []
-        for prog in results:
-            mapped = {
-                "id": prog.get("policies_id"),
-                "name": prog.get("policies_name"),
-                "regPath": prog.get("policies_regPath"),
-                "regName": prog.get("policies_regName"),
-                "regValue": prog.get("policies_regVaule"),
-                "regValueRevert": prog.get("policies_regVauleRevert"),
-                "type": prog.get("policies_type"),
-                "enable": bool(prog.get("policies_enable")),
-            }
-            policies_list.append(mapped)
-        with open(json_path, "w", encoding="utf-8") as f:
-            json.dump(policies_list, f, ensure_ascii=False, indent=4)
-
-        return results
-    except Exception as e:
-        print(f"Error: {e}")
+    return _select_and_export(fetch_group_policy, "GroupPolicy.json", "group policies")
 
 def select_all_python_dependencies():
-    if _mysql_conn is None:
-        raise RuntimeError("MySQL connection is not open.")
-    cursor = _mysql_conn.cursor(dictionary=True)
-    try:
-        cursor.execute("SELECT python_name FROM PYTHON")
-        results = cursor.fetchall()
-
-        json_path = config_manager.get_functions_path() / 'PythonDependencies.json'
-        dependencies = [prog.get("python_name") for prog in results if prog.get("python_name")]
-        out_dict = {"dependencies": dependencies}
-        with open(json_path, "w", encoding="utf-8") as f:
-            json.dump(out_dict, f, ensure_ascii=False, indent=4)
-
-        return results
-    except Exception as e:
-        print(f"Error: {e}")
+    return _select_and_export(fetch_python_dependencies, "PythonDependencies.json", "python dependencies")
 
 def select_all_uninstall_programs():
-    if _mysql_conn is None:
-        raise RuntimeError("MySQL connection is not open.")
-    cursor = _mysql_conn.cursor(dictionary=True)
-    try:
-        cursor.execute("SELECT * FROM UNINSTALL_PROGRAMS")
-        results = cursor.fetchall()
-
-        json_path = config_manager.get_functions_path() / 'UninstallPrograms.json'
-        policies_list = []
-        for prog in results:
-            mapped = {
-                "id": prog.get("uninstall_id"),
-                "name": prog.get("uninstall_name"),
-                "name_program": prog.get("uninstall_name_program"),
-                "Source": prog.get("uninstall_source")
-            }
-            policies_list.append(mapped)
-        with open(json_path, "w", encoding="utf-8") as f:
-            json.dump(policies_list, f, ensure_ascii=False, indent=4)
-
-        return results
-    except Exception as e:
-        print(f"Error: {e}")
+    return _select_and_export(fetch_uninstall_programs, "UninstallPrograms.json", "uninstall programs")
 
 def select_all_windows_settings():
-    if _mysql_conn is None:
-        raise RuntimeError("MySQL connection is not open.")
-    cursor = _mysql_conn.cursor(dictionary=True)
-    try:
-        cursor.execute("SELECT * FROM WIN_SETTINGS")
-        results = cursor.fetchall()
-
-        json_path = config_manager.get_functions_path() / 'WindowsSetting.json'
-        policies_list = []
-        for prog in results:
-            mapped = {
-                "id": prog.get("settings_id"),
-                "name": prog.get("settings_name"),
-                "command": prog.get("settings_command"),
-                "enable": bool(prog.get("settings_enable"))
-            }
-            policies_list.append(mapped)
-        with open(json_path, "w", encoding="utf-8") as f:
-            json.dump(policies_list, f, ensure_ascii=False, indent=4)
-
-        return results
-    except Exception as e:
-        print(f"Error: {e}")
+    return _select_and_export(fetch_windows_settings, "WindowsSetting.json", "windows settings")
 
-def insert_report(computer_name, task_type, task_name, status):
-    if _mysql_conn is None:
-        raise RuntimeError("MySQL connection is not open.")
-    cursor = _mysql_conn.cursor()
-    try:
-        cursor.execute(
-            "INSERT INTO REPORT (report_computer_name, report_task_type, report_task_name, report_status, report_timestamp) "
-            "VALUES (%s, %s, %s, %s, NOW())",
-            (computer_name, task_type, task_name, status)
-        )
-        _mysql_conn.commit()
-    except Exception as e:
-        print(f"Error inserting report: {e}")
\ No newline at end of file
+def select_table_checksums(tables):
+    """Return {table: checksum} for the given tables in one CHECKSUM TABLE round trip (None if unknown)."""
+    with checkout_connection() as connection:
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute("CHECKSUM TABLE " + ", ".join(f"`{table}`" for table in tables))
+            results = cursor.fetchall()
+            checksums = {table: None for table in tables}
+            for row in results:
+                # The Table column is "<database>.<table>"
+                table = str(row.get("Table", "")).split(".")[-1]
+                if table in checksums:
+                    checksums[table] = row.get("Checksum")
+            return checksums
+        except Exception as e:
+            logger.error(f"Error reading table checksums: {e}", file=Path(__file__).name)
+            return {table: None for table in tables}
+
+def insert_report(computer_name, task_type, task_name, status, duration_ms=None, exit_code=None, attempt=1):
+    """Queue a REPORT row; rows are written in batches by the report sink."""
+    _report_sink.put(computer_name, task_type, task_name, status, duration_ms, exit_code, attempt)
+
+def flush_reports():
+    """Write all queued REPORT rows and stop the background flusher."""
+    _report_sink.close()
+
+def get_report_stats():
+    """Counters of queued, flushed and failed REPORT rows."""
+    return _report_sink.stats()
+
+def set_report_sink(sink):
+    """Replace the report sink (e.g. with one writing to a DB-API stand-in); returns the previous one."""
+    global _report_sink
+    previous, _report_sink = _report_sink, sink
+    return previous
@@ -0,0 +1,142 @@
+import threading
+import time
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Sequence
+from pathlib import Path
+
+from Controller.metrics import run_metrics
+from utils.logger import logger
+
+# Phase-level resource classes and how many phases may hold each at once
+DEFAULT_PHASE_RESOURCE_LIMITS = {"msi": 1, "registry": 1, "network": 2}
+
+# States reported through on_phase_state
+PENDING, WAITING, RUNNING, DONE, FAILED = "pending", "waiting", "running", "done", "failed"
+
+
+class Phase:
+    """One step of the pipeline: a blocking callable plus the phases it must wait for and the resources it holds."""
+
+    def __init__(self, key: Hashable, run: Callable[[], Optional[bool]], depends_on: Sequence[Hashable] = (),
+                 resources: Sequence[str] = (), title: Optional[str] = None):
+        self.key = key
+        self.run = run
+        self.depends_on = tuple(depends_on)
+        self.resources = tuple(sorted(set(resources)))
+        self.title = title or str(key)
+
+
+class PhasePipeline:
+    """
+    Runs a graph of phases: every phase starts as soon as all phases it depends on have finished
+    (successfully or not) and it can hold its resource classes, so independent phases run side by side.
+    """
+
+    def __init__(self, phases: Iterable[Phase], resource_limits: Optional[Dict[str, int]] = None):
+        self.phases: Dict[Hashable, Phase] = {}
+        for phase in phases:
+            if phase.key in self.phases:
+                raise ValueError(f"Duplicate phase {phase.key!r}")
+            self.phases[phase.key] = phase
+        for phase in self.phases.values():
+            unknown = [key for key in phase.depends_on if key not in self.phases]
+            if unknown:
+                raise ValueError(f"Phase {phase.key!r} depends on unknown phases {unknown}")
+        self.order = self._topological_order()
+        limits = dict(DEFAULT_PHASE_RESOURCE_LIMITS)
+        limits.update(resource_limits or {})
+        self._resources = {name: threading.BoundedSemaphore(max(1, int(limit))) for name, limit in limits.items()}
+        self.states: Dict[Hashable, str] = {key: PENDING for key in self.phases}
+        self.durations: Dict[Hashable, float] = {}
+
+    def _topological_order(self) -> List[Hashable]:
+        order, visiting, visited = [], set(), set()
+
+        def visit(key):
+            if key in visited:
+                return
+            if key in visiting:
+                raise ValueError(f"Phase graph has a cycle through {key!r}")
+            visiting.add(key)
+            for dependency in self.phases[key].depends_on:
+                visit(dependency)
+            visiting.discard(key)
+            visited.add(key)
+            order.append(key)
+
+        for key in self.phases:
+            visit(key)
+        return order
+
+    def run(self, on_phase_state: Optional[Callable[[Hashable, str], None]] = None) -> Dict[Hashable, bool]:
+        """
+        Run every phase and wait for all of them. `on_phase_state(key, state)` is called from the
+        phase threads on each transition (waiting for a resource, running, done, failed).
+        Returns {phase key: succeeded}; a phase fails if it raises or returns False.
+        """
+        results: Dict[Hashable, bool] = {}
+        condition = threading.Condition()
+        started = set()
+        pipeline_started = time.monotonic()
+
+        def set_state(key, state):
+            self.states[key] = state
+            if on_phase_state:
+                try:
+                    on_phase_state(key, state)
+                except Exception as e:
+                    logger.error(f"Phase state callback failed: {e}", file=Path(__file__).name)
+
+        def run_phase(phase: Phase):
+            set_state(phase.key, WAITING)
+            held = []
+            ok = False
+            phase_started = None
+            phase_started_at = time.time()
+            try:
+                # Always acquired in name order, so two phases can never wait on each other
+                for name in phase.resources:
+                    semaphore = self._resources.get(name)
+                    if semaphore is not None:
+                        semaphore.acquire()
+                        held.append(semaphore)
+                set_state(phase.key, RUNNING)
+                phase_started, phase_started_at = time.monotonic(), time.time()
+                logger.info(f"Phase '{phase.title}' started", file=Path(__file__).name)
+                ok = phase.run() is not False
+            except Exception as e:
+                logger.error(f"Phase '{phase.title}' failed: {e}", file=Path(__file__).name)
+            finally:
+                for semaphore in reversed(held):
+                    semaphore.release()
+            self.durations[phase.key] = time.monotonic() - phase_started if phase_started is not None else 0.0
+            logger.info(
+                "Phase '%s' finished in %.1fs (%s)", phase.title, self.durations[phase.key], "ok" if ok else "failed",
+                file=Path(__file__).name, phase=phase.key, duration=round(self.durations[phase.key], 3), status="ok" if ok else "failed"
+            )
+            run_metrics.phase_finished(phase.key, phase_started_at, self.durations[phase.key], ok)
+            set_state(phase.key, DONE if ok else FAILED)
+            with condition:
+                results[phase.key] = ok
+                condition.notify_all()
+
+        with condition:
+            while len(results) < len(self.phases):
+                for key in self.order:
+                    phase = self.phases[key]
+                    if key not in started and all(dependency in results for dependency in phase.depends_on):
+                        started.add(key)
+                        threading.Thread(target=run_phase, args=(phase,), name=f"Phase-{key}", daemon=True).start()
+                condition.wait()
+        logger.info(f"Pipeline finished in {time.monotonic() - pipeline_started:.1f}s", file=Path(__file__).name)
+        return results
+
+    def start(self, on_phase_state=None, on_complete: Optional[Callable[[Dict[Hashable, bool]], None]] = None) -> threading.Thread:
+        """Run the pipeline in a background thread and call `on_complete(results)` from it when done."""
+        def run():
+            results = self.run(on_phase_state)
+            if on_complete:
+                on_complete(results)
+
+        thread = threading.Thread(target=run, name="PhasePipeline", daemon=True)
+        thread.start()
+        return thread
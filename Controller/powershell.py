@@ -0,0 +1,287 @@
+import base64
+import json
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import uuid
+from typing import Any, Dict, List, Optional
+from pathlib import Path
+
+from Controller.config import config_manager
+from utils.logger import logger
+
+# Every response line written by the host starts with this marker; anything else on stdout is ignored.
+RESPONSE_MARKER = "@@PSHOST@@ "
+
+# Request frame:  "<id> <base64 UTF-8 script>\n"
+# Response frame: "@@PSHOST@@ {"id": ..., "rc": ..., "stdout": ..., "stderr": ...}\n"
+HOST_SCRIPT = r"""
+$ProgressPreference = 'SilentlyContinue'
+[Console]::InputEncoding = New-Object System.Text.UTF8Encoding $false
+[Console]::OutputEncoding = New-Object System.Text.UTF8Encoding $false
+while ($true) {
+    $line = [Console]::In.ReadLine()
+    if ($line -eq $null) { break }
+    $parts = $line.Split(' ', 2)
+    if ($parts.Length -lt 2) { continue }
+    $id = $parts[0]
+    $script = [Text.Encoding]::UTF8.GetString([Convert]::FromBase64String($parts[1]))
+    $global:LASTEXITCODE = 0
+    $stdout = New-Object System.Text.StringBuilder
+    $stderr = New-Object System.Text.StringBuilder
+    $failed = $false
+    try {
+        & ([ScriptBlock]::Create($script)) 2>&1 | ForEach-Object {
+            if ($_ -is [System.Management.Automation.ErrorRecord]) {
+                [void]$stderr.AppendLine($_.ToString())
+                $failed = $true
+            } elseif ($_ -is [string]) {
+                [void]$stdout.AppendLine($_)
+            } else {
+                [void]$stdout.AppendLine(($_ | Out-String).TrimEnd())
+            }
+        }
+    } catch {
+        [void]$stderr.AppendLine($_.ToString())
+        $failed = $true
+    }
+    if ($global:LASTEXITCODE) { $rc = $global:LASTEXITCODE } elseif ($failed) { $rc = 1 } else { $rc = 0 }
+    $response = @{ id = $id; rc = $rc; stdout = $stdout.ToString(); stderr = $stderr.ToString() } | ConvertTo-Json -Compress
+    [Console]::Out.WriteLine('@@PSHOST@@ ' + $response)
+    [Console]::Out.Flush()
+}
+"""
+
+
+def default_powershell_command() -> List[str]:
+    """Command line that starts a PowerShell running the host loop."""
+    executable = "powershell.exe" if os.name == "nt" else (shutil.which("pwsh") or "pwsh")
+    encoded = base64.b64encode(HOST_SCRIPT.encode("utf-16-le")).decode("ascii")
+    return [executable, "-NoLogo", "-NoProfile", "-NonInteractive", "-ExecutionPolicy", "Bypass", "-EncodedCommand", encoded]
+
+
+class _Waiters:
+    """Callers waiting for a response from one shell process, keyed by request ID."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiting: Dict[str, "queue.Queue"] = {}
+        self._closed = False
+
+    def add(self, request_id: str) -> Optional["queue.Queue"]:
+        """Register a waiter; None if the shell has already exited."""
+        waiter: "queue.Queue" = queue.Queue(maxsize=1)
+        with self._lock:
+            if self._closed:
+                return None
+            self._waiting[request_id] = waiter
+        return waiter
+
+    def remove(self, request_id: str) -> None:
+        with self._lock:
+            self._waiting.pop(request_id, None)
+
+    def deliver(self, response: Dict[str, Any]) -> None:
+        with self._lock:
+            waiter = self._waiting.pop(str(response.get("id")), None)
+        if waiter is not None:
+            waiter.put(response)
+
+    def close(self) -> None:
+        """The shell exited: every caller still waiting gets None."""
+        with self._lock:
+            self._closed = True
+            waiting, self._waiting = self._waiting, {}
+        for waiter in waiting.values():
+            waiter.put(None)
+
+
+class PowerShellHost:
+    """
+    A long-lived PowerShell session that runs commands over a framed stdin/stdout protocol.
+    The lock is only held while a request is written; responses are routed to the waiting caller
+    by request ID. The shell itself runs one script at a time, so PowerShellHostPool spreads
+    concurrent callers over several sessions. A shell is restarted after a crash or a timeout.
+    """
+
+    def __init__(self, command: Optional[List[str]] = None):
+        self.command = command
+        self._process: Optional[subprocess.Popen] = None
+        self._waiters = _Waiters()
+        self._lock = threading.RLock()
+
+    def start(self) -> None:
+        """Start the shell if it is not running."""
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                return
+            command = self.command or default_powershell_command()
+            creationflags = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+            self._process = subprocess.Popen(
+                command,
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                encoding="utf-8", errors="replace", bufsize=1,
+                creationflags=creationflags
+            )
+            self._waiters = _Waiters()
+            threading.Thread(target=self._read_stdout, args=(self._process, self._waiters), daemon=True).start()
+            threading.Thread(target=self._read_stderr, args=(self._process,), daemon=True).start()
+            logger.info("PowerShell host started (pid %s)", self._process.pid, file=Path(__file__).name)
+
+    def start_async(self) -> None:
+        """Start the shell in the background so it is warm by the time the first command arrives."""
+        def warm_up():
+            try:
+                self.start()
+            except Exception as e:
+                logger.warning(f"Could not pre-start PowerShell host: {e}", file=Path(__file__).name)
+        threading.Thread(target=warm_up, daemon=True).start()
+
+    def stop(self) -> None:
+        """Stop the shell."""
+        with self._lock:
+            process, self._process = self._process, None
+        if process is None:
+            return
+        try:
+            process.stdin.close()
+            process.wait(timeout=5)
+        except Exception:
+            process.kill()
+        logger.info("PowerShell host stopped", file=Path(__file__).name)
+
+    def run(self, script: str, timeout: Optional[float] = None) -> subprocess.CompletedProcess:
+        """
+        Run a PowerShell script in the shared session and return its return code, stdout and stderr.
+        Raises subprocess.TimeoutExpired (after killing the shell) if it does not finish in time.
+        """
+        request_id = uuid.uuid4().hex
+        payload = base64.b64encode(script.encode("utf-8")).decode("ascii")
+        with self._lock:
+            self.start()
+            process, waiters = self._process, self._waiters
+            waiter = waiters.add(request_id)
+            try:
+                if waiter is None:
+                    raise BrokenPipeError("the shell has exited")
+                process.stdin.write(f"{request_id} {payload}\n")
+                process.stdin.flush()
+            except (BrokenPipeError, OSError) as e:
+                waiters.remove(request_id)
+                self._discard(process)
+                return subprocess.CompletedProcess(script, -1, "", f"PowerShell host is not available: {e}")
+
+        try:
+            response = waiter.get(timeout=timeout)
+        except queue.Empty:
+            waiters.remove(request_id)
+            logger.error("PowerShell command timed out after %ss, restarting host", timeout, file=Path(__file__).name)
+            self._discard(process)
+            raise subprocess.TimeoutExpired(script, timeout)
+        if response is None:
+            logger.error("PowerShell host exited unexpectedly, it will be restarted", file=Path(__file__).name)
+            self._discard(process)
+            return subprocess.CompletedProcess(script, -1, "", "PowerShell host exited unexpectedly")
+        return subprocess.CompletedProcess(
+            script, int(response.get("rc") or 0), response.get("stdout") or "", response.get("stderr") or ""
+        )
+
+    def _discard(self, process: subprocess.Popen) -> None:
+        """Kill a broken or hung shell so the next command starts a fresh one."""
+        with self._lock:
+            if self._process is process:
+                self._process = None
+        try:
+            process.kill()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _read_stdout(process: subprocess.Popen, waiters: _Waiters) -> None:
+        for line in process.stdout:
+            if not line.startswith(RESPONSE_MARKER):
+                continue
+            try:
+                waiters.deliver(json.loads(line[len(RESPONSE_MARKER):]))
+            except ValueError as e:
+                logger.error(f"Malformed PowerShell host response: {e}", file=Path(__file__).name)
+        waiters.close()
+
+    @staticmethod
+    def _read_stderr(process: subprocess.Popen) -> None:
+        for line in process.stderr:
+            logger.debug("PowerShell host stderr: %s", line.rstrip(), file=Path(__file__).name)
+
+
+class PowerShellHostPool:
+    """
+    Up to `size` PowerShell sessions (config powershell_hosts) started on demand. Each command goes to
+    an idle session, so phases that run at the same time (e.g. Group Policy next to AppX removal) do
+    not queue behind each other; only when all are busy does a command share the least busy one.
+    A timeout restarts only the session that ran the command.
+    """
+
+    def __init__(self, size: Optional[int] = None, command: Optional[List[str]] = None):
+        self.size = size
+        self.command = command
+        self._lock = threading.Lock()
+        self._hosts: List[PowerShellHost] = []
+        self._in_flight: List[int] = []
+
+    def _acquire(self) -> int:
+        size = self.size if self.size is not None else config_manager.get_powershell_hosts()
+        with self._lock:
+            idle = [index for index, count in enumerate(self._in_flight) if count == 0]
+            if idle:
+                index = idle[0]
+            elif len(self._hosts) < size:
+                self._hosts.append(PowerShellHost(self.command))
+                self._in_flight.append(0)
+                index = len(self._hosts) - 1
+            else:
+                index = min(range(len(self._hosts)), key=lambda i: self._in_flight[i])
+            self._in_flight[index] += 1
+            return index
+
+    def run(self, script: str, timeout: Optional[float] = None) -> subprocess.CompletedProcess:
+        """Run a script in an idle session; see PowerShellHost.run."""
+        index = self._acquire()
+        try:
+            return self._hosts[index].run(script, timeout=timeout)
+        finally:
+            with self._lock:
+                self._in_flight[index] -= 1
+
+    def start_async(self) -> None:
+        """Warm up the first session; the others start when commands overlap."""
+        with self._lock:
+            if not self._hosts:
+                self._hosts.append(PowerShellHost(self.command))
+                self._in_flight.append(0)
+            host = self._hosts[0]
+        host.start_async()
+
+    def stop(self) -> None:
+        """Stop every session."""
+        with self._lock:
+            hosts = list(self._hosts)
+        for host in hosts:
+            host.stop()
+
+
+# Global instance shared by all phases
+powershell_host = PowerShellHostPool()
+_powershell_host = powershell_host
+
+
+def get_powershell_host():
+    """Get the PowerShell session the phases run their scripts in."""
+    return _powershell_host
+
+
+def set_powershell_host(host) -> None:
+    """Replace the PowerShell session (e.g. with a simulated one); it needs run(script, timeout), start_async() and stop()."""
+    global _powershell_host
+    _powershell_host = host
@@ -0,0 +1,121 @@
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+from pathlib import Path
+
+from Controller.metrics import run_metrics
+from Controller.runner import get_command_runner
+from Controller.timeouts import adaptive_timeouts
+from utils.logger import logger
+
+# Fixed timeout per package for benchmark_pip_modes, which keeps its runs out of the duration history
+PIP_TIMEOUT_PER_PACKAGE = 300
+
+
+def pip_install_command(packages: Sequence[str], python: Optional[str] = None, extra_args: Sequence[str] = ()) -> List[str]:
+    return [python or sys.executable, "-m", "pip", "install", "--disable-pip-version-check", *extra_args, *packages]
+
+
+def _pip_install(packages: Sequence[str], runner, python, extra_args, timeout_per_package) -> bool:
+    """
+    One pip invocation for all `packages`; True if pip exited with 0. The exit code is noted for each package.
+    Without `timeout_per_package` the batch gets the sum of the packages' adaptive timeouts (Controller.timeouts)
+    and its duration goes into their history.
+    """
+    adaptive = timeout_per_package is None
+    if adaptive:
+        timeout = sum(adaptive_timeouts.timeout_for("pip", package) for package in packages)
+    else:
+        timeout = timeout_per_package * len(packages)
+    started = time.monotonic()
+    try:
+        result = runner.run(pip_install_command(packages, python, extra_args), timeout=timeout)
+    except subprocess.TimeoutExpired:
+        logger.error("pip install of %s timed out after %.0f seconds", ', '.join(packages), timeout, file=Path(__file__).name)
+        for package in packages:
+            run_metrics.note_exit_code(package, None)
+            if adaptive:
+                adaptive_timeouts.record_timeout("pip", package, timeout / len(packages))
+        return False
+    for package in packages:
+        run_metrics.note_exit_code(package, result.returncode)
+    if result.returncode != 0:
+        stderr = (result.stderr or '').strip().splitlines()
+        logger.error(
+            f"pip install of {', '.join(packages)} failed with exit code {result.returncode}. Stderr: {' | '.join(stderr[-5:])}",
+            file=Path(__file__).name
+        )
+        return False
+    if adaptive:
+        # A batch is resolved and installed together; each package is credited an equal share of its time
+        share = (time.monotonic() - started) / len(packages)
+        for package in packages:
+            adaptive_timeouts.record("pip", package, share)
+    return True
+
+
+def install_python_packages(packages: Sequence[str], runner=None, python: Optional[str] = None,
+                            extra_args: Sequence[str] = (), on_result: Optional[Callable[[str, bool], None]] = None,
+                            timeout_per_package: Optional[float] = None) -> Dict[str, bool]:
+    """
+    Install all packages with a single pip run, so pip resolves them together. If that run fails,
+    the set is split in halves and each half is retried, down to single packages, which finds the
+    package(s) that broke the batch while everything else still gets installed.
+    `on_result(package, ok)` is called as soon as the outcome of a package is known.
+    `timeout_per_package` replaces the adaptive timeouts with a fixed one. Returns {package: ok}.
+    """
+    runner = runner or get_command_runner()
+    results: Dict[str, bool] = {}
+
+    def install(group: List[str]) -> None:
+        if not group:
+            return
+        ok = _pip_install(group, runner, python, extra_args, timeout_per_package)
+        if ok or len(group) == 1:
+            for package in group:
+                results[package] = ok
+                if on_result:
+                    on_result(package, ok)
+            return
+        logger.info("Batch of %d packages failed, bisecting", len(group), file=Path(__file__).name)
+        middle = len(group) // 2
+        install(group[:middle])
+        install(group[middle:])
+
+    # Keep the first occurrence of each package, in catalog order
+    install(list(dict.fromkeys(packages)))
+    return results
+
+
+def benchmark_pip_modes(packages: Sequence[str], find_links: str) -> Dict[str, float]:
+    """
+    Time a batched install against one pip run per package, each into a fresh virtual environment
+    and only from the local package directory `find_links` (no network). Returns {mode: seconds}.
+    """
+    runner = get_command_runner()
+    extra_args = ["--no-index", "--find-links", str(find_links)]
+    timings = {}
+    for mode in ("per-package", "batched"):
+        with tempfile.TemporaryDirectory(prefix="pipbench-") as venv_dir:
+            subprocess.run([sys.executable, "-m", "venv", venv_dir], check=True, capture_output=True)
+            python = str(Path(venv_dir) / ("Scripts/python.exe" if sys.platform == "win32" else "bin/python"))
+            started = time.perf_counter()
+            if mode == "batched":
+                results = install_python_packages(packages, runner, python, extra_args, timeout_per_package=PIP_TIMEOUT_PER_PACKAGE)
+            else:
+                results = {package: _pip_install([package], runner, python, extra_args, PIP_TIMEOUT_PER_PACKAGE) for package in packages}
+            timings[mode] = time.perf_counter() - started
+            if not all(results.values()):
+                logger.warning("%s: failed packages %s", mode, [p for p, ok in results.items() if not ok], file=Path(__file__).name)
+    return timings
+
+
+if __name__ == "__main__":
+    # python -m Controller.pythondeps <local package dir> [package ...]
+    # Fill the directory first, e.g.: pip download -d <dir> Pillow six requests
+    if len(sys.argv) < 3:
+        sys.exit("usage: python -m Controller.pythondeps <find-links dir> <package> [package ...]")
+    for mode, seconds in benchmark_pip_modes(sys.argv[2:], sys.argv[1]).items():
+        print(f"{mode:>12}: {seconds:7.2f} s for {len(sys.argv) - 2} packages")
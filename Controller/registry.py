@@ -0,0 +1,131 @@
+import json
+import subprocess
+from typing import Any, Dict, List, Optional, Tuple
+from pathlib import Path
+
+from Controller.powershell import get_powershell_host
+from utils.logger import logger
+
+RegistryKey = Tuple[str, str]  # (regPath, regName)
+
+# Sentinel for values that are missing from the registry (or could not be read)
+MISSING = object()
+
+
+def _ps_quote(value: Any) -> str:
+    """Quote a value as a single-quoted PowerShell string literal."""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def values_match(current: Any, desired: Any, reg_type: Optional[str]) -> bool:
+    """Compare a registry value against the desired catalog value for the given type."""
+    if current is MISSING or current is None:
+        return False
+    if (reg_type or "DWORD").upper() == "DWORD":
+        try:
+            return int(current) == int(desired)
+        except (TypeError, ValueError):
+            return False
+    return str(current) == str(desired)
+
+
+class PowerShellRegistryBackend:
+    """Reads and writes registry values through the shared PowerShell host."""
+
+    def __init__(self, host=None):
+        self.host = host or get_powershell_host()
+
+    def read_values(self, keys: List[RegistryKey]) -> Dict[RegistryKey, Any]:
+        """Read all given values in one PowerShell round trip. Missing values map to MISSING."""
+        if not keys:
+            return {}
+        request = json.dumps([{"path": path, "name": name} for path, name in keys])
+        script = (
+            f"$items = ConvertFrom-Json {_ps_quote(request)}\n"
+            "$result = foreach ($i in $items) {\n"
+            "    $exists = $false; $value = $null\n"
+            "    try {\n"
+            "        $value = (Get-ItemProperty -Path $i.path -Name $i.name -ErrorAction Stop).($i.name)\n"
+            "        $exists = $true\n"
+            "    } catch {}\n"
+            "    [pscustomobject]@{ path = $i.path; name = $i.name; exists = $exists; value = $value }\n"
+            "}\n"
+            "ConvertTo-Json -InputObject @($result) -Compress"
+        )
+        result = self.host.run(script, timeout=120)
+        if result.returncode != 0:
+            raise RuntimeError(f"Reading registry values failed: {result.stderr}")
+        rows = json.loads(result.stdout.strip() or "[]")
+        if isinstance(rows, dict):
+            rows = [rows]
+        values: Dict[RegistryKey, Any] = {key: MISSING for key in keys}
+        for row in rows:
+            if row.get("exists"):
+                values[(row.get("path"), row.get("name"))] = row.get("value")
+        return values
+
+    def write_value(self, path: str, name: str, value: Any, reg_type: Optional[str]) -> subprocess.CompletedProcess:
+        """Create the key if needed and set the value. Raises subprocess.TimeoutExpired on timeout."""
+        type_flag = "-Type DWord" if (reg_type or "DWORD").upper() == "DWORD" else "-Type String"
+        script = (
+            f"if (-not (Test-Path -Path \"{path}\")) {{ New-Item -Path \"{path}\" -Force | Out-Null }}\n"
+            f"Set-ItemProperty -Path \"{path}\" -Name '{name}' -Value {value} {type_flag} -Force"
+        )
+        return self.host.run(script, timeout=300)  # 5 minute timeout
+
+
+class InMemoryRegistryBackend:
+    """Registry backend backed by a dict, for running the Group Policy phase without Windows."""
+
+    def __init__(self, values: Optional[Dict[RegistryKey, Any]] = None):
+        self.values: Dict[RegistryKey, Any] = dict(values or {})
+        self.reads = 0
+        self.writes: List[Tuple[str, str, Any, Optional[str]]] = []
+
+    def read_values(self, keys: List[RegistryKey]) -> Dict[RegistryKey, Any]:
+        self.reads += 1
+        return {key: self.values.get(key, MISSING) for key in keys}
+
+    def write_value(self, path: str, name: str, value: Any, reg_type: Optional[str]) -> subprocess.CompletedProcess:
+        self.writes.append((path, name, value, reg_type))
+        self.values[(path, name)] = value
+        return subprocess.CompletedProcess("Set-ItemProperty", 0, "", "")
+
+
+def plan_group_policy(entries: List[Dict[str, Any]], backend) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Split Group Policy entries into (to_apply, compliant) by reading all current values in one batch.
+    If the current values cannot be read, every entry is applied.
+    """
+    keys = [(entry.get("regPath"), entry.get("regName")) for entry in entries]
+    try:
+        current = backend.read_values(keys)
+    except Exception as e:
+        logger.warning("Could not read current registry values, applying all entries: %s", e, file=Path(__file__).name)
+        return list(entries), []
+
+    to_apply, compliant = [], []
+    for entry, key in zip(entries, keys):
+        if values_match(current.get(key, MISSING), entry.get("regValue"), entry.get("type", "DWORD")):
+            compliant.append(entry)
+        else:
+            to_apply.append(entry)
+    logger.info("Group Policy plan: %d to apply, %d already compliant", len(to_apply), len(compliant), file=Path(__file__).name)
+    return to_apply, compliant
+
+
+_registry_backend = None
+
+
+def get_registry_backend():
+    """Get the registry backend used by the Group Policy phase."""
+    global _registry_backend
+    if _registry_backend is None:
+        _registry_backend = PowerShellRegistryBackend()
+    return _registry_backend
+
+
+def set_registry_backend(backend) -> None:
+    """Replace the registry backend (e.g. with InMemoryRegistryBackend)."""
+    global _registry_backend
+    _registry_backend = backend
@@ -0,0 +1,262 @@
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, ContextManager, Dict, List, Optional, Sequence, Tuple
+from pathlib import Path
+
+from utils.logger import logger
+
+# Columns of a REPORT row, in ReportRow order. The timing columns come from
+# migrations/001_report_timing_columns.sql, report_uuid from migrations/002_report_uuid.sql;
+# rows are written without whichever of them the table does not have (see ReportSink.detect_columns).
+REPORT_BASE_COLUMNS = ("report_computer_name", "report_task_type", "report_task_name", "report_status", "report_timestamp")
+REPORT_TIMING_COLUMNS = ("report_duration_ms", "report_exit_code", "report_attempt")
+REPORT_UUID_COLUMN = "report_uuid"
+REPORT_COLUMNS = REPORT_BASE_COLUMNS + REPORT_TIMING_COLUMNS + (REPORT_UUID_COLUMN,)
+
+# (computer_name, task_type, task_name, status, timestamp, duration_ms, exit_code, attempt, uuid)
+ReportRow = Tuple[str, str, str, str, datetime, Optional[int], Optional[int], int, str]
+
+
+def insert_report_sql(columns: Sequence[str], replay: bool = False) -> str:
+    """
+    INSERT for rows of the given REPORT columns. A replayed row may already have been written before
+    its connection failed: with report_uuid it is skipped by INSERT IGNORE on the column's unique index,
+    without it (migration 002 not run) by a NOT EXISTS check on the base columns, which scans REPORT.
+    """
+    names = ", ".join(columns)
+    values = ", ".join(["%s"] * len(columns))
+    if not replay:
+        return f"INSERT INTO REPORT ({names}) VALUES ({values})"
+    if REPORT_UUID_COLUMN in columns:
+        return f"INSERT IGNORE INTO REPORT ({names}) VALUES ({values})"
+    return (
+        f"INSERT INTO REPORT ({names}) SELECT {values} FROM DUAL WHERE NOT EXISTS ("
+        "SELECT 1 FROM REPORT WHERE " + " AND ".join(f"{name} = %s" for name in REPORT_BASE_COLUMNS) + ")"
+    )
+
+
+class ReportSink:
+    """
+    Buffers REPORT rows in memory and writes them in batches with executemany from a background thread.
+    A batch is flushed when it reaches `max_batch` rows or `flush_interval` seconds after its first row.
+    Rows that cannot be written are kept in an optional ReportSpool and replayed later.
+    `checkout` returns a context manager yielding a DB-API connection that uses the %s parameter style.
+    """
+
+    def __init__(self, checkout: Callable[[], ContextManager], max_batch: int = 50, flush_interval: float = 2.0, spool=None):
+        self.checkout = checkout
+        self.spool = spool
+        self.max_batch = max(1, int(max_batch))
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[ReportRow]" = queue.Queue()
+        self._write_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._replay_thread: Optional[threading.Thread] = None
+        self.queued = 0
+        self.flushed = 0
+        self.failed = 0
+        self.spooled = 0
+        self.replayed = 0
+        # False while REPORT has no timing columns; rows are then written without them
+        self.timing_columns = True
+        # Whether REPORT has report_uuid, so replayed rows can be deduplicated through its unique index
+        self.uuid_column = True
+        # Whether detect_columns() got an answer; until then it is asked again before each write
+        self._columns_detected = False
+
+    def detect_columns(self) -> bool:
+        """
+        Check whether REPORT has the timing columns and report_uuid. The schema is never changed from
+        here: the columns come from the scripts in migrations/, and rows are written without them until
+        those have been run. If the check itself fails (e.g. the database is unreachable), it is
+        repeated before the next write. Returns whether the timing columns are used.
+        """
+        try:
+            with self.checkout() as connection:
+                cursor = connection.cursor()
+                try:
+                    cursor.execute(
+                        "SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'REPORT'"
+                    )
+                    existing = {row[0].lower() for row in cursor.fetchall()}
+                finally:
+                    cursor.close()
+        except Exception as e:
+            logger.warning("Could not check the REPORT columns, will retry: %s", e, file=Path(__file__).name)
+            return self.timing_columns
+        missing = [name for name in REPORT_TIMING_COLUMNS if name not in existing]
+        if missing:
+            logger.warning(
+                "REPORT has no %s; reports are written without timing until migrations/001_report_timing_columns.sql is run",
+                ", ".join(missing), file=Path(__file__).name
+            )
+        self.timing_columns = not missing
+        self.uuid_column = REPORT_UUID_COLUMN in existing
+        if not self.uuid_column:
+            logger.warning(
+                "REPORT has no report_uuid; replayed reports are deduplicated with a table scan until migrations/002_report_uuid.sql is run",
+                file=Path(__file__).name
+            )
+        self._columns_detected = True
+        return self.timing_columns
+
+    def put(self, computer_name: str, task_type: str, task_name: str, status: str,
+            duration_ms: Optional[int] = None, exit_code: Optional[int] = None, attempt: int = 1) -> None:
+        """Queue one report row; the timestamp is taken now, not when the row is written."""
+        # Whole seconds, as stored in REPORT, so spooled rows can be matched on replay without report_uuid
+        self._queue.put((
+            computer_name, task_type, task_name, status, datetime.now().replace(microsecond=0), duration_ms, exit_code, attempt,
+            str(uuid.uuid4())
+        ))
+        with self._stats_lock:
+            self.queued += 1
+        self._ensure_started()
+
+    def flush(self) -> None:
+        """Write every queued row now."""
+        while True:
+            batch = self._drain(self.max_batch)
+            if not batch:
+                return
+            self._write(batch)
+
+    def close(self) -> None:
+        """Stop the background flusher and write whatever is still queued."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+        logger.info(f"Report sink closed: {self.stats()}", file=Path(__file__).name)
+
+    def stats(self) -> Dict[str, int]:
+        """Counters for queued, flushed and failed rows, plus rows still waiting."""
+        with self._stats_lock:
+            return {
+                "queued": self.queued, "flushed": self.flushed, "failed": self.failed,
+                "spooled": self.spooled, "replayed": self.replayed, "pending": self._queue.qsize()
+            }
+
+    def replay_spool(self) -> int:
+        """Write spooled rows back to MySQL in batches. Returns how many rows were replayed."""
+        if self.spool is None:
+            return 0
+        with self._write_lock:
+            replayed = self.spool.replay(self._write_spooled, batch_size=self.max_batch)
+        with self._stats_lock:
+            self.replayed += replayed
+        return replayed
+
+    def replay_spool_async(self) -> None:
+        """Replay spooled rows in the background, unless a replay is running already."""
+        with self._start_lock:
+            if self._replay_thread is not None and self._replay_thread.is_alive():
+                return
+            self._replay_thread = threading.Thread(target=self.replay_spool, name="ReportSpoolReplay", daemon=True)
+            self._replay_thread.start()
+
+    def _columns(self) -> List[int]:
+        """Positions in a ReportRow (and REPORT_COLUMNS) of the columns REPORT has."""
+        positions = list(range(len(REPORT_BASE_COLUMNS)))
+        if self.timing_columns:
+            positions += [5, 6, 7]
+        if self.uuid_column:
+            positions.append(8)
+        return positions
+
+    def _write_spooled(self, rows) -> None:
+        # Spooled rows: (key, computer_name, task_type, task_name, status, timestamp, duration_ms, exit_code, attempt, uuid)
+        if not self._columns_detected:
+            self.detect_columns()
+        positions = self._columns()
+        names = [REPORT_COLUMNS[i] for i in positions]
+        params = [tuple(row[1:][i] for i in positions) for row in rows]
+        if not self.uuid_column:
+            # Values for the NOT EXISTS check
+            params = [values + tuple(row[1:6]) for values, row in zip(params, rows)]
+        with self.checkout() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.executemany(insert_report_sql(names, replay=True), params)
+                connection.commit()
+            finally:
+                cursor.close()
+
+    def _ensure_started(self) -> None:
+        if self._thread is None and not self._stop.is_set():
+            with self._start_lock:
+                if self._thread is None and not self._stop.is_set():
+                    self._thread = threading.Thread(target=self._run, name="ReportSink", daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch and not self._stop.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _drain(self, limit: int) -> List[ReportRow]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[ReportRow]) -> bool:
+        with self._write_lock:
+            if not self._columns_detected:
+                self.detect_columns()
+            try:
+                with self.checkout() as connection:
+                    cursor = connection.cursor()
+                    try:
+                        positions = self._columns()
+                        names = [REPORT_COLUMNS[i] for i in positions]
+                        cursor.executemany(insert_report_sql(names), [tuple(row[i] for i in positions) for row in batch])
+                        connection.commit()
+                    finally:
+                        cursor.close()
+            except Exception as e:
+                with self._stats_lock:
+                    self.failed += len(batch)
+                logger.error(f"Error inserting {len(batch)} report rows: {e}", file=Path(__file__).name)
+                self._spool_rows(batch)
+                return False
+        with self._stats_lock:
+            self.flushed += len(batch)
+        logger.debug("Flushed %d report rows", len(batch), file=Path(__file__).name)
+        # The database is reachable again: catch up on anything spooled earlier
+        if self.spool is not None and self.spool.count():
+            self.replay_spool_async()
+        return True
+
+    def _spool_rows(self, batch: List[ReportRow]) -> None:
+        if self.spool is None:
+            return
+        try:
+            added = self.spool.append(batch)
+            with self._stats_lock:
+                self.spooled += added
+            logger.info(f"Spooled {added} report rows to {self.spool.path}", file=Path(__file__).name)
+        except Exception as e:
+            logger.error(f"Could not spool report rows, they are lost: {e}", file=Path(__file__).name)
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from pathlib import Path
+
+from Controller.bundle import bundle_path, load_bundle
+from Controller.config import config_manager
+from Controller.winget import split_winget_ids
+from utils.logger import logger
+
+
+def content_digest(data: Any) -> str:
+    """Short SHA-256 of JSON data, independent of key order."""
+    canonical = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+class Catalog:
+    """One parsed catalog file with dict indexes by name, category and winget ID."""
+
+    def __init__(self, data: Any):
+        self.data = data
+        self._version: Optional[str] = None
+        if isinstance(data, dict) and "dependencies" in data:
+            # PythonDependencies.json: {"dependencies": ["pkg", ...]}
+            self.entries: List[Dict[str, Any]] = [{"name": name} for name in data.get("dependencies", [])]
+        elif isinstance(data, dict):
+            # DependenciesWinget.json: {"<Name>": {"Name": ..., "category": ..., "winget": ...}}
+            self.entries = list(data.values())
+        else:
+            self.entries = list(data or [])
+
+        self.by_name: Dict[str, Dict[str, Any]] = {}
+        self.by_category: Dict[str, List[Dict[str, Any]]] = {}
+        self.by_winget_id: Dict[str, List[Dict[str, Any]]] = {}
+        for entry in self.entries:
+            name = entry.get("Name", entry.get("name"))
+            if name is not None:
+                self.by_name.setdefault(name, entry)
+            self.by_category.setdefault(entry.get("category"), []).append(entry)
+            for winget_id in split_winget_ids(entry.get("winget")):
+                self.by_winget_id.setdefault(winget_id.lower(), []).append(entry)
+
+    @property
+    def version(self) -> str:
+        """Digest of the catalog's content; changes whenever any entry does."""
+        if self._version is None:
+            self._version = content_digest(self.data)
+        return self._version
+
+    def find(self, name: str) -> Optional[Dict[str, Any]]:
+        """The first entry with the given name, or None."""
+        return self.by_name.get(name)
+
+    def in_category(self, category: str) -> List[Dict[str, Any]]:
+        return self.by_category.get(category, [])
+
+    def find_by_winget_id(self, winget_id: str) -> List[Dict[str, Any]]:
+        return self.by_winget_id.get(winget_id.lower(), [])
+
+
+class CatalogRepository:
+    """
+    Loads the catalogs under Functions/ once and shares the parsed, indexed result between all
+    pages and workers. Catalogs come from the versioned snapshot bundle when there is one, so
+    all of them are from the same sync; otherwise from the JSON files. A source is re-read when
+    its mtime or size changes or after invalidate() (e.g. when a catalog sync finished).
+    """
+
+    def __init__(self):
+        self._catalogs: Dict[str, Tuple[Tuple, Catalog]] = {}
+        self._bundle: Optional[Dict[str, Any]] = None
+        self._bundle_signature: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> Optional[int]:
+        """Version of the loaded snapshot bundle, or None when reading the JSON files."""
+        with self._lock:
+            bundle = self._current_bundle()
+            return bundle.get("version") if bundle else None
+
+    def get(self, file_name: str) -> Catalog:
+        """Return the catalog stored as `file_name`, loading it if its source changed."""
+        with self._lock:
+            bundle = self._current_bundle()
+            if bundle is not None and file_name in bundle.get("catalogs", {}):
+                signature = ("bundle", self._bundle_signature)
+                load = lambda: bundle["catalogs"][file_name]
+            else:
+                path = config_manager.get_functions_path() / file_name
+                stat = os.stat(path)
+                signature = ("json", stat.st_mtime_ns, stat.st_size)
+
+                def load():
+                    with open(path, "r", encoding="utf-8") as f:
+                        return json.load(f)
+            cached = self._catalogs.get(file_name)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+            catalog = Catalog(load())
+            self._catalogs[file_name] = (signature, catalog)
+            logger.debug("Loaded catalog %s from %s (%d entries)", file_name, signature[0], len(catalog.entries), file=Path(__file__).name)
+            return catalog
+
+    def invalidate(self, file_name: Optional[str] = None) -> None:
+        """Forget one cached catalog, or all of them (including the bundle)."""
+        with self._lock:
+            if file_name is None:
+                self._catalogs.clear()
+                self._bundle = None
+                self._bundle_signature = None
+            else:
+                self._catalogs.pop(file_name, None)
+
+    def _current_bundle(self) -> Optional[Dict[str, Any]]:
+        try:
+            stat = os.stat(bundle_path())
+        except OSError:
+            self._bundle, self._bundle_signature = None, None
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature != self._bundle_signature:
+            self._bundle = load_bundle()
+            self._bundle_signature = signature
+        return self._bundle
+
+
+# Global instance shared by all pages and workers
+catalog_repository = CatalogRepository()
+
@@ -0,0 +1,174 @@
+import os
+import re
+import signal
+import subprocess
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, List, Optional
+
+# Lines of output kept per stream for error reports; older lines are dropped while the command runs
+OUTPUT_TAIL_LINES = 400
+
+# Seconds to wait for the reader threads after the process (tree) is gone
+_READER_JOIN_TIMEOUT = 5
+
+_SIZE_UNITS = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+# "  ██████▒▒▒▒▒▒  12.0 MB / 24.5 MB" while winget downloads, "  ██████▒▒▒▒  45%" otherwise
+_SIZE_PROGRESS = re.compile(r"([\d.,]+)\s*(B|KB|MB|GB)\s*/\s*([\d.,]+)\s*(B|KB|MB|GB)", re.IGNORECASE)
+_PERCENT_PROGRESS = re.compile(r"(\d{1,3})\s*%")
+# winget's spinner frames
+_SPINNER = re.compile(r"^\s*[-\\|/]\s*$")
+
+
+@dataclass
+class Progress:
+    """Progress of a running command: percent done and, while downloading, bytes done/total."""
+    percent: int
+    downloaded: Optional[int] = None
+    total: Optional[int] = None
+
+    def __str__(self) -> str:
+        if self.total:
+            return f"{self.percent}% ({self.downloaded / 1024 ** 2:.1f}/{self.total / 1024 ** 2:.1f} MB)"
+        return f"{self.percent}%"
+
+
+def _size(value: str, unit: str) -> int:
+    return int(float(value.replace(",", ".")) * _SIZE_UNITS[unit.upper()])
+
+
+class WingetProgressParser:
+    """
+    Turns winget's progress bar and spinner lines into Progress events. A new event is only passed
+    on when the whole percent changes, so a download does not produce more than 101 events.
+    """
+
+    def __init__(self, on_progress: Callable[[Progress], None]):
+        self.on_progress = on_progress
+        self._last: Optional[int] = None
+
+    def parse(self, line: str) -> Optional[Progress]:
+        match = _SIZE_PROGRESS.search(line)
+        if match:
+            downloaded, total = _size(*match.group(1, 2)), _size(*match.group(3, 4))
+            if total <= 0:
+                return None
+            return Progress(min(100, downloaded * 100 // total), downloaded, total)
+        match = _PERCENT_PROGRESS.search(line)
+        if match and ("█" in line or "▒" in line or line.strip() == match.group(0)):
+            return Progress(min(100, int(match.group(1))))
+        return None
+
+    def __call__(self, stream: str, line: str) -> bool:
+        """Output callback for SubprocessRunner.run; True if the line was progress (and not worth keeping)."""
+        if _SPINNER.match(line):
+            return True
+        progress = self.parse(line)
+        if progress is None:
+            return False
+        if progress.percent != self._last:
+            self._last = progress.percent
+            self.on_progress(progress)
+        return True
+
+
+def kill_process_tree(process: subprocess.Popen) -> None:
+    """Kill a process and everything it started (the shell and winget, the installer winget runs, ...)."""
+    try:
+        if os.name == "nt":
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)], capture_output=True, timeout=30)
+        else:
+            # The process leads its own session (start_new_session), so its group is the whole tree
+            os.killpg(process.pid, signal.SIGKILL)
+    except (OSError, subprocess.SubprocessError):
+        pass
+    try:
+        process.kill()
+    except OSError:
+        pass
+
+
+class SubprocessRunner:
+    """Runs external commands through subprocess, the way the workers always have."""
+
+    def run(
+        self, args: List[str], timeout: Optional[float] = None,
+        on_output: Optional[Callable[[str, str], Optional[bool]]] = None, max_lines: Optional[int] = OUTPUT_TAIL_LINES
+    ) -> subprocess.CompletedProcess:
+        """
+        Run a command and return the completed process. Output is read line by line while the command
+        runs; `on_output(stream, line)` sees every line ("stdout"/"stderr") and returns True for lines
+        that should not be kept, such as progress bars. Only the last `max_lines` lines of each stream
+        are kept (all of them with None). On timeout the whole process tree is killed and
+        subprocess.TimeoutExpired is raised with the output read so far.
+        """
+        # Through the shell on Windows as before; elsewhere an argument list must be run directly
+        if os.name == "nt":
+            platform_options = {"shell": True, "creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+        else:
+            platform_options = {"start_new_session": True}
+        # Universal newlines also end a line at "\r", which is how winget redraws its progress bar
+        process = subprocess.Popen(
+            args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            text=True, errors="replace", **platform_options
+        )
+        stdout: Deque[str] = deque(maxlen=max_lines)
+        stderr: Deque[str] = deque(maxlen=max_lines)
+        readers = [
+            threading.Thread(target=self._read, args=(process.stdout, "stdout", stdout, on_output), daemon=True),
+            threading.Thread(target=self._read, args=(process.stderr, "stderr", stderr, on_output), daemon=True),
+        ]
+        for reader in readers:
+            reader.start()
+        try:
+            returncode = process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            kill_process_tree(process)
+            process.wait()
+            self._join(readers)
+            raise subprocess.TimeoutExpired(args, timeout, output="".join(stdout), stderr="".join(stderr))
+        except BaseException:
+            kill_process_tree(process)
+            raise
+        self._join(readers)
+        return subprocess.CompletedProcess(args, returncode, "".join(stdout), "".join(stderr))
+
+    @staticmethod
+    def _read(pipe, stream: str, lines: Deque[str], on_output) -> None:
+        try:
+            for line in pipe:
+                if on_output is not None:
+                    try:
+                        if on_output(stream, line.rstrip("\n")):
+                            continue
+                    except Exception:
+                        pass
+                lines.append(line)
+        except (OSError, ValueError):
+            pass
+        finally:
+            pipe.close()
+
+    @staticmethod
+    def _join(readers: List[threading.Thread]) -> None:
+        # A grandchild that outlived the tree kill could still hold the pipes open
+        for reader in readers:
+            reader.join(_READER_JOIN_TIMEOUT)
+
+
+_command_runner = SubprocessRunner()
+
+
+def get_command_runner():
+    """Get the runner used for winget/PowerShell/pip commands."""
+    return _command_runner
+
+
+def set_command_runner(runner) -> None:
+    """
+    Replace the command runner (e.g. with a fake one when running on Linux). A replacement needs a
+    `run(args, timeout=None, on_output=None, max_lines=...)` method with the same behaviour.
+    """
+    global _command_runner
+    _command_runner = runner
@@ -0,0 +1,99 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+from pathlib import Path
+
+from utils.logger import logger
+
+# Resource classes whose steps must not overlap. Windows Installer runs one MSI at a time.
+DEFAULT_RESOURCE_LIMITS = {"msi": 1}
+
+
+class TaskScheduler:
+    """Runs work items on a bounded thread pool and serializes steps that share a resource class."""
+
+    def __init__(self, max_workers: int = 4, resource_limits: Optional[Dict[str, int]] = None):
+        self.max_workers = max(1, int(max_workers))
+        limits = dict(DEFAULT_RESOURCE_LIMITS)
+        limits.update(resource_limits or {})
+        self._resources = {name: threading.BoundedSemaphore(max(1, int(limit))) for name, limit in limits.items()}
+        self._keyed_locks: Dict[Hashable, threading.Lock] = {}
+        self._keyed_locks_guard = threading.Lock()
+        self._callback_lock = threading.Lock()
+
+    @contextmanager
+    def resource(self, name: Optional[str]):
+        """Hold a slot of the given resource class. Unknown or empty names are not limited."""
+        semaphore = self._resources.get(name) if name else None
+        if semaphore is None:
+            yield
+            return
+        with semaphore:
+            yield
+
+    @contextmanager
+    def exclusive(self, key: Hashable):
+        """Hold a lock private to `key`, e.g. so the same package is never installed twice at once."""
+        with self._keyed_locks_guard:
+            lock = self._keyed_locks.setdefault(key, threading.Lock())
+        with lock:
+            yield
+
+    def run_groups(
+        self,
+        groups: Sequence[Tuple[Hashable, List[Any]]],
+        work: Callable[[Any], bool],
+        on_group_start: Optional[Callable[[Hashable], None]] = None,
+        on_group_done: Optional[Callable[[Hashable, bool], None]] = None,
+    ) -> Dict[Hashable, bool]:
+        """
+        Run `work(item)` for every item of every group concurrently and wait for all of them.
+        A group succeeds only if all of its items succeed. Callbacks are called one at a time:
+        `on_group_start` when the group's first item starts, `on_group_done` when its last item ends.
+        """
+        results: Dict[Hashable, bool] = {}
+        remaining: Dict[Hashable, int] = {}
+        started = set()
+        state_lock = threading.Lock()
+
+        def call(callback, *args):
+            if callback is None:
+                return
+            with self._callback_lock:
+                try:
+                    callback(*args)
+                except Exception as e:
+                    logger.error("Scheduler callback failed: %s", e, file=Path(__file__).name)
+
+        def run_item(key, item):
+            with state_lock:
+                first = key not in started
+                started.add(key)
+            if first:
+                call(on_group_start, key)
+            try:
+                ok = bool(work(item))
+            except Exception as e:
+                logger.error("Scheduled work for %s failed: %s", item, e, file=Path(__file__).name)
+                ok = False
+            with state_lock:
+                results[key] = results.get(key, True) and ok
+                remaining[key] -= 1
+                last = remaining[key] == 0
+                group_ok = results[key]
+            if last:
+                call(on_group_done, key, group_ok)
+
+        for key, items in groups:
+            remaining[key] = len(items)
+            if not items:
+                results[key] = False
+                call(on_group_start, key)
+                call(on_group_done, key, False)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for key, items in groups:
+                for item in items:
+                    executor.submit(run_item, key, item)
+        return results
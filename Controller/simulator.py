@@ -0,0 +1,243 @@
+import hashlib
+import json
+import math
+import random
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+from pathlib import Path
+
+from Controller.runner import OUTPUT_TAIL_LINES
+
+# Latency distributions, in seconds of simulated time:
+#   ("fixed", seconds), ("uniform", low, high), ("lognormal", median, sigma)
+Latency = Tuple[Any, ...]
+
+
+@dataclass
+class CommandProfile:
+    """How one type of command behaves in the simulation: latency, exit code mix (code -> weight) and output."""
+    latency: Latency = ("fixed", 1.0)
+    exit_codes: Dict[int, float] = field(default_factory=lambda: {0: 1.0})
+    stdout: str = ""
+    stderr: str = ""
+
+    def sample_latency(self, rng: random.Random) -> float:
+        kind, *params = self.latency
+        if kind == "fixed":
+            return float(params[0])
+        if kind == "uniform":
+            return rng.uniform(float(params[0]), float(params[1]))
+        if kind == "lognormal":
+            median, sigma = float(params[0]), float(params[1])
+            return rng.lognormvariate(math.log(median), sigma)
+        raise ValueError(f"Unknown latency distribution {kind!r}")
+
+    def sample_exit_code(self, rng: random.Random) -> int:
+        codes = list(self.exit_codes)
+        return rng.choices(codes, weights=[self.exit_codes[code] for code in codes])[0]
+
+
+# Rough numbers from imaging runs; override them per command type with a JSON profile file
+DEFAULT_PROFILES: Dict[str, CommandProfile] = {
+    "winget_install": CommandProfile(("lognormal", 45, 0.8), {0: 0.88, -1978335189: 0.04, -1978335224: 0.04, 1603: 0.04}, "Successfully installed\n"),
+    "winget_uninstall": CommandProfile(("lognormal", 8, 0.6), {0: 0.8, -1978335212: 0.15, 1: 0.05}, "Successfully uninstalled\n"),
+    "winget_download": CommandProfile(("lognormal", 20, 0.8), {0: 0.95, -1978335224: 0.05}, "Installer downloaded\n"),
+    "winget_show": CommandProfile(("lognormal", 1.5, 0.3), {0: 1.0}, "Installer:\n  Installer Type: exe\n"),
+    "winget_list": CommandProfile(("lognormal", 6, 0.3), {0: 1.0}),
+    "winget_export": CommandProfile(("lognormal", 6, 0.3), {0: 1.0}),
+    "pip_resolve": CommandProfile(("lognormal", 4, 0.3), {1: 1.0}, stderr="simulated: no package index\n"),
+    "pip": CommandProfile(("lognormal", 25, 0.5), {0: 0.95, 1: 0.05}, "Successfully installed\n"),
+    "gpupdate": CommandProfile(("lognormal", 12, 0.3), {0: 1.0}, "Computer Policy update has completed successfully.\n"),
+    "registry_read": CommandProfile(("lognormal", 1.0, 0.3), {0: 1.0}, "[]"),
+    "registry_write": CommandProfile(("lognormal", 0.3, 0.3), {0: 0.98, 1: 0.02}),
+    "powershell": CommandProfile(("lognormal", 2, 0.5), {0: 0.95, 1: 0.05}),
+    "installer": CommandProfile(("lognormal", 30, 0.8), {0: 0.95, 1603: 0.05}),
+    "other": CommandProfile(("fixed", 1.0), {0: 1.0}),
+}
+
+
+# Installer types a simulated `winget download` stages (type -> weight); exe installers get manifest switches
+SIMULATED_INSTALLER_TYPES: Dict[str, float] = {"msi": 0.25, "exe": 0.25, "inno": 0.2, "nullsoft": 0.15, "msix": 0.15}
+
+
+def classify(args: Sequence[str]) -> str:
+    """Command type of a command line, as used for the profiles."""
+    parts = [str(part) for part in args]
+    program = Path(parts[0]).name.lower() if parts else ""
+    words = [part.lower() for part in parts[1:]]
+    if program in ("winget", "winget.exe"):
+        verb = words[0] if words else ""
+        return {"install": "winget_install", "uninstall": "winget_uninstall", "download": "winget_download",
+                "show": "winget_show", "list": "winget_list", "export": "winget_export"}.get(verb, "other")
+    if "pip" in words and "install" in words:
+        return "pip_resolve" if "--dry-run" in words else "pip"
+    if program in ("gpupdate", "gpupdate.exe"):
+        return "gpupdate"
+    if program in ("powershell", "powershell.exe", "pwsh"):
+        script = " ".join(parts[1:])
+        if "Get-ItemProperty" in script:
+            return "registry_read"
+        if "Set-ItemProperty" in script:
+            return "registry_write"
+        return "powershell"
+    if program in ("msiexec", "msiexec.exe") or program.endswith(".exe"):
+        return "installer"
+    return "other"
+
+
+def load_profiles(path: Optional[Union[str, Path]] = None) -> Dict[str, CommandProfile]:
+    """
+    The default profiles, with the command types in the JSON file at `path` replaced, e.g.
+    {"winget_install": {"latency": ["lognormal", 30, 0.5], "exit_codes": {"0": 0.8, "1603": 0.2}}}.
+    """
+    profiles = dict(DEFAULT_PROFILES)
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            overrides = json.load(f)
+        for kind, spec in overrides.items():
+            base = profiles.get(kind, CommandProfile())
+            profiles[kind] = CommandProfile(
+                latency=tuple(spec.get("latency", base.latency)),
+                exit_codes={int(code): float(weight) for code, weight in spec.get("exit_codes", base.exit_codes).items()},
+                stdout=spec.get("stdout", base.stdout),
+                stderr=spec.get("stderr", base.stderr),
+            )
+    return profiles
+
+
+class SimulatedRunner:
+    """
+    Command runner that runs nothing: every command sleeps for a latency drawn from its type's profile
+    (times `time_scale`) and exits with a code drawn from the profile's mix. winget installs report
+    download progress like winget does, and `winget download` stages a small installer file with a
+    manifest of a random installer type, so the installer cache gets hits. Draws come from one seeded
+    generator, so a run is reproducible as long as the phases ask in the same order.
+    """
+
+    def __init__(self, profiles: Optional[Dict[str, CommandProfile]] = None, seed: Optional[int] = None, time_scale: float = 1.0):
+        self.profiles = profiles or dict(DEFAULT_PROFILES)
+        self.time_scale = time_scale
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        # (command type, start, end) in time.monotonic(), and exit codes per command type
+        self.calls: List[Tuple[str, float, float]] = []
+        self.exit_codes: Dict[str, Dict[int, int]] = {}
+
+    def run(self, args, timeout: Optional[float] = None,
+            on_output: Optional[Callable[[str, str], Optional[bool]]] = None, max_lines: Optional[int] = OUTPUT_TAIL_LINES) -> subprocess.CompletedProcess:
+        kind = classify(args)
+        profile = self.profiles.get(kind) or self.profiles.get("other") or CommandProfile()
+        with self._lock:
+            latency = profile.sample_latency(self._rng)
+            exit_code = profile.sample_exit_code(self._rng)
+            if kind == "winget_download":
+                types = list(SIMULATED_INSTALLER_TYPES)
+                installer_type = self._rng.choices(types, weights=[SIMULATED_INSTALLER_TYPES[t] for t in types])[0]
+        started = time.monotonic()
+        try:
+            if timeout is not None and latency > timeout:
+                time.sleep(timeout * self.time_scale)
+                raise subprocess.TimeoutExpired(args, timeout)
+            if kind == "winget_install" and on_output is not None:
+                self._download(latency * self.time_scale, on_output)
+            else:
+                time.sleep(latency * self.time_scale)
+        finally:
+            with self._lock:
+                self.calls.append((kind, started, time.monotonic()))
+        if kind == "winget_download" and exit_code == 0:
+            self._stage_download(args, installer_type)
+        with self._lock:
+            codes = self.exit_codes.setdefault(kind, {})
+            codes[exit_code] = codes.get(exit_code, 0) + 1
+        return subprocess.CompletedProcess(args, exit_code, profile.stdout, profile.stderr if exit_code else "")
+
+    @staticmethod
+    def _stage_download(args: Sequence[str], installer_type: str) -> None:
+        """Write what `winget download` leaves in its download directory: the installer and its manifest."""
+        args = list(args)
+        winget_id = args[args.index("--id") + 1]
+        directory = Path(args[args.index("--download-directory") + 1])
+        directory.mkdir(parents=True, exist_ok=True)
+        extension = {"msi": ".msi", "msix": ".msix"}.get(installer_type, ".exe")
+        payload = f"simulated installer of {winget_id}\n".encode("utf-8")
+        (directory / f"{winget_id}_{installer_type}{extension}").write_bytes(payload)
+        manifest = [
+            f"PackageIdentifier: {winget_id}",
+            "PackageVersion: 1.0.0",
+            "Installers:",
+            "- Architecture: x64",
+            f"  InstallerType: {installer_type}",
+            "  Scope: machine",
+            f"  InstallerSha256: {hashlib.sha256(payload).hexdigest().upper()}",
+        ]
+        if installer_type == "exe":
+            manifest += ["  InstallerSwitches:", "    Silent: /quiet", "    SilentWithProgress: /passive"]
+        (directory / f"{winget_id}_{installer_type}.yaml").write_text("\n".join(manifest + ["ManifestType: singleton", ""]), encoding="utf-8")
+
+    @staticmethod
+    def _download(seconds: float, on_output, steps: int = 5, total_mb: float = 24.5) -> None:
+        for step in range(1, steps + 1):
+            time.sleep(seconds / steps)
+            on_output("stdout", f"  ██████▒▒▒▒  {total_mb * step / steps:.1f} MB / {total_mb:.1f} MB")
+
+    def stats(self, since: Optional[float] = None, until: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Calls and seconds per command type, total process seconds and the time any process was running,
+        counting only the part of each call between `since` and `until` (time.monotonic()) when given.
+        """
+        with self._lock:
+            calls = [
+                (kind, max(started, since) if since is not None else started, min(ended, until) if until is not None else ended)
+                for kind, started, ended in self.calls
+            ]
+            calls = [call for call in calls if call[2] > call[1]]
+            exit_codes = {kind: dict(codes) for kind, codes in self.exit_codes.items()}
+        by_kind: Dict[str, Dict[str, Any]] = {}
+        for kind, started, ended in calls:
+            entry = by_kind.setdefault(kind, {"calls": 0, "seconds": 0.0})
+            entry["calls"] += 1
+            entry["seconds"] += ended - started
+        for kind, entry in by_kind.items():
+            entry["seconds"] = round(entry["seconds"], 3)
+            entry["exit_codes"] = {str(code): count for code, count in sorted(exit_codes.get(kind, {}).items())}
+        # Union of the process intervals: time during which at least one process was running
+        busy, current_start, current_end = 0.0, None, None
+        for _, started, ended in sorted(calls, key=lambda call: call[1]):
+            if current_end is None or started > current_end:
+                if current_end is not None:
+                    busy += current_end - current_start
+                current_start, current_end = started, ended
+            else:
+                current_end = max(current_end, ended)
+        if current_end is not None:
+            busy += current_end - current_start
+        return {
+            "calls": len(calls),
+            "process_seconds": round(sum(ended - started for _, started, ended in calls), 3),
+            "busy_seconds": round(busy, 3),
+            "by_kind": dict(sorted(by_kind.items())),
+        }
+
+
+class SimulatedPowerShellHost:
+    """Stands in for the PowerShell host: scripts go to the simulated runner as powershell commands."""
+
+    def __init__(self, runner: SimulatedRunner):
+        self.runner = runner
+
+    def start(self) -> None:
+        pass
+
+    def start_async(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    def run(self, script: str, timeout: Optional[float] = None) -> subprocess.CompletedProcess:
+        result = self.runner.run(["powershell", "-Command", script], timeout=timeout)
+        return subprocess.CompletedProcess(script, result.returncode, result.stdout, result.stderr)
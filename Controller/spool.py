@@ -0,0 +1,158 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, List, Optional, Sequence, Tuple
+from pathlib import Path
+
+from utils.logger import logger
+
+# A spooled row: (key, computer_name, task_type, task_name, status, timestamp, duration_ms, exit_code, attempt, uuid)
+SpooledRow = Tuple[str, str, str, str, str, str, Optional[int], Optional[int], int, str]
+
+# Columns added after the first version of the journal
+_ADDED_COLUMNS = {"duration_ms": "INTEGER", "exit_code": "INTEGER", "attempt": "INTEGER NOT NULL DEFAULT 1", "uuid": "TEXT"}
+
+
+def report_key(computer_name: str, task_type: str, task_name: str, status: str, timestamp: str) -> str:
+    """Stable key of a report row, so the same row is never spooled or replayed twice."""
+    raw = "\x1f".join(str(part) for part in (computer_name, task_type, task_name, status, timestamp))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def key_uuid(key: str) -> str:
+    """report_uuid for a row spooled before rows carried one, derived from its key so every replay uses the same."""
+    return str(uuid.UUID(key[:32]))
+
+
+def format_timestamp(value) -> str:
+    """Format a report timestamp the way MySQL stores DATETIME (whole seconds)."""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return str(value)
+
+
+class ReportSpool:
+    """Append-only SQLite journal of REPORT rows that could not be written to MySQL."""
+
+    def __init__(self, path: Path, max_bytes: int = 20 * 1024 * 1024):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(str(self.path), timeout=30)
+        if not self._initialized:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS spool ("
+                " key TEXT PRIMARY KEY, computer_name TEXT, task_type TEXT, task_name TEXT,"
+                " status TEXT, timestamp TEXT, created REAL,"
+                " duration_ms INTEGER, exit_code INTEGER, attempt INTEGER NOT NULL DEFAULT 1, uuid TEXT)"
+            )
+            # Journals written before the timing columns and uuid existed
+            existing = {row[1] for row in connection.execute("PRAGMA table_info(spool)")}
+            for name, definition in _ADDED_COLUMNS.items():
+                if name not in existing:
+                    connection.execute(f"ALTER TABLE spool ADD COLUMN {name} {definition}")
+            self._initialized = True
+        return connection
+
+    def append(self, rows: Sequence[Tuple]) -> int:
+        """
+        Spool (computer_name, task_type, task_name, status, timestamp[, duration_ms, exit_code, attempt[, uuid]])
+        rows. Returns how many were new.
+        """
+        now = time.time()
+        records = []
+        for row in rows:
+            computer_name, task_type, task_name, status, timestamp = row[:5]
+            duration_ms, exit_code, attempt = row[5:8] if len(row) > 5 else (None, None, 1)
+            timestamp = format_timestamp(timestamp)
+            key = report_key(computer_name, task_type, task_name, status, timestamp)
+            row_uuid = row[8] if len(row) > 8 else key_uuid(key)
+            records.append((key, computer_name, task_type, task_name, status, timestamp, now, duration_ms, exit_code, attempt, row_uuid))
+        with self._lock:
+            connection = self._connect()
+            try:
+                before = connection.total_changes
+                with connection:
+                    connection.executemany(
+                        "INSERT OR IGNORE INTO spool (key, computer_name, task_type, task_name, status, timestamp, created,"
+                        " duration_ms, exit_code, attempt, uuid) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", records
+                    )
+                added = connection.total_changes - before
+            finally:
+                connection.close()
+            self._compact_if_needed()
+        return added
+
+    def count(self) -> int:
+        if not self.path.exists():
+            return 0
+        with self._lock:
+            connection = self._connect()
+            try:
+                return connection.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+            finally:
+                connection.close()
+
+    def replay(self, write_batch: Callable[[List[SpooledRow]], None], batch_size: int = 100) -> int:
+        """
+        Hand spooled rows to `write_batch` oldest first and remove each batch once it was written.
+        `write_batch` must raise on failure and be idempotent (each row keeps its uuid); replay stops
+        at the first failed batch. Returns how many rows were replayed.
+        """
+        if not self.path.exists():
+            return 0
+        replayed = 0
+        with self._lock:
+            connection = self._connect()
+            try:
+                while True:
+                    batch = connection.execute(
+                        "SELECT key, computer_name, task_type, task_name, status, timestamp, duration_ms, exit_code, attempt, uuid"
+                        " FROM spool ORDER BY created, rowid LIMIT ?",
+                        (batch_size,)
+                    ).fetchall()
+                    if not batch:
+                        break
+                    # Rows spooled by a version without uuids
+                    batch = [row if row[9] else row[:9] + (key_uuid(row[0]),) for row in batch]
+                    try:
+                        write_batch(batch)
+                    except Exception as e:
+                        logger.warning(f"Replaying spooled reports stopped: {e}", file=Path(__file__).name)
+                        break
+                    with connection:
+                        connection.executemany("DELETE FROM spool WHERE key = ?", [(row[0],) for row in batch])
+                    replayed += len(batch)
+            finally:
+                connection.close()
+        if replayed:
+            logger.info(f"Replayed {replayed} spooled report rows", file=Path(__file__).name)
+        return replayed
+
+    def _compact_if_needed(self) -> None:
+        """Drop the oldest rows and vacuum once the journal grows past its size cap."""
+        try:
+            if self.path.stat().st_size <= self.max_bytes:
+                return
+        except OSError:
+            return
+        connection = self._connect()
+        try:
+            total = connection.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+            drop = max(1, total // 4)
+            with connection:
+                connection.execute(
+                    "DELETE FROM spool WHERE key IN (SELECT key FROM spool ORDER BY created, rowid LIMIT ?)", (drop,)
+                )
+            connection.execute("VACUUM")
+            logger.warning(f"Report spool exceeded {self.max_bytes} bytes, dropped {drop} oldest rows", file=Path(__file__).name)
+        finally:
+            connection.close()
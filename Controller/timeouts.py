@@ -0,0 +1,147 @@
+import json
+import math
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from pathlib import Path
+
+from Controller.bundle import atomic_write_bytes
+from Controller.config import config_manager
+from utils.logger import logger
+
+HISTORY_FILE = Path("Storage") / "durations.json"
+
+# (default, floor, ceiling) in seconds per command kind. The default applies until a command has
+# enough history; the computed timeout never goes below the floor or above the ceiling.
+TIMEOUT_LIMITS: Dict[str, Tuple[float, float, float]] = {
+    "winget_install": (600, 120, 3600),
+    "installer": (600, 120, 3600),
+    "winget_uninstall": (300, 60, 1800),
+    "appx_uninstall": (300, 60, 900),
+    "powershell": (300, 30, 1800),
+    "gpupdate": (300, 60, 900),
+    "pip": (300, 60, 1800),
+}
+
+# Successful durations kept per command, newest last
+HISTORY_SAMPLES = 50
+# With fewer samples the history may only raise the default, not lower it
+MIN_SAMPLES = 3
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    """Nearest-rank percentile (0 < p <= 100) of a non-empty sequence."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def parse_override(value: Any) -> Optional[float]:
+    """The 'timeout' of a catalog entry in seconds, or None when it is missing or not a positive number."""
+    if value in (None, ""):
+        return None
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        logger.warning(f"Ignoring invalid timeout override {value!r}", file=Path(__file__).name)
+        return None
+    return seconds if seconds > 0 else None
+
+
+class AdaptiveTimeouts:
+    """
+    Timeouts from the durations a command took on this machine before: p99 of its last successful
+    runs times the timeout_factor setting, within the floor and ceiling of its kind. A hung small
+    package is cut after a few minutes while a large one keeps the time it needs. A command that
+    timed out gets twice that limit the next time (up to the ceiling), so a package that needs more
+    than the default can still build up a history. A 'timeout' on the catalog entry overrides it all.
+    The history lives in Storage/durations.json, keyed by "<kind>:<package or task>". Records are
+    kept in memory and written by save(), which runs at the end of every phase and at exit.
+    """
+
+    def __init__(self, path: Path = HISTORY_FILE, limits: Optional[Dict[str, Tuple[float, float, float]]] = None):
+        self.path = Path(path)
+        self.limits = dict(limits or TIMEOUT_LIMITS)
+        self._lock = threading.Lock()
+        # Serializes writers, so an older snapshot never replaces a newer one
+        self._save_lock = threading.Lock()
+        self._history: Optional[Dict[str, Dict[str, Any]]] = None
+        self._dirty = False
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        # Called with the lock held
+        if self._history is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self._history = data if isinstance(data, dict) else {}
+            except FileNotFoundError:
+                self._history = {}
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read the duration history {self.path}, starting a new one: {e}", file=Path(__file__).name)
+                self._history = {}
+        return self._history
+
+    def reload(self) -> None:
+        """Forget the loaded history and unsaved records (e.g. after the path changed); it is read again when needed."""
+        with self._lock:
+            self._history = None
+            self._dirty = False
+
+    def timeout_for(self, kind: str, name: str, override: Any = None) -> float:
+        """Seconds the `kind` command for `name` may run; `override` is the catalog entry's 'timeout'."""
+        seconds = parse_override(override)
+        if seconds is not None:
+            return seconds
+        default, floor, ceiling = self.limits[kind]
+        with self._lock:
+            entry = self._load().get(f"{kind}:{name}", {})
+            durations: List[float] = list(entry.get("durations", []))
+            timed_out = entry.get("timed_out")
+        factor = config_manager.get_timeout_factor()
+        if len(durations) >= MIN_SAMPLES:
+            seconds = percentile(durations, 99) * factor
+        else:
+            seconds = max([default] + [duration * factor for duration in durations])
+        if timed_out:
+            seconds = max(seconds, timed_out * 2)
+        return round(min(ceiling, max(floor, seconds)))
+
+    def record(self, kind: str, name: str, seconds: float) -> None:
+        """Add the duration of a successful run; it is written with the next save()."""
+        key = f"{kind}:{name}"
+        with self._lock:
+            history = self._load()
+            entry = history.get(key, {})
+            durations = (list(entry.get("durations", [])) + [round(seconds, 1)])[-HISTORY_SAMPLES:]
+            history[key] = {"durations": durations}
+            self._dirty = True
+
+    def record_timeout(self, kind: str, name: str, timeout: float) -> None:
+        """Note that a run was killed after `timeout` seconds, so the next one gets longer."""
+        key = f"{kind}:{name}"
+        with self._lock:
+            history = self._load()
+            entry = dict(history.get(key, {}))
+            entry["timed_out"] = max(timeout, entry.get("timed_out") or 0)
+            history[key] = entry
+            self._dirty = True
+        logger.warning("%s timed out after %.0f s; it gets up to %.0f s next time", key, timeout, self.timeout_for(kind, name), file=Path(__file__).name)
+
+    def save(self) -> None:
+        """Write the history if anything was recorded since it was last saved."""
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = json.dumps(self._history, ensure_ascii=False, sort_keys=True).encode("utf-8")
+                path = self.path
+                self._dirty = False
+            try:
+                atomic_write_bytes(path, data)
+            except OSError as e:
+                with self._lock:
+                    self._dirty = True
+                logger.error(f"Could not save the duration history to {path}: {e}", file=Path(__file__).name)
+
+
+# Global instance
+adaptive_timeouts = AdaptiveTimeouts()
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+from pathlib import Path
+
+from Controller.bundle import atomic_write_bytes
+from Controller.config import config_manager
+from Controller.runner import get_command_runner
+from utils.logger import logger
+
+WHEELHOUSE_DIR = Path("Storage") / "wheelhouse"
+LOCK_FILE = "python-lock.json"
+CONSTRAINTS_FILE = "constraints.txt"
+DOWNLOAD_CHUNK = 64 * 1024
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _python_version() -> str:
+    return f"{sys.version_info.major}.{sys.version_info.minor}"
+
+
+class Wheelhouse:
+    """
+    Local directory of Python distributions pinned by a lock file with sha256 hashes.
+    The lock is resolved once from PyPI; afterwards every machine installs from the directory
+    with `pip --no-index --find-links`, so nothing is downloaded while the lock matches the catalog.
+    """
+
+    def __init__(self, path: Path = WHEELHOUSE_DIR, max_bytes: Optional[int] = None, download_workers: int = 4):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.download_workers = download_workers
+
+    @property
+    def lock_path(self) -> Path:
+        return self.path / LOCK_FILE
+
+    def load_lock(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.lock_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def resolve(self, packages: Sequence[str], runner=None, python: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Let pip resolve `packages` (without installing anything) and write the pinned result, with
+        download URL and sha256 of every distribution, to the lock file.
+        """
+        runner = runner or get_command_runner()
+        self.path.mkdir(parents=True, exist_ok=True)
+        fd, report_path = tempfile.mkstemp(dir=str(self.path), prefix=".report.", suffix=".json")
+        os.close(fd)
+        try:
+            result = runner.run(
+                [python or sys.executable, "-m", "pip", "install", "--disable-pip-version-check", "--dry-run",
+                 "--ignore-installed", "--quiet", "--report", report_path, *packages],
+                timeout=600
+            )
+            if result.returncode != 0:
+                raise RuntimeError(f"pip could not resolve the dependencies: {(result.stderr or '').strip()[-500:]}")
+            with open(report_path, "r", encoding="utf-8") as f:
+                report = json.load(f)
+        finally:
+            os.remove(report_path)
+
+        entries = []
+        for item in report.get("install", []):
+            download = item.get("download_info", {})
+            hashes = download.get("archive_info", {}).get("hashes", {})
+            if "sha256" not in hashes:
+                raise RuntimeError(f"No sha256 for {download.get('url')}")
+            url = download["url"]
+            entries.append({
+                "name": item["metadata"]["name"],
+                "version": item["metadata"]["version"],
+                "url": url,
+                "filename": url.rsplit("/", 1)[-1].split("#", 1)[0],
+                "sha256": hashes["sha256"],
+            })
+        lock = {
+            "requested": sorted(packages),
+            "python": _python_version(),
+            "platform": sys.platform,
+            "resolved_at": datetime.now().isoformat(timespec="seconds"),
+            "packages": sorted(entries, key=lambda entry: entry["name"].lower()),
+        }
+        atomic_write_bytes(self.lock_path, json.dumps(lock, indent=4).encode("utf-8"))
+        logger.info(f"Resolved {len(packages)} python packages to {len(entries)} pinned distributions", file=Path(__file__).name)
+        return lock
+
+    def verify(self, entry: Dict[str, Any]) -> bool:
+        """True if the distribution of a lock entry is in the wheelhouse and its hash matches."""
+        path = self.path / entry["filename"]
+        try:
+            return file_sha256(path) == entry["sha256"]
+        except OSError:
+            return False
+
+    def download(self, lock: Dict[str, Any]) -> List[str]:
+        """
+        Download every locked distribution that is missing or corrupt, in parallel, checking the hash
+        before it is put into the wheelhouse. Returns the file names that could not be obtained.
+        """
+        def fetch(entry) -> Optional[str]:
+            if self.verify(entry):
+                return None
+            target = self.path / entry["filename"]
+            # Streamed to a .part file and renamed once the hash matched, so large wheels are never held in memory
+            partial = target.with_name(target.name + ".part")
+            digest = hashlib.sha256()
+            try:
+                with urllib.request.urlopen(entry["url"], timeout=120) as response, open(partial, "wb") as f:
+                    for chunk in iter(lambda: response.read(DOWNLOAD_CHUNK), b""):
+                        digest.update(chunk)
+                        f.write(chunk)
+                if digest.hexdigest() != entry["sha256"]:
+                    raise ValueError("sha256 mismatch")
+                os.replace(partial, target)
+                logger.info(f"Downloaded {entry['filename']} ({target.stat().st_size} bytes)", file=Path(__file__).name)
+                return None
+            except Exception as e:
+                try:
+                    partial.unlink()
+                except OSError:
+                    pass
+                logger.error(f"Could not download {entry['filename']}: {e}", file=Path(__file__).name)
+                return entry["filename"]
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=self.download_workers) as executor:
+            return [name for name in executor.map(fetch, lock["packages"]) if name]
+
+    def evict(self, keep: Sequence[str] = ()) -> int:
+        """Delete the least recently used distributions until the wheelhouse fits its size cap."""
+        max_bytes = self.max_bytes if self.max_bytes is not None else config_manager.get_wheelhouse_max_bytes()
+        files = [
+            path for path in self.path.iterdir()
+            if path.is_file() and not path.name.startswith(".") and path.name not in (LOCK_FILE, CONSTRAINTS_FILE)
+        ]
+        total = sum(path.stat().st_size for path in files)
+        evicted = 0
+        keep = set(keep)
+        for path in sorted(files, key=lambda path: path.stat().st_mtime):
+            if total <= max_bytes:
+                break
+            if path.name in keep:
+                continue
+            total -= path.stat().st_size
+            path.unlink()
+            evicted += 1
+        if evicted:
+            logger.info(f"Evicted {evicted} distributions from the wheelhouse", file=Path(__file__).name)
+        return evicted
+
+    def prepare(self, packages: Sequence[str], runner=None) -> Optional[List[str]]:
+        """
+        Make sure the wheelhouse holds a verified copy of everything `packages` needs and return the
+        pip arguments for an offline install, or None if pip has to fall back to the index.
+        The network is only used when the lock is missing or stale, or a distribution is missing or corrupt.
+        """
+        try:
+            lock = self.load_lock()
+            if (lock is None or lock.get("requested") != sorted(packages)
+                    or lock.get("platform") != sys.platform or lock.get("python") != _python_version()):
+                lock = self.resolve(packages, runner)
+            missing = [entry for entry in lock["packages"] if not self.verify(entry)]
+            if missing:
+                logger.info(f"{len(missing)} distributions missing from the wheelhouse", file=Path(__file__).name)
+                if self.download(lock):
+                    return None
+            filenames = [entry["filename"] for entry in lock["packages"]]
+            for name in filenames:
+                # Mark as recently used for eviction
+                os.utime(self.path / name)
+            self.evict(keep=filenames)
+            constraints = "".join(f"{entry['name']}=={entry['version']}\n" for entry in lock["packages"])
+            atomic_write_bytes(self.path / CONSTRAINTS_FILE, constraints.encode("utf-8"))
+        except Exception as e:
+            logger.error(f"Wheelhouse unavailable, installing from the package index: {e}", file=Path(__file__).name)
+            return None
+        return ["--no-index", "--find-links", str(self.path.resolve()), "--constraint", str((self.path / CONSTRAINTS_FILE).resolve())]
+
+
+# Global instance
+wheelhouse = Wheelhouse()
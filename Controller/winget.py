@@ -0,0 +1,101 @@
+import subprocess
+import time
+from typing import List, Optional
+from pathlib import Path
+
+from Controller.config import config_manager
+from Controller.exitcodes import SUCCESS, run_with_retry, succeeded
+from Controller.installers import installer_cache
+from Controller.inventory import inventory
+from Controller.metrics import run_metrics
+from Controller.runner import WingetProgressParser, get_command_runner
+from Controller.timeouts import adaptive_timeouts
+from utils.logger import logger
+
+# Installer types that go through Windows Installer and therefore cannot run side by side
+MSI_INSTALLER_TYPES = {"msi", "wix", "burn"}
+
+
+def split_winget_ids(winget_field: Optional[str]) -> List[str]:
+    """Split a catalog 'winget' field ("A, B, C") into package IDs."""
+    if not winget_field:
+        return []
+    return [winget_id.strip() for winget_id in winget_field.split(',') if winget_id.strip()]
+
+
+def install_winget_id(winget_id: str, scheduler, runner=None, on_progress=None, timeout=None) -> bool:
+    """
+    Install one winget package, unless the inventory snapshot already lists it. A prefetched installer
+    from the installer cache is run directly, anything else goes through `winget install`. Packages are
+    handled in parallel. The scheduler's "msi" resource only exists because Windows Installer runs one
+    package at a time: it is held while an MSI-based installer runs, and for `winget install` (which
+    downloads and installs in one command) for that whole command. The installer type comes from the
+    cache entry; no extra `winget show` is made for it. Unknown types run unconstrained unless the
+    serialize_unknown_installers setting says otherwise; an MSI that collides with another one fails
+    with "another installation in progress", which is retried. `on_progress(progress)` gets winget's download
+    and install progress (Controller.runner.Progress) while it runs. Transient failures (see
+    Controller.exitcodes) are retried with backoff, without holding the resource while waiting.
+    Each run gets the package's adaptive timeout (Controller.timeouts) unless `timeout` (the catalog
+    entry's override) is given.
+    """
+    runner = runner or get_command_runner()
+    with scheduler.exclusive(winget_id):
+        if inventory.is_installed(winget_id):
+            logger.info("%s is already installed (version %s), skipping winget.", winget_id, inventory.get_version(winget_id) or "unknown", file=Path(__file__).name)
+            run_metrics.note_exit_code(winget_id, 0)
+            return True
+        # A prefetched installer is run directly; anything else is downloaded and installed by winget
+        cached = installer_cache.lookup(winget_id)
+        installer_type = cached["type"] if cached else ""
+        if installer_type:
+            resource = "msi" if installer_type in MSI_INSTALLER_TYPES else None
+        else:
+            resource = "msi" if config_manager.get_serialize_unknown_installers() else None
+        logger.info("Installing %s (installer type: %s)...", winget_id, installer_type or 'unknown', file=Path(__file__).name)
+        kind = "installer" if cached else "winget_install"
+        limit = adaptive_timeouts.timeout_for(kind, winget_id, timeout)
+        try:
+            if cached:
+                with scheduler.resource(resource):
+                    started = time.monotonic()
+                    if installer_cache.install(winget_id, cached, runner, timeout=limit):
+                        adaptive_timeouts.record(kind, winget_id, time.monotonic() - started)
+                        logger.info("Successfully installed %s from the installer cache.", winget_id, file=Path(__file__).name)
+                        inventory.record_install(winget_id)
+                        return True
+                # Falls back to winget install
+                kind = "winget_install"
+                limit = adaptive_timeouts.timeout_for(kind, winget_id, timeout)
+
+            durations = []
+
+            def winget_install():
+                with scheduler.resource(resource):
+                    started = time.monotonic()
+                    result = runner.run(
+                        ["winget", "install", "--id", winget_id, "--accept-source-agreements", "--accept-package-agreements"],
+                        timeout=limit,
+                        on_output=WingetProgressParser(on_progress) if on_progress else None
+                    )
+                    durations.append(time.monotonic() - started)
+                    return result
+
+            result, outcome, attempts = run_with_retry(winget_install, "install", key=winget_id)
+            if not succeeded(outcome):
+                raise subprocess.CalledProcessError(
+                    returncode=result.returncode, cmd=result.args, output=result.stdout, stderr=result.stderr
+                )
+            # "Already installed" returns at once and says nothing about how long an install takes
+            if outcome == SUCCESS:
+                adaptive_timeouts.record(kind, winget_id, durations[-1])
+            logger.info("Successfully installed or already present: %s (%s, attempt %d).", winget_id, outcome, attempts, file=Path(__file__).name)
+            inventory.record_install(winget_id)
+            return True
+        except subprocess.TimeoutExpired:
+            run_metrics.note_exit_code(winget_id, None)
+            adaptive_timeouts.record_timeout(kind, winget_id, limit)
+            logger.error("Installation of %s timed out after %.0f seconds", winget_id, limit, file=Path(__file__).name)
+            return False
+        except subprocess.CalledProcessError as e:
+            logger.error("Failed to install %s (%s, %d attempt(s)).\n--- Winget Output ---\nSTDOUT: %s\nSTDERR: %s\n---------------------", winget_id, outcome, attempts, e.output, e.stderr, file=Path(__file__).name)
+            return False
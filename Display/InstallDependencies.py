@@ -1,95 +1,96 @@
-import json
-import subprocess
 import threading
 from Controller.mysql import insert_report
 from Controller.config import config_manager
+from Controller.journal import checkpoint_journal
+from Controller.repository import catalog_repository
+from Controller.installers import installer_cache
+from Controller.metrics import run_metrics
+from Controller.inventory import inventory
+from Controller.scheduler import TaskScheduler
+from Controller.winget import install_winget_id, split_winget_ids
 from utils.logger import logger
 from pathlib import Path
 
-def _install_all_dependencies_worker(page_instance, tasks_to_install, initial_load=False):
+def _install_all_dependencies_worker(page_instance, tasks_to_install):
     """
     Worker function to install all dependencies in a separate thread.
     Updates the UI via page_instance.after().
     """
-    json_path = config_manager.get_functions_path() / "DependenciesWinget.json"
     # Load computer_name using config manager
     try:
         computer_name = config_manager.get_computer_name()
     except Exception as e:
-        logger.error(f"Error loading computer name: {e}", file=Path(__file__).name)
+        logger.error("Error loading computer name: %s", e, file=Path(__file__).name)
         computer_name = ''
     try:
-        with open(json_path, "r", encoding="utf-8") as f:
-            tasks_data = json.load(f)
+        catalog = catalog_repository.get("DependenciesWinget.json")
+        inventory.ensure_loaded()
+        # One package at a time, as before
+        scheduler = TaskScheduler(max_workers=1)
 
         for index, task_name in enumerate(tasks_to_install):
             def schedule_ui_update(color):
                 page_instance.after(0, lambda name=task_name, i=index, c=color: page_instance.set_task_status(name, i, c))
 
-            schedule_ui_update('yellow')
+            def schedule_progress_update(progress):
+                page_instance.after(0, lambda name=task_name, i=index, p=progress: page_instance.set_task_progress(name, i, p))
 
-            target_task = next((task for task in tasks_data.values() if task.get("Name") == task_name), None)
+            target_task = catalog.find(task_name)
+            if checkpoint_journal.is_done("dependencies", task_name, target_task):
+                logger.info("'%s' was completed before the restart, skipping it.", task_name, file=Path(__file__).name)
+                schedule_ui_update('#2E7D32')
+                run_metrics.task_finished("dependencies", task_name, 'resumed')
+                continue
+            schedule_ui_update('yellow')
+            run_metrics.task_started("dependencies", task_name)
             
             task_successful = True
+            winget_ids = []
             if not target_task or not target_task.get("winget"):
-                logger.error(f"No valid winget task found for '{task_name}'.", file=Path(__file__).name)
+                logger.error("No valid winget task found for '%s'.", task_name, file=Path(__file__).name)
                 task_successful = False
             else:
-                winget_ids = [id.strip() for id in target_task.get("winget").split(',')]
+                winget_ids = split_winget_ids(target_task.get("winget"))
                 for winget_id in winget_ids:
-                    logger.info(f"Installing {winget_id}...", file=Path(__file__).name)
-                    try:
-                        result = subprocess.run(
-                            ["winget", "install", "--id", winget_id, "--accept-source-agreements", "--accept-package-agreements"],
-                            capture_output=True, text=True, shell=True,
-                            timeout=600  # 10 minute timeout for installations
-                        )
-                        success_codes = {0, -1978335148, -1978335189, -1978334963, -1978334962, -1978335189, 0x8A150054, 0x8A15010D, 0x8A15010E, 0x8a15002b}
-                        if result.returncode not in success_codes:
-                            raise subprocess.CalledProcessError(
-                                returncode=result.returncode, cmd=result.args, output=result.stdout, stderr=result.stderr
-                            )
-                        logger.info(f"Successfully installed or already present: {winget_id}.", file=Path(__file__).name)
-                    except subprocess.TimeoutExpired:
-                        logger.error(f"Installation of {winget_id} timed out after 10 minutes", file=Path(__file__).name)
-                        task_successful = False
-                        break
-                    except subprocess.CalledProcessError as e:
-                        logger.error(f"Failed to install {winget_id}.\n--- Winget Output ---\nSTDOUT: {e.output}\nSTDERR: {e.stderr}\n---------------------", file=Path(__file__).name)
+                    if not install_winget_id(winget_id, scheduler, on_progress=schedule_progress_update, timeout=target_task.get("timeout")):
                         task_successful = False
                         break
+                hits, misses = installer_cache.task_summary(winget_ids)
+                logger.info("Task '%s': installer cache hits %d, misses %d", task_name, hits, misses, file=Path(__file__).name)
             
             final_color = '#2E7D32' if task_successful else '#C62828'
             schedule_ui_update(final_color)
             status = 'success' if task_successful else 'failure'
-            logger.info(f"Task '{task_name}' completed with status: {status}", file=Path(__file__).name)
-            insert_report(computer_name, 'instalacija dodataka', task_name, status)
+            logger.info("Task '%s' completed with status: %s", task_name, status, file=Path(__file__).name, task=task_name, phase='instalacija dodataka', status=status)
+            record = run_metrics.task_finished("dependencies", task_name, status, run_metrics.exit_code_of(winget_ids), run_metrics.attempts_of(winget_ids))
+            insert_report(computer_name, 'instalacija dodataka', task_name, status, record.duration_ms, record.exit_code, record.attempt)
+            checkpoint_journal.task_done("dependencies", task_name, target_task, status, catalog.version)
 
     except Exception as e:
-        logger.error(f"An error occurred during installation: {e}", file=Path(__file__).name)
+        logger.error("An error occurred during installation: %s", e, file=Path(__file__).name)
     finally:
-        if initial_load:
-            page_instance.after(1200, lambda: page_instance.change_tab(4, initial_load=True))
+        inventory.refresh_pending_async()
 
-def update_dependencies_tasks(page_instance, initial_load=False, auto_install=False):
+def _load_dependencies_tasks(page_instance):
+    catalog = catalog_repository.get("DependenciesWinget.json")
+    task_names = [task.get("Name", "Nepoznat zadatak") for task in catalog.in_category("Instalacija dodataka")]
+    page_instance.update_tasks(task_names)
+    return task_names
+
+def run_dependencies_tasks(page_instance):
+    """Load tasks from DependenciesWinget.json and install them in the calling thread (a pipeline phase)."""
+    _install_all_dependencies_worker(page_instance, _load_dependencies_tasks(page_instance))
+
+def update_dependencies_tasks(page_instance, auto_install=False):
     """Load tasks from DependenciesWinget.json and optionally auto-install them."""
-    json_path = config_manager.get_functions_path() / "DependenciesWinget.json"
     try:
-        with open(json_path, "r", encoding="utf-8") as f:
-            tasks_data = json.load(f)
-            task_names = [
-                task.get("Name", "Nepoznat zadatak")
-                for task in tasks_data.values()
-                if task.get("category") == "Instalacija dodataka"
-            ]
-            page_instance.update_tasks(task_names)
-
-            if auto_install:
-                threading.Thread(
-                    target=_install_all_dependencies_worker,
-                    args=(page_instance, task_names, initial_load),
-                    daemon=True
-                ).start()
+        task_names = _load_dependencies_tasks(page_instance)
+        if auto_install:
+            threading.Thread(
+                target=_install_all_dependencies_worker,
+                args=(page_instance, task_names),
+                daemon=True
+            ).start()
     except Exception as e:
-        logger.error(f"Error loading dependency tasks: {e}", file=Path(__file__).name)
+        logger.error("Error loading dependency tasks: %s", e, file=Path(__file__).name)
         page_instance.update_tasks([f"Greška pri učitavanju: {e}"])
\ No newline at end of file
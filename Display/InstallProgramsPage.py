@@ -1,93 +1,119 @@
-import json
-import subprocess
 import threading
 from Controller.mysql import insert_report
 from Controller.config import config_manager
+from Controller.journal import checkpoint_journal
+from Controller.repository import catalog_repository
+from Controller.installers import installer_cache
+from Controller.metrics import run_metrics
+from Controller.inventory import inventory
+from Controller.scheduler import TaskScheduler
+from Controller.winget import install_winget_id, split_winget_ids
 from utils.logger import logger
 from pathlib import Path
 
-def _install_all_programs_worker(page_instance, tasks_to_install, initial_load=False, tour_completion_callback=None):
+def _install_all_programs_worker(page_instance, tasks_to_install, scheduler=None):
     """
     Worker function to install all programs in a separate thread.
+    Winget packages are installed concurrently through a TaskScheduler.
     """
-    json_path = config_manager.get_functions_path() / "DependenciesWinget.json"
     # Load computer_name using config manager
     try:
         computer_name = config_manager.get_computer_name()
     except Exception as e:
-        logger.error(f"Error loading computer name: {e}", file=Path(__file__).name)
+        logger.error("Error loading computer name: %s", e, file=Path(__file__).name)
         computer_name = ''
+    if scheduler is None:
+        scheduler = TaskScheduler(max_workers=config_manager.get_max_parallel_installs())
     try:
-        with open(json_path, "r", encoding="utf-8") as f:
-            tasks_data = json.load(f)
+        catalog = catalog_repository.get("DependenciesWinget.json")
+        inventory.ensure_loaded()
 
-        for index, task_name in enumerate(tasks_to_install):
-            def schedule_ui_update(color):
-                page_instance.after(0, lambda name=task_name, i=index, c=color: page_instance.set_task_status(name, i, c))
+        def schedule_ui_update(index, color):
+            task_name = tasks_to_install[index]
+            page_instance.after(0, lambda name=task_name, i=index, c=color: page_instance.set_task_status(name, i, c))
+
+        def schedule_progress_update(winget_id, progress):
+            index = task_of[winget_id]
+            task_name = tasks_to_install[index]
+            page_instance.after(0, lambda name=task_name, i=index, p=progress: page_instance.set_task_progress(name, i, p))
 
-            schedule_ui_update('yellow')
-            
-            target_task = next((task for task in tasks_data.values() if task.get("Name") == task_name), None)
-            
-            task_successful = True
-            if not target_task or not target_task.get("winget"):
-                logger.error(f"No valid winget task found for '{task_name}'.", file=Path(__file__).name)
-                task_successful = False
-            else:
-                winget_ids = [id.strip() for id in target_task.get("winget").split(',')]
-                for winget_id in winget_ids:
-                    logger.info(f"Installing {winget_id}...", file=Path(__file__).name)
-                    try:
-                        result = subprocess.run(
-                            ["winget", "install", "--id", winget_id, "--accept-source-agreements", "--accept-package-agreements"],
-                            capture_output=True, text=True, shell=True,
-                            timeout=600  # 10 minute timeout for installations
-                        )
-                        success_codes = {0, -1978335148, -1978335189, -1978334963, -1978334962, -1978335189, 0x8A150054, 0x8A15010D, 0x8A15010E, 0x8a15002b}
-                        if result.returncode not in success_codes:
-                            raise subprocess.CalledProcessError(
-                                returncode=result.returncode, cmd=result.args, output=result.stdout, stderr=result.stderr
-                            )
-                        logger.info(f"Successfully installed or already present: {winget_id}.", file=Path(__file__).name)
-                    except subprocess.TimeoutExpired:
-                        logger.error(f"Installation of {winget_id} timed out after 10 minutes", file=Path(__file__).name)
-                        task_successful = False
-                        break
-                    except subprocess.CalledProcessError as e:
-                        logger.error(f"Failed to install {winget_id}.\n--- Winget Output ---\nSTDOUT: {e.output}\nSTDERR: {e.stderr}\n---------------------", file=Path(__file__).name)
-                        task_successful = False
-                        break
+        def on_task_start(index):
+            schedule_ui_update(index, 'yellow')
+            run_metrics.task_started("programs", tasks_to_install[index])
+
+        def on_task_done(index, task_successful):
+            task_name = tasks_to_install[index]
             final_color = '#2E7D32' if task_successful else '#C62828'
-            schedule_ui_update(final_color)
+            schedule_ui_update(index, final_color)
             status = 'success' if task_successful else 'failure'
-            logger.info(f"Task '{task_name}' completed with status: {status}", file=Path(__file__).name)
-            insert_report(computer_name, 'instalacija programa', task_name, status)
+            logger.info("Task '%s' completed with status: %s", task_name, status, file=Path(__file__).name, task=task_name, phase='instalacija programa', status=status)
+            record = run_metrics.task_finished(
+                "programs", task_name, status, run_metrics.exit_code_of(winget_ids_of[index]), run_metrics.attempts_of(winget_ids_of[index])
+            )
+            insert_report(computer_name, 'instalacija programa', task_name, status, record.duration_ms, record.exit_code, record.attempt)
+            checkpoint_journal.task_done("programs", task_name, catalog.find(task_name), status, catalog.version)
+            hits, misses = installer_cache.task_summary(winget_ids_of[index])
+            logger.info("Task '%s': installer cache hits %d, misses %d", task_name, hits, misses, file=Path(__file__).name)
+
+        winget_ids_of = {}
+        # Catalog timeout override per package
+        timeout_of = {}
+        for index, task_name in enumerate(tasks_to_install):
+            target_task = catalog.find(task_name)
+            if checkpoint_journal.is_done("programs", task_name, target_task):
+                logger.info("'%s' was completed before the restart, skipping it.", task_name, file=Path(__file__).name)
+                schedule_ui_update(index, '#2E7D32')
+                run_metrics.task_finished("programs", task_name, 'resumed')
+                continue
+            winget_ids = split_winget_ids(target_task.get("winget") if target_task else None)
+            if not winget_ids:
+                logger.error("No valid winget task found for '%s'.", task_name, file=Path(__file__).name)
+            winget_ids_of[index] = winget_ids
+            for winget_id in winget_ids:
+                timeout_of.setdefault(winget_id, target_task.get("timeout"))
+        groups = list(winget_ids_of.items())
+        # Progress of a package is shown on the (first) task that installs it
+        task_of = {}
+        for index, winget_ids in groups:
+            for winget_id in winget_ids:
+                task_of.setdefault(winget_id, index)
+
+        scheduler.run_groups(
+            groups,
+            lambda winget_id: install_winget_id(
+                winget_id, scheduler, on_progress=lambda progress, winget_id=winget_id: schedule_progress_update(winget_id, progress),
+                timeout=timeout_of.get(winget_id)
+            ),
+            on_group_start=on_task_start,
+            on_group_done=on_task_done
+        )
 
     except Exception as e:
-        logger.error(f"An error occurred during program installation: {e}", file=Path(__file__).name)
+        logger.error("An error occurred during program installation: %s", e, file=Path(__file__).name)
     finally:
-        if tour_completion_callback:
-            page_instance.after(0, tour_completion_callback)
+        logger.info("Installer cache: %s", installer_cache.stats(), file=Path(__file__).name)
+        inventory.refresh_pending_async()
+
+def _load_programs_tasks(page_instance):
+    catalog = catalog_repository.get("DependenciesWinget.json")
+    task_names = [task.get("Name", "Nepoznat zadatak") for task in catalog.in_category("Instalacija programa")]
+    page_instance.update_tasks(task_names)
+    return task_names
+
+def run_programs_tasks(page_instance):
+    """Load tasks from DependenciesWinget.json and install them in the calling thread (a pipeline phase)."""
+    _install_all_programs_worker(page_instance, _load_programs_tasks(page_instance))
 
-def update_programs_tasks(page_instance, initial_load=False, auto_install=False, tour_completion_callback=None):
+def update_programs_tasks(page_instance, auto_install=False):
     """Load tasks from DependenciesWinget.json and optionally auto-install them."""
-    json_path = config_manager.get_functions_path() / "DependenciesWinget.json"
     try:
-        with open(json_path, "r", encoding="utf-8") as f:
-            tasks_data = json.load(f)
-            task_names = [
-                task.get("Name", "Nepoznat zadatak")
-                for task in tasks_data.values()
-                if task.get("category") == "Instalacija programa"
-            ]
-            page_instance.update_tasks(task_names)
-            
-            if auto_install:
-                threading.Thread(
-                    target=_install_all_programs_worker,
-                    args=(page_instance, task_names, initial_load, tour_completion_callback),
-                    daemon=True
-                ).start()
+        task_names = _load_programs_tasks(page_instance)
+        if auto_install:
+            threading.Thread(
+                target=_install_all_programs_worker,
+                args=(page_instance, task_names),
+                daemon=True
+            ).start()
     except Exception as e:
-        logger.error(f"Error loading program tasks: {e}", file=Path(__file__).name)
+        logger.error("Error loading program tasks: %s", e, file=Path(__file__).name)
         page_instance.update_tasks([f"Greška pri učitavanju: {e}"])
@@ -1,71 +1,92 @@
-import json
-import subprocess
 import threading
-import sys
 from Controller.mysql import insert_report
 from Controller.config import config_manager
+from Controller.journal import checkpoint_journal
+from Controller.metrics import run_metrics
+from Controller.pythondeps import install_python_packages
+from Controller.repository import catalog_repository
+from Controller.wheelhouse import wheelhouse
 from utils.logger import logger
 from pathlib import Path
 
-def _install_all_python_deps_worker(page_instance, tasks_to_install, initial_load=False):
+def _install_all_python_deps_worker(page_instance, tasks_to_install):
     """
     Worker function to install all python dependencies in a separate thread.
+    All packages go to pip in one run; a failed run is bisected to find the failing packages.
+    Packages are installed from the local wheelhouse when possible.
     """
-    python_executable = sys.executable
     # Load computer_name using config manager
     try:
         computer_name = config_manager.get_computer_name()
     except Exception as e:
-        logger.error(f"Error loading computer name: {e}", file=Path(__file__).name)
+        logger.error("Error loading computer name: %s", e, file=Path(__file__).name)
         computer_name = ''
 
+    indexes = {}
     for index, task_name in enumerate(tasks_to_install):
-        def schedule_ui_update(color):
-            page_instance.after(0, lambda name=task_name, i=index, c=color: page_instance.set_task_status(name, i, c))
+        indexes.setdefault(task_name, index)
 
-        schedule_ui_update('yellow')
-        task_successful = True
-        try:
-            logger.info(f"Installing {task_name}...", file=Path(__file__).name)
-            subprocess.run(
-                [python_executable, "-m", "pip", "install", task_name],
-                check=True, capture_output=True, text=True,
-                timeout=300  # 5 minute timeout
-            )
-            logger.info(f"Successfully installed {task_name}.", file=Path(__file__).name)
-        except subprocess.TimeoutExpired:
-            logger.error(f"Installation of {task_name} timed out after 5 minutes", file=Path(__file__).name)
-            task_successful = False
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Failed to install {task_name}. Stderr: {e.stderr}", file=Path(__file__).name)
-            task_successful = False
-        except Exception as e:
-            logger.error(f"An error occurred installing {task_name}: {e}", file=Path(__file__).name)
-            task_successful = False
+    def schedule_ui_update(task_name, color):
+        index = indexes[task_name]
+        page_instance.after(0, lambda name=task_name, i=index, c=color: page_instance.set_task_status(name, i, c))
+
+    reported = set()
+
+    def on_result(task_name, task_successful):
+        reported.add(task_name)
         final_color = '#2E7D32' if task_successful else '#C62828'
-        schedule_ui_update(final_color)
+        schedule_ui_update(task_name, final_color)
         status = 'success' if task_successful else 'failure'
-        logger.info(f"Task '{task_name}' completed with status: {status}", file=Path(__file__).name)
-        insert_report(computer_name, 'python dodaci', task_name, status)
-    if initial_load:
-        page_instance.after(1200, lambda: page_instance.change_tab(5, initial_load=True))
+        logger.info("Task '%s' completed with status: %s", task_name, status, file=Path(__file__).name, task=task_name, phase='python dodaci', status=status)
+        record = run_metrics.task_finished("python_dependencies", task_name, status, run_metrics.exit_code_of([task_name]))
+        insert_report(computer_name, 'python dodaci', task_name, status, record.duration_ms, record.exit_code, record.attempt)
+        checkpoint_journal.task_done("python_dependencies", task_name, task_name, status)
+
+    for task_name in [task_name for task_name in indexes if checkpoint_journal.is_done("python_dependencies", task_name, task_name)]:
+        logger.info("'%s' was installed before the restart, skipping it.", task_name, file=Path(__file__).name)
+        schedule_ui_update(task_name, '#2E7D32')
+        run_metrics.task_finished("python_dependencies", task_name, 'resumed')
+        reported.add(task_name)
+    pending = [task_name for task_name in indexes if task_name not in reported]
+    if not pending:
+        return
+
+    # pip installs them together, so every package starts now
+    for task_name in pending:
+        schedule_ui_update(task_name, 'yellow')
+        run_metrics.task_started("python_dependencies", task_name)
+    try:
+        logger.info("Installing %d python packages: %s", len(pending), ', '.join(pending), file=Path(__file__).name)
+        # Offline from the local wheelhouse when it has everything, otherwise from the package index
+        pip_args = wheelhouse.prepare(pending) or []
+        install_python_packages(pending, extra_args=pip_args, on_result=on_result)
+    except Exception as e:
+        logger.error("An error occurred installing python packages: %s", e, file=Path(__file__).name)
+        for task_name in pending:
+            if task_name not in reported:
+                on_result(task_name, False)
+
+def _load_python_dependencies_tasks(page_instance):
+    catalog = catalog_repository.get("PythonDependencies.json")
+    task_names = [task["name"] for task in catalog.entries]
+    page_instance.update_tasks(task_names)
+    return task_names
+
+def run_python_dependencies_tasks(page_instance):
+    """Load tasks from PythonDependencies.json and install them in the calling thread (a pipeline phase)."""
+    _install_all_python_deps_worker(page_instance, _load_python_dependencies_tasks(page_instance))
 
-def update_python_dependencies_tasks(page_instance, initial_load=False, auto_install=False):
+def update_python_dependencies_tasks(page_instance, auto_install=False):
     """Load tasks from PythonDependencies.json and optionally auto-install them."""
-    json_path = config_manager.get_functions_path() / "PythonDependencies.json"
     try:
-        with open(json_path, "r", encoding="utf-8") as f:
-            tasks_data = json.load(f)
-            task_names = tasks_data.get("dependencies", [])
-            page_instance.update_tasks(task_names)
-            
-            if auto_install:
-                threading.Thread(
-                    target=_install_all_python_deps_worker,
-                    args=(page_instance, task_names, initial_load),
-                    daemon=True
-                ).start()
+        task_names = _load_python_dependencies_tasks(page_instance)
+        if auto_install:
+            threading.Thread(
+                target=_install_all_python_deps_worker,
+                args=(page_instance, task_names),
+                daemon=True
+            ).start()
 
     except Exception as e:
-        logger.error(f"Error loading python dependency tasks: {e}", file=Path(__file__).name)
+        logger.error("Error loading python dependency tasks: %s", e, file=Path(__file__).name)
         page_instance.update_tasks([f"Greška pri učitavanju: {e}"])
@@ -1,31 +1,80 @@
+import os
+import sys
+import time
 import tkinter as tk
 import ttkbootstrap as ttk
 from ttkbootstrap.dialogs import Messagebox
 from ttkbootstrap.constants import *
+from Controller.config import config_manager
+from Controller.journal import checkpoint_journal
+from Controller.metrics import run_metrics
+from Controller.pipeline import PhasePipeline, PENDING, WAITING, RUNNING, DONE, FAILED
 from .WindowsSettingsPage import update_main_tasks
 from .GroupPolicy import update_group_policy_tasks
 from .UninstallProgramsPage import update_uninstall_programs_tasks
 from .InstallDependencies import update_dependencies_tasks
 from .InstallPythonDependenciesPage import update_python_dependencies_tasks
 from .InstallProgramsPage import update_programs_tasks
+from .phases import TOUR_PHASES, build_tour_phases
+from .status_queue import TaskStatusQueue
 from utils.logger import logger
 from pathlib import Path
 
+# Tab label style and marker per phase state
+PHASE_STATE_STYLES = {PENDING: "secondary", WAITING: "secondary", RUNNING: "warning", DONE: "success", FAILED: "danger"}
+PHASE_STATE_MARKS = {PENDING: "", WAITING: "…", RUNNING: "▶", DONE: "✓", FAILED: "✗"}
+
+# How often queued task updates are applied to the task list, in ms
+STATUS_TICK_MS = 100
+# Status column text per task color
+TASK_STATUS_TEXT = {'yellow': "U tijeku", '#2E7D32': "Uspješno", '#C62828': "Neuspješno"}
+
+class PhaseView:
+    """What a phase worker sees of MainPage: the task list of its own tab, whichever tab is shown."""
+
+    def __init__(self, page, tab_index):
+        self.page = page
+        self.tab_index = tab_index
+
+    def after(self, ms, func=None, *args):
+        # Workers only use after() to report task status, which goes through the status queue,
+        # so the callback runs right away in the worker's thread
+        if func is not None:
+            func(*args)
+
+    def update_tasks(self, tasks):
+        self.page.status_queue.set_tasks(self.tab_index, tasks)
+
+    def set_task_status(self, task_name, task_index, color):
+        self.page.status_queue.set_status(self.tab_index, task_index, task_name, color)
+
+    def set_task_progress(self, task_name, task_index, progress):
+        self.page.status_queue.set_progress(self.tab_index, task_index, task_name, str(progress))
+
 class MainPage(ttk.Frame):
-    def __init__(self, parent, on_automation_finished=None):
+    def __init__(self, parent, on_automation_finished=None, resume=False):
         super().__init__(parent)
-        self.auto_install_triggered = set()
         self.active_tab_index = 0
-        self.task_colors = {}
+        self.task_lists = {}
+        # Per tab: task index -> [color, started, finished], progress text of running tasks, and how many tasks have finished
+        self.task_states = {}
+        self.task_progress = {}
+        self.finished_counts = {}
+        self.status_queue = TaskStatusQueue()
+        self._status_tick = None
+        self._task_tags = set()
         self.tour_in_progress = True
+        self.follow_tour = True
         self.on_automation_finished = on_automation_finished
+        self.phase_tabs = {key: tab_index for tab_index, key, _, _, _ in TOUR_PHASES}
+        self.phase_states = {tab_index: PENDING for tab_index in self.phase_tabs.values()}
 
         # Main layout: left for tabs, right for tasks
         self.columnconfigure(1, weight=1)
         self.rowconfigure(0, weight=1)
 
         # Vertical tabs on the left (non-interactive)
-        tab_names = ["Postavljanje Windowsa", "Group Policy", "Brisanje programa", "Instalacija dodataka", "Instalacija python dodataka", "Instalacija programa"]
+        self.tab_names = tab_names = ["Postavljanje Windowsa", "Group Policy", "Brisanje programa", "Instalacija dodataka", "Instalacija python dodataka", "Instalacija programa"]
         tabs_frame = ttk.Frame(self, bootstyle="secondary")
         tabs_frame.grid(row=0, column=0, sticky="ns", padx=(10, 5), pady=10)
         self.tab_labels = []
@@ -51,91 +100,237 @@ class MainPage(ttk.Frame):
         tasks_label = ttk.Label(tasks_frame, text="Popis zadataka")
         tasks_label.grid(row=0, column=0, sticky="w", pady=(0, 5))
 
-        self.tasks_list = tk.Listbox(tasks_frame, height=10, background="#2E2E2E", foreground="#FFFFFF", selectbackground="#4A4A4A", selectforeground="#FFFFFF")
+        # Rows are keyed by task index, so a status update touches only its own row
+        self.tasks_list = ttk.Treeview(tasks_frame, columns=("task", "status", "duration"), show="headings", height=10)
+        self.tasks_list.heading("task", text="Zadatak", anchor="w")
+        self.tasks_list.heading("status", text="Status", anchor="w")
+        self.tasks_list.heading("duration", text="Trajanje", anchor="e")
+        self.tasks_list.column("task", anchor="w", stretch=True, width=360)
+        self.tasks_list.column("status", anchor="w", stretch=False, width=200)
+        self.tasks_list.column("duration", anchor="e", stretch=False, width=90)
         self.tasks_list.grid(row=1, column=0, sticky="nsew")
 
         scrollbar = ttk.Scrollbar(tasks_frame, orient=tk.VERTICAL, command=self.tasks_list.yview)
         scrollbar.grid(row=1, column=1, sticky="ns")
         self.tasks_list.config(yscrollcommand=scrollbar.set)
 
-        self.change_tab(0, initial_load=True)
+        self.change_tab(0)
+        self._status_tick = self.after(STATUS_TICK_MS, self.drain_status_queue)
+        self.start_guided_tour(resume)
+
+    def start_guided_tour(self, resume=False):
+        """
+        Run all phases through the phase pipeline; independent phases run at the same time.
+        With `resume`, work the checkpoint journal has as completed is skipped.
+        """
+        run_metrics.reset()
+        # Started again from RunOnce after a reboot until the tour has finished, if configured
+        relaunch = [sys.executable, os.path.abspath(sys.argv[0]), "--resume"] if config_manager.get_resume_after_reboot() else None
+        checkpoint_journal.begin(config_manager.get_computer_name(), resume=resume, relaunch=relaunch)
+        self.pipeline = PhasePipeline(build_tour_phases(lambda tab_index: PhaseView(self, tab_index)))
+        self.pipeline.start(
+            on_phase_state=lambda key, state: self.after(0, lambda: self.on_phase_state(key, state)),
+            on_complete=lambda results: self.after(0, self.end_guided_tour)
+        )
+
+    def on_phase_state(self, key, state):
+        """Shows a phase's new state on its tab; the view follows the running phases until a tab is clicked."""
+        tab_index = self.phase_tabs[key]
+        self.phase_states[tab_index] = state
+        self.set_active_tab(self.active_tab_index)
+        if state == RUNNING and self.follow_tour:
+            self.change_tab(tab_index)
 
     def on_tab_click(self, tab_index):
-        """Handles a manual tab click, respecting the guided tour status."""
-        if not self.tour_in_progress:
-            self.change_tab(tab_index, initial_load=False)
-        else:
-            logger.info("Automated setup in progress. Please wait.", file=Path(__file__).name)
+        """Handles a manual tab click. During the guided tour this only changes what is shown."""
+        if self.tour_in_progress:
+            self.follow_tour = False
+        self.change_tab(tab_index)
 
     def end_guided_tour(self):
         """Marks the end of the guided tour, enabling manual navigation."""
         logger.info("Automated setup complete. You can now navigate freely.", file=Path(__file__).name)
+        logger.info(
+            f"Task status updates: {self.status_queue.posted} posted, {self.status_queue.coalesced} coalesced before reaching the UI",
+            file=Path(__file__).name
+        )
         self.tour_in_progress = False
+        checkpoint_journal.finish(complete=run_metrics.succeeded())
         if self.on_automation_finished:
             self.on_automation_finished()
         
+        run_metrics.write_textfile()
+        summary = run_metrics.summary()
+        logger.info(f"Run summary:\n{summary}", file=Path(__file__).name)
+
         # Show message box when automation ends
-        Messagebox.show_info("Automatska instalacija završena", "Automatska instalacija softvera je završena.\nSada možete slobodno koristiti sve tabove.", parent=self)
+        Messagebox.show_info(
+            "Automatska instalacija završena",
+            f"Automatska instalacija softvera je završena.\nSada možete slobodno koristiti sve tabove.\n\n{summary}",
+            parent=self
+        )
 
-    def set_task_status(self, task_name, task_index, color):
-        """Updates the color of a task in the list and stores it."""
-        if self.active_tab_index not in self.task_colors:
-            self.task_colors[self.active_tab_index] = {}
-        
-        # Check if the task is still visible at the given index
-        if self.tasks_list.size() > task_index and self.tasks_list.get(task_index) == task_name:
-            self.task_colors[self.active_tab_index][task_name] = color
-            
-            options = {'bg': color}
-            if color == 'yellow':
-                options['fg'] = 'black'
-            else:
-                options['fg'] = '#FFFFFF'  # Default text color
-            self.tasks_list.itemconfig(task_index, options)
-
-    def change_tab(self, tab_index, initial_load=False):
-        """Change the active tab and update the task list."""
+    def set_task_status(self, task_name, task_index, color, tab_index=None):
+        """Queues a task's new status for a tab (the active tab by default); it is shown on the next tick."""
+        if tab_index is None:
+            tab_index = self.active_tab_index
+        self.status_queue.set_status(tab_index, task_index, task_name, color)
+
+    def set_task_progress(self, task_name, task_index, progress, tab_index=None):
+        """Queues the progress (e.g. of a winget download) of a running task."""
+        if tab_index is None:
+            tab_index = self.active_tab_index
+        self.status_queue.set_progress(tab_index, task_index, task_name, str(progress))
+
+    def drain_status_queue(self):
+        """Applies everything the workers posted since the last tick, at most one change per task."""
+        try:
+            task_lists, updates, progress = self.status_queue.drain()
+            changed_tabs = set()
+            for tab_index, tasks in task_lists.items():
+                self.update_tasks(tasks, tab_index=tab_index)
+            for (tab_index, task_index), (task_name, color, started, finished) in updates.items():
+                if self._apply_task_status(tab_index, task_index, task_name, color, started, finished):
+                    changed_tabs.add(tab_index)
+            for (tab_index, task_index), (task_name, text) in progress.items():
+                self._apply_task_progress(tab_index, task_index, task_name, text)
+            for tab_index in changed_tabs:
+                self.set_tab_label(tab_index)
+            self._refresh_running_durations()
+        except Exception as e:
+            logger.error(f"Error applying task status updates: {e}", file=Path(__file__).name)
+        finally:
+            self._status_tick = self.after(STATUS_TICK_MS, self.drain_status_queue)
+
+    def destroy(self):
+        if self._status_tick is not None:
+            self.after_cancel(self._status_tick)
+            self._status_tick = None
+        super().destroy()
+
+    def _apply_task_status(self, tab_index, task_index, task_name, color, started, finished):
+        """Stores a task's status and updates its row if the tab is shown. Returns False for stale updates."""
+        tasks = self.task_lists.get(tab_index, [])
+        if len(tasks) <= task_index or tasks[task_index] != task_name:
+            return False
+        states = self.task_states.setdefault(tab_index, {})
+        previous = states.get(task_index)
+        was_finished = previous is not None and previous[0] != 'yellow'
+        is_finished = color != 'yellow'
+        self.finished_counts[tab_index] = self.finished_counts.get(tab_index, 0) + is_finished - was_finished
+        states[task_index] = [color, started, finished]
+        self.task_progress.get(tab_index, {}).pop(task_index, None)
+
+        iid = str(task_index)
+        if tab_index == self.active_tab_index and self.tasks_list.exists(iid):
+            self.tasks_list.item(iid, values=self._task_values(tab_index, task_index), tags=(self._task_tag(color),))
+        return True
+
+    def _apply_task_progress(self, tab_index, task_index, task_name, text):
+        tasks = self.task_lists.get(tab_index, [])
+        state = self.task_states.get(tab_index, {}).get(task_index)
+        if len(tasks) <= task_index or tasks[task_index] != task_name or state is None or state[0] != 'yellow':
+            return
+        self.task_progress.setdefault(tab_index, {})[task_index] = text
+        iid = str(task_index)
+        if tab_index == self.active_tab_index and self.tasks_list.exists(iid):
+            self.tasks_list.set(iid, "status", self._task_values(tab_index, task_index)[1])
+
+    def _refresh_running_durations(self):
+        """Ticks the duration of the running tasks in the shown tab."""
+        tab_index = self.active_tab_index
+        tasks = self.task_lists.get(tab_index, [])
+        for task_index, state in self.task_states.get(tab_index, {}).items():
+            if state[0] == 'yellow' and task_index < len(tasks):
+                self.tasks_list.set(str(task_index), "duration", self._format_duration(state))
+
+    def change_tab(self, tab_index):
+        """Change the active tab and show its task list."""
         self.active_tab_index = tab_index
         self.set_active_tab(tab_index)
-        
-        # Decide if auto-install should run for this tab
-        should_auto_install = (tab_index in [1, 2, 3, 4, 5]) and (tab_index not in self.auto_install_triggered)
-
-        if tab_index == 0:
-            update_main_tasks(self, initial_load)
+        if tab_index in self.task_lists:
+            self.show_tasks(tab_index)
+        elif tab_index == 0:
+            update_main_tasks(self)
         elif tab_index == 1:
-            update_group_policy_tasks(self, initial_load, auto_install=should_auto_install)
+            update_group_policy_tasks(self)
         elif tab_index == 2:
-            update_uninstall_programs_tasks(self, initial_load, auto_install=should_auto_install)
+            update_uninstall_programs_tasks(self)
         elif tab_index == 3:
-            update_dependencies_tasks(self, initial_load, auto_install=should_auto_install)
+            update_dependencies_tasks(self)
         elif tab_index == 4:
-            update_python_dependencies_tasks(self, initial_load, auto_install=should_auto_install)
+            update_python_dependencies_tasks(self)
         elif tab_index == 5:
-            completion_callback = self.end_guided_tour if initial_load else None
-            update_programs_tasks(self, initial_load, auto_install=should_auto_install, tour_completion_callback=completion_callback)
+            update_programs_tasks(self)
         else:
             self.update_tasks([])
 
-        if should_auto_install:
-            self.auto_install_triggered.add(tab_index)
+    def update_tasks(self, tasks, tab_index=None):
+        """Set the task list of a tab (the active tab by default) and show it if that tab is active."""
+        if tab_index is None:
+            tab_index = self.active_tab_index
+        tasks = list(tasks)
+        if self.task_lists.get(tab_index) != tasks:
+            # Statuses belong to the task at an index, they do not carry over to a different list
+            self.task_states[tab_index] = {}
+            self.task_progress[tab_index] = {}
+            self.finished_counts[tab_index] = 0
+        self.task_lists[tab_index] = tasks
+        self.set_tab_label(tab_index)
+        if tab_index == self.active_tab_index:
+            self.show_tasks(tab_index)
 
-    def update_tasks(self, tasks):
-        """Update the tasks list with a new list of task names."""
-        self.tasks_list.delete(0, tk.END)
-        task_colors_for_tab = self.task_colors.get(self.active_tab_index, {})
-        for i, task in enumerate(tasks):
-            self.tasks_list.insert(tk.END, task)
-            if task in task_colors_for_tab:
-                bg_color = task_colors_for_tab[task]
-                options = {'bg': bg_color}
-                if bg_color == 'yellow':
-                    options['fg'] = 'black'
-                else:
-                    options['fg'] = '#FFFFFF'
-                self.tasks_list.itemconfig(i, options)
+    def show_tasks(self, tab_index):
+        """Rebuild the task list for a tab; only done when the list or the shown tab changes."""
+        self.tasks_list.delete(*self.tasks_list.get_children())
+        states = self.task_states.get(tab_index, {})
+        for i in range(len(self.task_lists.get(tab_index, []))):
+            state = states.get(i)
+            self.tasks_list.insert(
+                "", tk.END, iid=str(i), values=self._task_values(tab_index, i),
+                tags=(self._task_tag(state[0]),) if state else ()
+            )
+
+    def _task_values(self, tab_index, task_index):
+        task_name = self.task_lists[tab_index][task_index]
+        state = self.task_states.get(tab_index, {}).get(task_index)
+        if state is None:
+            return (task_name, "", "")
+        status = TASK_STATUS_TEXT.get(state[0], "")
+        progress = self.task_progress.get(tab_index, {}).get(task_index)
+        if progress:
+            status = f"{status} {progress}"
+        return (task_name, status, self._format_duration(state))
+
+    @staticmethod
+    def _format_duration(state):
+        _, started, finished = state
+        if started is None:
+            return ""
+        seconds = (finished if finished is not None else time.monotonic()) - started
+        if seconds < 60:
+            return f"{seconds:.1f} s"
+        return f"{int(seconds // 60)}:{int(seconds % 60):02d} min"
+
+    def _task_tag(self, color):
+        """Row tag for a task color, configured the first time it is used."""
+        if color not in self._task_tags:
+            self.tasks_list.tag_configure(color, background=color, foreground='black' if color == 'yellow' else '#FFFFFF')
+            self._task_tags.add(color)
+        return color
+
+    def set_tab_label(self, tab_index):
+        """Show a phase's state and how many of its tasks have finished on its tab."""
+        state = self.phase_states.get(tab_index, PENDING)
+        tasks = self.task_lists.get(tab_index, [])
+        finished = self.finished_counts.get(tab_index, 0)
+        text = self.tab_names[tab_index]
+        if state != PENDING:
+            text = f"{PHASE_STATE_MARKS[state]} {text} {finished}/{len(tasks)}"
+        style = PHASE_STATE_STYLES[state]
+        self.tab_labels[tab_index].config(text=text, bootstyle=f"inverse-{style}" if tab_index == self.active_tab_index else style)
 
     def set_active_tab(self, tab_index):
         """Sets the active tab by highlighting it."""
-        for i, lbl in enumerate(self.tab_labels):
-            lbl.config(bootstyle="inverse-secondary" if i == tab_index else "secondary")
\ No newline at end of file
+        for i in range(len(self.tab_labels)):
+            self.set_tab_label(i)
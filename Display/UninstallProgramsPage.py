@@ -1,70 +1,89 @@
-import json
 import subprocess
 import threading
+import time
 from Controller.mysql import insert_report
 from Controller.config import config_manager
+from Controller.exitcodes import SUCCESS, run_with_retry, succeeded
+from Controller.journal import checkpoint_journal
+from Controller.metrics import run_metrics
+from Controller.repository import catalog_repository
+from Controller.powershell import get_powershell_host
+from Controller.runner import get_command_runner
+from Controller.timeouts import adaptive_timeouts
 from utils.logger import logger
 from pathlib import Path
 
-def _uninstall_all_programs_worker(page_instance, tasks_to_uninstall, initial_load=False):
+def _uninstall_all_programs_worker(page_instance, tasks_to_uninstall):
     """
     Worker function to uninstall all designated programs in a separate thread.
     """
-    json_path = config_manager.get_functions_path() / "UninstallPrograms.json"
     # Load computer_name using config manager
     try:
         computer_name = config_manager.get_computer_name()
     except Exception as e:
-        logger.error(f"Error loading computer name: {e}", file=Path(__file__).name)
+        logger.error("Error loading computer name: %s", e, file=Path(__file__).name)
         computer_name = ''
     try:
-        with open(json_path, "r", encoding="utf-8") as f:
-            tasks_data = json.load(f)
+        catalog = catalog_repository.get("UninstallPrograms.json")
 
         for index, task_name in enumerate(tasks_to_uninstall):
             def schedule_ui_update(color):
                 page_instance.after(0, lambda name=task_name, i=index, c=color: page_instance.set_task_status(name, i, c))
 
+            target_task = catalog.find(task_name)
+            if checkpoint_journal.is_done("uninstall_programs", task_name, target_task):
+                logger.info("'%s' was completed before the restart, skipping it.", task_name, file=Path(__file__).name)
+                schedule_ui_update('#2E7D32')
+                run_metrics.task_finished("uninstall_programs", task_name, 'resumed')
+                continue
             schedule_ui_update('yellow')
-            
-            target_task = next((task for task in tasks_data if task.get("name") == task_name), None)
+            run_metrics.task_started("uninstall_programs", task_name)
             
             task_successful = True
+            exit_code = None
+            attempts = 1
             if not target_task or not target_task.get("name_program"):
-                logger.error(f"No valid program name found for '{task_name}'.", file=Path(__file__).name)
+                logger.error("No valid program name found for '%s'.", task_name, file=Path(__file__).name)
                 task_successful = False
             else:
                 program_name = target_task.get("name_program")
                 source = target_task.get("Source", "AppxPackage")
-                logger.info(f"Uninstalling {program_name} using {source}...", file=Path(__file__).name)
+                logger.info("Uninstalling %s using %s...", program_name, source, file=Path(__file__).name)
                 if source == "Winget":
+                    timeout = adaptive_timeouts.timeout_for("winget_uninstall", program_name, target_task.get("timeout"))
+                    durations = []
+
+                    def winget_uninstall():
+                        started = time.monotonic()
+                        result = get_command_runner().run(["winget", "uninstall", "--id", program_name], timeout=timeout)
+                        durations.append(time.monotonic() - started)
+                        return result
+
                     try:
-                        result = subprocess.run(
-                            ["winget", "uninstall", "--id", program_name],
-                            capture_output=True, text=True, shell=True,
-                            timeout=300  # 5 minute timeout
-                        )
-                        # Winget success codes: 0 (success), 0x8A15002B (already uninstalled), etc.
-                        success_codes = {0, -1978335148, -1978335189, -1978334963, -1978334962, -1978335189, -1978335211, -1978335209, -1978335179, -1978335212, 0x8A150054, 0x8A15010D, 0x8A15010E, 0x8a15002b, 0x8A150015, 0x8A150017, 0x8A150035, 0x8A150014}
-                        if result.returncode not in success_codes:
-                            raise subprocess.Error(
+                        # Transient failures (another install running, package in use, ...) are retried
+                        result, outcome, attempts = run_with_retry(winget_uninstall, "uninstall", key=program_name)
+                        exit_code = result.returncode
+                        if not succeeded(outcome):
+                            raise subprocess.CalledProcessError(
                                 returncode=result.returncode, cmd=result.args, output=result.stdout, stderr=result.stderr
                             )
-                        logger.info(f"Successfully uninstalled or already absent: {program_name}.", file=Path(__file__).name)
+                        if outcome == SUCCESS:
+                            adaptive_timeouts.record("winget_uninstall", program_name, durations[-1])
+                        logger.info("Successfully uninstalled or already absent: %s.", program_name, file=Path(__file__).name)
                     except subprocess.TimeoutExpired:
-                        logger.error(f"Uninstallation of {program_name} timed out after 5 minutes", file=Path(__file__).name)
+                        adaptive_timeouts.record_timeout("winget_uninstall", program_name, timeout)
+                        logger.error("Uninstallation of %s timed out after %.0f seconds", program_name, timeout, file=Path(__file__).name)
                         task_successful = False
                     except subprocess.CalledProcessError as e:
-                        logger.error(f"Failed to uninstall {program_name} (winget).\n--- Winget Output ---\nSTDOUT: {e.output}\nSTDERR: {e.stderr}\n---------------------", file=Path(__file__).name)
+                        logger.error("Failed to uninstall %s (winget).\n--- Winget Output ---\nSTDOUT: %s\nSTDERR: %s\n---------------------", program_name, e.output, e.stderr, file=Path(__file__).name)
                         task_successful = False
                 else:
                     command = f"Get-AppxPackage *{program_name}* | Remove-AppxPackage"
+                    timeout = adaptive_timeouts.timeout_for("appx_uninstall", program_name, target_task.get("timeout"))
                     try:
-                        result = subprocess.run(
-                            ["powershell.exe", "-Command", command],
-                            capture_output=True, text=True, shell=True,
-                            timeout=300  # 5 minute timeout
-                        )
+                        started = time.monotonic()
+                        result = get_powershell_host().run(command, timeout=timeout)
+                        exit_code = result.returncode
                         if result.returncode != 0:
                             # If the command fails, it might be because the app is already uninstalled, which we treat as success.
                             # We check stderr to be more specific.
@@ -72,41 +91,48 @@ def _uninstall_all_programs_worker(page_instance, tasks_to_uninstall, initial_lo
                                  raise subprocess.CalledProcessError(
                                     returncode=result.returncode, cmd=command, output=result.stdout, stderr=result.stderr
                                 )
-                        logger.info(f"Successfully uninstalled or already absent: {program_name}.", file=Path(__file__).name)
+                        if result.returncode == 0:
+                            adaptive_timeouts.record("appx_uninstall", program_name, time.monotonic() - started)
+                        logger.info("Successfully uninstalled or already absent: %s.", program_name, file=Path(__file__).name)
                     except subprocess.TimeoutExpired:
-                        logger.error(f"Uninstallation of {program_name} timed out after 5 minutes", file=Path(__file__).name)
+                        adaptive_timeouts.record_timeout("appx_uninstall", program_name, timeout)
+                        logger.error("Uninstallation of %s timed out after %.0f seconds", program_name, timeout, file=Path(__file__).name)
                         task_successful = False
                     except subprocess.CalledProcessError as e:
-                        logger.error(f"Failed to uninstall {program_name} (AppxPackage).\n--- PowerShell Output ---\nSTDOUT: {e.output}\nSTDERR: {e.stderr}\n---------------------", file=Path(__file__).name)
+                        logger.error("Failed to uninstall %s (AppxPackage).\n--- PowerShell Output ---\nSTDOUT: %s\nSTDERR: %s\n---------------------", program_name, e.output, e.stderr, file=Path(__file__).name)
                         task_successful = False
             
             final_color = '#2E7D32' if task_successful else '#C62828'
             schedule_ui_update(final_color)
             status = 'success' if task_successful else 'failure'
-            logger.info(f"Task '{task_name}' completed with status: {status}", file=Path(__file__).name)
-            insert_report(computer_name, 'brisanje programa', task_name, status)
+            logger.info("Task '%s' completed with status: %s", task_name, status, file=Path(__file__).name, task=task_name, phase='brisanje programa', status=status)
+            record = run_metrics.task_finished("uninstall_programs", task_name, status, exit_code, attempts)
+            insert_report(computer_name, 'brisanje programa', task_name, status, record.duration_ms, record.exit_code, record.attempt)
+            checkpoint_journal.task_done("uninstall_programs", task_name, target_task, status, catalog.version)
 
     except Exception as e:
-        logger.error(f"An error occurred during program uninstallation: {e}", file=Path(__file__).name)
-    finally:
-        if initial_load:
-            page_instance.after(1200, lambda: page_instance.change_tab(3, initial_load=True))
+        logger.error("An error occurred during program uninstallation: %s", e, file=Path(__file__).name)
 
-def update_uninstall_programs_tasks(page_instance, initial_load=False, auto_install=False):
+def _load_uninstall_programs_tasks(page_instance):
+    catalog = catalog_repository.get("UninstallPrograms.json")
+    task_names = [task.get("name", "Nepoznat zadatak") for task in catalog.entries]
+    page_instance.update_tasks(task_names)
+    return task_names
+
+def run_uninstall_programs_tasks(page_instance):
+    """Load tasks from UninstallPrograms.json and uninstall them in the calling thread (a pipeline phase)."""
+    _uninstall_all_programs_worker(page_instance, _load_uninstall_programs_tasks(page_instance))
+
+def update_uninstall_programs_tasks(page_instance, auto_install=False):
     """Load tasks from UninstallPrograms.json and optionally auto-uninstall them."""
-    json_path = config_manager.get_functions_path() / "UninstallPrograms.json"
     try:
-        with open(json_path, "r", encoding="utf-8") as f:
-            tasks_data = json.load(f)
-            task_names = [task.get("name", "Nepoznat zadatak") for task in tasks_data]
-            page_instance.update_tasks(task_names)
-            
-            if auto_install:
-                threading.Thread(
-                    target=_uninstall_all_programs_worker,
-                    args=(page_instance, task_names, initial_load),
-                    daemon=True
-                ).start()
+        task_names = _load_uninstall_programs_tasks(page_instance)
+        if auto_install:
+            threading.Thread(
+                target=_uninstall_all_programs_worker,
+                args=(page_instance, task_names),
+                daemon=True
+            ).start()
     except Exception as e:
-        logger.error(f"Error loading uninstall tasks: {e}", file=Path(__file__).name)
+        logger.error("Error loading uninstall tasks: %s", e, file=Path(__file__).name)
         page_instance.update_tasks([f"Greška pri učitavanju: {e}"])
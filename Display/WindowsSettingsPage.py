@@ -1,91 +1,109 @@
-import json
 import subprocess
 import threading
+import time
 from Controller.mysql import insert_report
 from Controller.config import config_manager
+from Controller.journal import checkpoint_journal
+from Controller.metrics import run_metrics
+from Controller.repository import catalog_repository
+from Controller.powershell import get_powershell_host
+from Controller.timeouts import adaptive_timeouts
 from utils.logger import logger
 from pathlib import Path
 
-def _run_windows_settings_worker(page_instance, tasks_to_run, initial_load=False):
+def _run_windows_settings_worker(page_instance, tasks_to_run):
     # Load config and data using config manager
     try:
         windows_key = config_manager.get_windows_key()
         computer_name = config_manager.get_computer_name()
     except Exception as e:
-        logger.error(f"Error loading config/data: {e}", file=Path(__file__).name)
+        logger.error("Error loading config/data: %s", e, file=Path(__file__).name)
         windows_key = ''
         computer_name = ''
 
-    json_path = config_manager.get_functions_path() / "WindowsSetting.json"
     try:
-        with open(json_path, "r", encoding="utf-8") as f:
-            tasks_data = json.load(f)
-
+        catalog_version = catalog_repository.get("WindowsSetting.json").version
         for index, task in enumerate(tasks_to_run):
             def schedule_ui_update(color):
                 page_instance.after(0, lambda name=task['name'], i=index, c=color: page_instance.set_task_status(name, i, c))
 
+            def report(status, exit_code=None):
+                record = run_metrics.task_finished("windows_settings", task['name'], status, exit_code)
+                insert_report(computer_name, 'windows settings', task['name'], status, record.duration_ms, record.exit_code, record.attempt)
+                checkpoint_journal.task_done("windows_settings", task['name'], task, status, catalog_version)
+
+            if checkpoint_journal.is_done("windows_settings", task['name'], task):
+                logger.info("'%s' was completed before the restart, skipping it.", task['name'], file=Path(__file__).name)
+                schedule_ui_update('#2E7D32')
+                run_metrics.task_finished("windows_settings", task['name'], 'resumed')
+                continue
             schedule_ui_update('yellow')
+            run_metrics.task_started("windows_settings", task['name'])
             command = task.get('command', '')
             if not command:
-                logger.error(f"No command for task '{task['name']}'", file=Path(__file__).name)
+                logger.error("No command for task '%s'", task['name'], file=Path(__file__).name)
                 schedule_ui_update('#C62828')
                 # Log failure
-                insert_report(computer_name, 'windows_setting', task['name'], 'failure')
+                record = run_metrics.task_finished("windows_settings", task['name'], 'failure')
+                insert_report(computer_name, 'windows_setting', task['name'], 'failure', record.duration_ms, record.exit_code, record.attempt)
                 continue
             # Replace placeholders
             command = command.replace('<Your-Product-Key>', windows_key)
             command = command.replace('<NewComputerName>', computer_name)
-            logger.info(f"Running command for '{task['name']}': {command}", file=Path(__file__).name)
+            logger.info("Running command for '%s': %s", task['name'], command, file=Path(__file__).name)
             status = 'success'
+            exit_code = None
+            timeout = adaptive_timeouts.timeout_for("powershell", task['name'], task.get('timeout'))
             try:
-                result = subprocess.run(
-                    ["powershell.exe", "-Command", command],
-                    capture_output=True, text=True, shell=True,
-                    timeout=300  # 5 minute timeout
-                )
+                started = time.monotonic()
+                result = get_powershell_host().run(command, timeout=timeout)
+                exit_code = result.returncode
                 if result.returncode != 0:
                     raise subprocess.CalledProcessError(
                         returncode=result.returncode, cmd=command, output=result.stdout, stderr=result.stderr
                     )
-                logger.info(f"Successfully ran: {command}", file=Path(__file__).name)
+                adaptive_timeouts.record("powershell", task['name'], time.monotonic() - started)
+                logger.info("Successfully ran: %s", command, file=Path(__file__).name)
             except subprocess.TimeoutExpired:
-                logger.error(f"Task '{task['name']}' timed out after 5 minutes", file=Path(__file__).name)
+                adaptive_timeouts.record_timeout("powershell", task['name'], timeout)
+                logger.error("Task '%s' timed out after %.0f seconds", task['name'], timeout, file=Path(__file__).name)
                 schedule_ui_update('#C62828')
                 status = 'failure'
-                insert_report(computer_name, 'windows settings', task['name'], status)
+                report(status)
                 continue
             except subprocess.CalledProcessError as e:
-                logger.error(f"Failed to run command for {task['name']}.\n--- Output ---\nSTDOUT: {e.output}\nSTDERR: {e.stderr}\n---------------------", file=Path(__file__).name)
+                logger.error("Failed to run command for %s.\n--- Output ---\nSTDOUT: %s\nSTDERR: %s\n---------------------", task['name'], e.output, e.stderr, file=Path(__file__).name)
                 schedule_ui_update('#C62828')
                 status = 'failure'
-                insert_report(computer_name, 'windows settings', task['name'], status)
+                report(status, exit_code)
                 continue
             schedule_ui_update('#2E7D32')
-            insert_report(computer_name, 'windows settings', task['name'], status)
-            logger.info(f"{computer_name} windows settings {task['name']} {status}", file=Path(__file__).name)
+            report(status, exit_code)
+            logger.info("%s windows settings %s %s", computer_name, task['name'], status, file=Path(__file__).name)
     except Exception as e:
-        logger.error(f"Error running windows settings tasks: {e}", file=Path(__file__).name)
-    finally:
-        if initial_load:
-            page_instance.after(1200, lambda: page_instance.change_tab(1, initial_load=True))
+        logger.error("Error running windows settings tasks: %s", e, file=Path(__file__).name)
+
+def _load_windows_settings_tasks(page_instance):
+    catalog = catalog_repository.get("WindowsSetting.json")
+    # Only show enabled tasks
+    enabled_tasks = [task for task in catalog.entries if task.get('enable', True)]
+    page_instance.update_tasks([task.get("name", "Nepoznat zadatak") for task in enabled_tasks])
+    return enabled_tasks
+
+def run_main_tasks(page_instance):
+    """Load tasks from WindowsSetting.json and run them in the calling thread (a pipeline phase)."""
+    _run_windows_settings_worker(page_instance, _load_windows_settings_tasks(page_instance))
 
-def update_main_tasks(page_instance, initial_load=False, auto_install=True):
+def update_main_tasks(page_instance, auto_install=False):
     """Load tasks from WindowsSetting.json and optionally run them."""
-    json_path = config_manager.get_functions_path() / "WindowsSetting.json"
     try:
-        with open(json_path, "r", encoding="utf-8") as f:
-            tasks_data = json.load(f)
-            # Only show enabled tasks
-            enabled_tasks = [task for task in tasks_data if task.get('enable', True)]
-            task_names = [task.get("name", "Nepoznat zadatak") for task in enabled_tasks]
-            page_instance.update_tasks(task_names)
-            if auto_install:
-                threading.Thread(
-                    target=_run_windows_settings_worker,
-                    args=(page_instance, enabled_tasks, initial_load),
-                    daemon=True
-                ).start()
+        enabled_tasks = _load_windows_settings_tasks(page_instance)
+        if auto_install:
+            threading.Thread(
+                target=_run_windows_settings_worker,
+                args=(page_instance, enabled_tasks),
+                daemon=True
+            ).start()
     except Exception as e:
-        logger.error(f"Error loading windows settings tasks: {e}", file=Path(__file__).name)
+        logger.error("Error loading windows settings tasks: %s", e, file=Path(__file__).name)
         page_instance.update_tasks([f"Greška pri učitavanju: {e}"])
\ No newline at end of file
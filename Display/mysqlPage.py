@@ -5,7 +5,6 @@ from ttkbootstrap.dialogs import Messagebox
 import time
 from typing import Dict, Any, Optional, Callable
 from pathlib import Path
-from Controller.mysql import open_mysql_connection
 from utils.logger import logger
 
 
@@ -61,6 +60,8 @@ class MysqlConfigFrame(ttk.Frame):
             # Test MySQL connection
             logger.info("Testing MySQL connection...", file=Path(__file__).name)
             try:
+                # Imported here so mysql.connector is not loaded before the first frame
+                from Controller.mysql import open_mysql_connection
                 time.sleep(0.5)  # Brief delay for UI responsiveness
                 open_mysql_connection()
                 logger.info("MySQL connection successful", file=Path(__file__).name)
@@ -0,0 +1,122 @@
+from typing import Callable, List, Optional, Sequence
+from pathlib import Path
+
+from Controller.installers import installer_cache
+from Controller.journal import checkpoint_journal
+from Controller.metrics import run_metrics
+from Controller.pipeline import Phase
+from Controller.repository import catalog_repository
+from Controller.timeouts import adaptive_timeouts
+from Controller.winget import split_winget_ids
+from utils.logger import logger
+from .WindowsSettingsPage import run_main_tasks
+from .GroupPolicy import run_group_policy_tasks
+from .UninstallProgramsPage import run_uninstall_programs_tasks
+from .InstallDependencies import run_dependencies_tasks
+from .InstallPythonDependenciesPage import run_python_dependencies_tasks
+from .InstallProgramsPage import run_programs_tasks
+
+# (tab index, phase key, runner, depends on, resource classes), in tab order.
+# Registry phases share the "registry" class; installs wait for the uninstall phase and
+# everything that needs Python packages or winget programs waits for the dependencies.
+# PowerShell phases in different classes (e.g. group_policy and the AppX removal in
+# uninstall_programs) run in separate sessions of the PowerShell host pool.
+TOUR_PHASES = [
+    (0, "windows_settings", run_main_tasks, (), ("registry",)),
+    (1, "group_policy", run_group_policy_tasks, (), ("registry",)),
+    (2, "uninstall_programs", run_uninstall_programs_tasks, (), ("msi",)),
+    (3, "dependencies", run_dependencies_tasks, ("uninstall_programs",), ("msi", "network")),
+    (4, "python_dependencies", run_python_dependencies_tasks, ("dependencies",), ("network",)),
+    (5, "programs", run_programs_tasks, ("dependencies",), ("msi", "network")),
+]
+
+# Catalog each phase takes its tasks from
+PHASE_CATALOGS = {
+    "windows_settings": "WindowsSetting.json",
+    "group_policy": "GroupPolicy.json",
+    "uninstall_programs": "UninstallPrograms.json",
+    "dependencies": "DependenciesWinget.json",
+    "python_dependencies": "PythonDependencies.json",
+    "programs": "DependenciesWinget.json",
+}
+
+
+class _TaskListRecorder:
+    """Passes everything on to a phase's view and remembers the task list the worker shows."""
+
+    def __init__(self, view):
+        self.view = view
+        self.tasks = []
+
+    def update_tasks(self, tasks):
+        self.tasks = list(tasks)
+        self.view.update_tasks(tasks)
+
+    def __getattr__(self, name):
+        return getattr(self.view, name)
+
+
+def _catalog_version(key: str) -> Optional[str]:
+    try:
+        return catalog_repository.get(PHASE_CATALOGS[key]).version
+    except Exception:
+        return None
+
+
+def _run_journaled(key: str, run: Callable[[object], None], view) -> None:
+    """
+    Run a phase's worker and record the phase in the checkpoint journal once all of its tasks have
+    completed. A phase the journal already has as completed is only shown, all green.
+    """
+    catalog_version = _catalog_version(key)
+    completed = checkpoint_journal.completed_phase(key, catalog_version)
+    if completed is not None:
+        logger.info("Phase %s was completed before the restart, skipping it", key, file=Path(__file__).name)
+        view.update_tasks(completed)
+        for index, task_name in enumerate(completed):
+            run_metrics.task_finished(key, task_name, 'resumed')
+            view.set_task_status(task_name, index, '#2E7D32')
+        return
+    recorder = _TaskListRecorder(view)
+    try:
+        run(recorder)
+    finally:
+        # The durations of the phase's commands, written once instead of after every task
+        adaptive_timeouts.save()
+    checkpoint_journal.phase_done(key, catalog_version, recorder.tasks)
+
+
+def build_tour_phases(view_for_tab: Callable[[int], object], keys: Optional[Sequence[str]] = None) -> List[Phase]:
+    """
+    The guided tour as a phase graph. `view_for_tab(tab_index)` returns the page object the phase's
+    worker reports to (update_tasks, set_task_status, after). With `keys`, only those phases are
+    built and dependencies on the others are dropped. Phases the checkpoint journal has as completed
+    wait for nothing, so a resumed run shows them at once.
+    """
+    selected = [entry for entry in TOUR_PHASES if keys is None or entry[1] in keys]
+    selected_keys = {entry[1] for entry in selected}
+    phases = []
+    for tab_index, key, run, depends_on, resources in selected:
+        if checkpoint_journal.completed_phase(key, _catalog_version(key)) is not None:
+            depends_on, resources = (), ()
+        phases.append(Phase(
+            key, lambda key=key, run=run, tab_index=tab_index: _run_journaled(key, run, view_for_tab(tab_index)),
+            [dependency for dependency in depends_on if dependency in selected_keys], resources, title=key
+        ))
+    return phases
+
+
+def start_installer_prefetch() -> None:
+    """Download the installers of the dependency and program phases in the background, in tour order."""
+    try:
+        catalog = catalog_repository.get("DependenciesWinget.json")
+        winget_ids = [
+            winget_id
+            for category in ("Instalacija dodataka", "Instalacija programa")
+            for task in catalog.in_category(category)
+            for winget_id in split_winget_ids(task.get("winget"))
+        ]
+        installer_cache.reset_stats()
+        installer_cache.prefetch_async(winget_ids)
+    except Exception as e:
+        logger.error(f"Could not start installer prefetch: {e}", file=Path(__file__).name)
@@ -0,0 +1,69 @@
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Latest state of one task: (task name, color, started, finished); times are time.monotonic()
+TaskUpdate = Tuple[str, str, Optional[float], Optional[float]]
+
+
+class TaskStatusQueue:
+    """
+    Collects task list and task status updates from worker threads. Only the latest update per
+    task is kept, so the UI applies at most one change per task each time it drains the queue.
+    Start and end times are taken when a status is posted, not when the UI gets to it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._task_lists: Dict[int, List[str]] = {}
+        self._updates: Dict[Tuple[int, int], TaskUpdate] = {}
+        self._started: Dict[Tuple[int, int], float] = {}
+        self._progress: Dict[Tuple[int, int], Tuple[str, str]] = {}
+        self.posted = 0
+        self.coalesced = 0
+
+    def set_tasks(self, tab_index: int, tasks: List[str]) -> None:
+        with self._lock:
+            self._task_lists[tab_index] = list(tasks)
+            # Updates posted for the previous list of this tab no longer apply
+            for key in [key for key in self._updates if key[0] == tab_index]:
+                del self._updates[key]
+            for key in [key for key in self._started if key[0] == tab_index]:
+                del self._started[key]
+            for key in [key for key in self._progress if key[0] == tab_index]:
+                del self._progress[key]
+
+    def set_status(self, tab_index: int, task_index: int, task_name: str, color: str) -> None:
+        now = time.monotonic()
+        key = (tab_index, task_index)
+        with self._lock:
+            self.posted += 1
+            if key in self._updates:
+                self.coalesced += 1
+            if color == 'yellow':
+                started = self._started[key] = now
+                finished = None
+            else:
+                started = self._started.get(key)
+                finished = now
+            self._updates[key] = (task_name, color, started, finished)
+            # Progress belongs to the run that just started or ended
+            self._progress.pop(key, None)
+
+    def set_progress(self, tab_index: int, task_index: int, task_name: str, progress: str) -> None:
+        with self._lock:
+            self.posted += 1
+            if (tab_index, task_index) in self._progress:
+                self.coalesced += 1
+            self._progress[(tab_index, task_index)] = (task_name, progress)
+
+    def drain(self) -> Tuple[Dict[int, List[str]], Dict[Tuple[int, int], TaskUpdate], Dict[Tuple[int, int], Tuple[str, str]]]:
+        """
+        Take everything posted since the last drain: (task lists by tab, latest update by (tab, task index),
+        latest progress text by (tab, task index)).
+        """
+        with self._lock:
+            task_lists, self._task_lists = self._task_lists, {}
+            updates, self._updates = self._updates, {}
+            progress, self._progress = self._progress, {}
+        return task_lists, updates, progress
@@ -1,20 +1,34 @@
+import time
+_STARTED = time.perf_counter()
+import sys
+from utils.startup import StartupProfiler
+
+# --profile-startup prints where startup time goes (tests/test_startup.py checks the time to the first frame)
+PROFILE_STARTUP = "--profile-startup" in sys.argv
+# --resume continues the unfinished run in the checkpoint journal (how the app is started again after a reboot)
+RESUME = "--resume" in sys.argv
+profiler = StartupProfiler(_STARTED, enabled=PROFILE_STARTUP)
+
 import tkinter as tk
-from ttkbootstrap.dialogs import Messagebox
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
+profiler.mark("import tkinter + ttkbootstrap")
 import ctypes
-import sys
 import os
-from Display.MainPage import MainPage
-from Display.mysqlPage import MysqlConfigFrame
-from Controller.mysql import open_mysql_connection, close_mysql_connection, select_all_users, select_all_programs, select_all_group_policy, select_all_python_dependencies, select_all_uninstall_programs, select_all_windows_settings
+import threading
 from Controller.config import config_manager
+from Controller.inventory import inventory
+from Controller.powershell import get_powershell_host
 from utils.logger import logger
 from pathlib import Path
+profiler.mark("import config, inventory, logger")
 
 # Initialize logging
 logger.log_startup()
 
+# Heavy modules (mysql.connector through Controller.mysql, the six Display pages) are imported
+# where they are first needed, after the window has painted.
+
 def is_admin():
     try:
         return ctypes.windll.shell32.IsUserAnAdmin()
@@ -22,9 +36,27 @@ def is_admin():
         return False
 
 def cleanup_and_exit():
-    close_mysql_connection()
+    # Controller.mysql is only loaded once something used MySQL
+    mysql_module = sys.modules.get("Controller.mysql")
+    if mysql_module is not None:
+        mysql_module.flush_reports()
+        mysql_module.close_mysql_connection()
+    # Durations recorded since the last phase ended (e.g. when the window is closed mid-phase)
+    timeouts_module = sys.modules.get("Controller.timeouts")
+    if timeouts_module is not None:
+        timeouts_module.adaptive_timeouts.save()
+    get_powershell_host().stop()
     root.destroy()
 
+def connect_mysql():
+    """Open the MySQL connection pool if it is not open yet. Blocks until MySQL answers, so never call it on the Tk thread."""
+    try:
+        from Controller.mysql import open_mysql_connection
+        if open_mysql_connection():
+            logger.info("MySQL connection opened.", file=Path(__file__).name)
+    except Exception as e:
+        logger.error("Could not connect to MySQL: %s", e, file=Path(__file__).name)
+
 def main():
     if not is_admin():
         pythonw = sys.executable.replace("python.exe", "pythonw.exe")
@@ -34,6 +66,7 @@ def main():
                 None, "runas", pythonw, params, os.getcwd(), 1
             )
         except Exception as e:
+            from ttkbootstrap.dialogs import Messagebox
             tk.Tk().withdraw()
             Messagebox.show_error(
                 "Administrator Privileges Required",
@@ -45,8 +78,41 @@ def main():
     root = ttk.Window(themename="darkly")
     root.title("Sustav za automatizaciju instalacije softvera")
     root.geometry("800x600")
+    profiler.mark("create window")
+    first_frame_shown = [False]
+    first_frame_scheduled = [False]
+    after_first_frame = []
+
+    def run_after_first_frame(func):
+        """Run `func` once the first frame is painted (right away if it already is)."""
+        if first_frame_shown[0]:
+            root.after(0, func)
+        else:
+            after_first_frame.append(func)
+
+    def on_first_frame():
+        first_frame_shown[0] = True
+        elapsed_ms = profiler.mark("first frame") * 1000
+        logger.info(f"First frame after {elapsed_ms:.0f} ms", file=Path(__file__).name)
+        for func in after_first_frame:
+            func()
+        after_first_frame.clear()
+        profiler.mark("deferred startup work")
+        if PROFILE_STARTUP:
+            profiler.report()
+
+    def on_expose(event):
+        if not first_frame_scheduled[0]:
+            first_frame_scheduled[0] = True
+            # Idle callbacks queued so far include the redraw; run after them
+            root.after_idle(lambda: root.after(0, on_first_frame))
+
+    root.bind("<Expose>", on_expose, add="+")
+
+    def show_main_app(sync_catalogs=False):
+        # Warm up the shared PowerShell session while the operator fills in the form
+        run_after_first_frame(get_powershell_host().start_async)
 
-    def show_main_app():
         notebook = ttk.Notebook(root)
         notebook.pack(fill="both", expand=True)
 
@@ -85,14 +151,33 @@ def main():
             windows_key_entry.config(state='normal')
 
         def start_main_page():
+            from Controller.journal import checkpoint_journal
+            # An unfinished run of this computer (reboot, crash, closed window) can be continued
+            unfinished = checkpoint_journal.unfinished_run()
+            resume = bool(unfinished) and unfinished.get("computer") == naziv_racunala_var.get()
+            if resume and not resume_requested[0]:
+                from tkinter import messagebox
+                resume = messagebox.askyesno(
+                    "Nastavak instalacije",
+                    f"Instalacija za {unfinished.get('computer')} započeta {unfinished.get('started')} nije završena.\n"
+                    "Nastaviti od prvog nedovršenog zadatka?",
+                    parent=root
+                )
+            resume_requested[0] = False
             try:
                 # Save configuration using config manager
                 config_manager.update_data({"Naziv računala": naziv_racunala_var.get()})
                 config_manager.update_config({"windows_key": windows_key_var.get()})
+                logger.set_context(computer=naziv_racunala_var.get())
+                if config_manager.get_log_json():
+                    logger.enable_json_sink()
             except Exception as e:
+                from ttkbootstrap.dialogs import Messagebox
                 logger.error(f"Failed to save configuration: {e}", file=Path(__file__).name)
                 Messagebox.show_error("Error", f"Failed to save configuration: {e}")
                 return
+            from Display.MainPage import MainPage
+            from Display.phases import start_installer_prefetch
 
             # Add automation tab if not already present
             if not automation_tab_added[0]:
@@ -106,59 +191,90 @@ def main():
             btn.config(state='disabled')
             naziv_racunala_entry.config(state='disabled')
             windows_key_entry.config(state='disabled')
-            page = MainPage(automation_frame, on_automation_finished=on_automation_finished)
+            # Every run starts from a fresh snapshot of the installed packages
+            inventory.invalidate()
+            start_installer_prefetch()
+            page = MainPage(automation_frame, on_automation_finished=on_automation_finished, resume=resume)
             page.pack(fill="both", expand=True)
+            # Opened before "Pokreni" was enabled; if MySQL was unreachable then, try again in the background
+            # (reports are spooled until it answers)
+            threading.Thread(target=connect_mysql, name="MySQLConnect", daemon=True).start()
+
+        btn = ttk.Button(main_frame, text="Pokreni", command=start_main_page, bootstyle=SUCCESS)
+        btn.pack(pady=10)
 
-            # Try to open MySQL connection and fetch users (now only after config is valid)
+        # With --resume the unfinished run starts by itself, once the catalogs are synced
+        resume_requested = [False]
+        if RESUME:
             try:
-                open_mysql_connection()
-                print("MySQL connection opened.")
+                naziv_racunala_var.set(config_manager.get_computer_name())
+                resume_requested[0] = bool(naziv_racunala_var.get())
             except Exception as e:
-                logger.error(f"Could not connect to MySQL or fetch users: {e}", file=Path(__file__).name)
+                logger.warning(f"Could not load the computer name to resume: {e}", file=Path(__file__).name)
 
-        btn = ttk.Button(main_frame, text="Pokreni", command=start_main_page, bootstyle=SUCCESS)
-        btn.pack(pady=10)
+        sync_status_label = ttk.Label(main_frame, text="")
+        sync_status_label.pack(pady=(0, 10))
+
+        def on_ready():
+            btn.config(state='normal')
+            if resume_requested[0]:
+                start_main_page()
+
+        # The MySQL connection is opened off the Tk thread (by the catalog sync, or on its own when there
+        # is none) and "Pokreni" waits for it, so starting the tour never blocks the window
+        btn.config(state='disabled')
+        if sync_catalogs:
+            # The tour needs every catalog, so "Pokreni" also waits until the sync has finished
+            sync_status_label.config(text="Preuzimanje kataloga...")
+
+            def on_sync_progress(name, ok, finished, total):
+                root.after(0, lambda: sync_status_label.config(text=f"Preuzimanje kataloga: {finished}/{total}"))
+
+            def on_sync_complete(results):
+                def finish():
+                    if all(results.values()):
+                        sync_status_label.config(text="Katalozi su ažurirani.")
+                    else:
+                        sync_status_label.config(text="Neki katalozi nisu ažurirani, koriste se lokalne kopije.")
+                    on_ready()
+                root.after(0, finish)
+
+            def start_sync():
+                from Controller.catalog import catalog_sync
+                profiler.mark("import catalog sync + MySQL")
+                catalog_sync.start(on_progress=on_sync_progress, on_complete=on_sync_complete)
+
+            run_after_first_frame(start_sync)
+        else:
+            def connect():
+                connect_mysql()
+                root.after(0, on_ready)
+
+            run_after_first_frame(lambda: threading.Thread(target=connect, name="MySQLConnect", daemon=True).start())
 
     # MySQL config logic
     try:
         config = config_manager.get_config()
-        # Try to initialize MySQL if config is complete
-        mysql_fields = ["mysql_host", "mysql_port", "mysql_user", "mysql_password", "mysql_database"]
-        if all(config.get(f) for f in mysql_fields):
-            try:
-                open_mysql_connection()
-                select_all_programs()
-                select_all_group_policy()
-                select_all_python_dependencies()
-                select_all_uninstall_programs()
-                select_all_windows_settings()
-                logger.info("MySQL initialization completed successfully", file=Path(__file__).name)
-            except Exception as e:
-                logger.error(f"MySQL initialization failed: {e}", file=Path(__file__).name)
     except Exception as e:
         config = {}
         logger.error(f"Error loading config: {e}", file=Path(__file__).name)
-    mysql_fields = ["mysql_host", "mysql_user", "mysql_password", "mysql_database"]
-    if any(not config.get(f) for f in mysql_fields):
+    # Catalogs are synced in the background once the window is up, if the MySQL config is complete
+    mysql_fields = ["mysql_host", "mysql_port", "mysql_user", "mysql_password", "mysql_database"]
+    config_complete = all(config.get(f) for f in mysql_fields)
+    # The MySQL form is only shown when more than the port is missing
+    if any(not config.get(f) for f in mysql_fields if f != "mysql_port"):
         def after_mysql():
             mysql_frame.destroy()
-            try:
-                open_mysql_connection()
-                # Clear MySQL config cache and reinitialize
-                config_manager.clear_cache()
-                select_all_programs()
-                select_all_group_policy()
-                select_all_python_dependencies()
-                select_all_uninstall_programs()
-                select_all_windows_settings()
-                logger.info("MySQL connection opened.", file=Path(__file__).name)
-            except Exception as e:
-                logger.error(f"Could not connect to MySQL or fetch users: {e}", file=Path(__file__).name)
-            show_main_app()
+            # Clear MySQL config cache and reinitialize
+            config_manager.clear_cache()
+            show_main_app(sync_catalogs=True)
+        from Display.mysqlPage import MysqlConfigFrame
         mysql_frame = MysqlConfigFrame(root, str(config_manager.config_file), config, on_save=after_mysql)
         mysql_frame.pack(fill="both", expand=True)
     else:
-        show_main_app()
+        show_main_app(sync_catalogs=config_complete)
+
+    profiler.mark("build first screen")
 
     root.protocol("WM_DELETE_WINDOW", cleanup_and_exit)
     root.mainloop()
@@ -0,0 +1,7 @@
+-- Task timing columns of REPORT, written by the report sink (Controller/reports.py).
+-- Run once per database by an account that may alter REPORT. The clients only check whether
+-- the columns exist and write rows without them until they do.
+ALTER TABLE REPORT
+    ADD COLUMN report_duration_ms INT NULL,
+    ADD COLUMN report_exit_code INT NULL,
+    ADD COLUMN report_attempt INT NOT NULL DEFAULT 1;
@@ -0,0 +1,7 @@
+-- Client-generated ID of each REPORT row. A row replayed from a client's offline spool
+-- (Controller/spool.py) is inserted with INSERT IGNORE, so it is skipped through this unique
+-- index if the original write did reach the database. Older rows keep NULL, which the index allows.
+-- Until this has been run, replay falls back to a NOT EXISTS check on the row's columns.
+ALTER TABLE REPORT
+    ADD COLUMN report_uuid CHAR(36) NULL,
+    ADD UNIQUE INDEX report_uuid_unique (report_uuid);
@@ -0,0 +1,255 @@
+import json
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+from pathlib import Path
+
+from Controller.exitcodes import set_retry_sleep
+from Controller.installers import installer_cache
+from Controller.inventory import inventory
+from Controller.metrics import run_metrics
+from Controller.mysql import set_report_sink
+from Controller.pipeline import PhasePipeline
+from Controller.powershell import get_powershell_host, set_powershell_host
+from Controller.registry import PowerShellRegistryBackend, get_registry_backend, set_registry_backend
+from Controller.reports import ReportSink
+from Controller.runner import get_command_runner, set_command_runner
+from Controller.simulator import SimulatedPowerShellHost, SimulatedRunner, load_profiles
+from Controller.timeouts import adaptive_timeouts
+from Controller.wheelhouse import wheelhouse
+from Display.phases import TOUR_PHASES, build_tour_phases, start_installer_prefetch
+from utils.logger import logger
+
+BENCHMARK_DIR = Path("Storage") / "benchmarks"
+
+
+class CountingConnection:
+    """DB-API stand-in for the report sink: accepts every statement and counts the calls and rows."""
+
+    def __init__(self, counts: Dict[str, int], lock: threading.Lock):
+        self.counts = counts
+        self.lock = lock
+
+    def cursor(self) -> "CountingConnection":
+        return self
+
+    def execute(self, statement, params=None) -> None:
+        with self.lock:
+            self.counts["execute"] += 1
+
+    def executemany(self, statement, rows) -> None:
+        rows = list(rows)
+        with self.lock:
+            self.counts["executemany"] += 1
+            self.counts["rows"] += len(rows)
+
+    def fetchall(self) -> List[Any]:
+        # information_schema lookups: report the timing columns and report_uuid as present
+        return [("report_duration_ms",), ("report_exit_code",), ("report_attempt",), ("report_uuid",)]
+
+    def commit(self) -> None:
+        with self.lock:
+            self.counts["commits"] += 1
+
+    def rollback(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class CountingView:
+    """Stands in for MainPage towards one phase worker and counts the UI calls it would have made."""
+
+    def __init__(self, phase: str, counts: Dict[str, int], lock: threading.Lock):
+        self.phase = phase
+        self.counts = counts
+        self.lock = lock
+        self.tasks: List[str] = []
+        self.statuses: Dict[str, str] = {}
+
+    def _count(self, name: str) -> None:
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def after(self, ms, func=None, *args):
+        self._count("after")
+        if func is not None:
+            func(*args)
+
+    def update_tasks(self, tasks) -> None:
+        self._count("update_tasks")
+        self.tasks = list(tasks)
+
+    def set_task_status(self, task_name, task_index, color) -> None:
+        self._count("set_task_status")
+        self.statuses[task_name] = color
+
+    def set_task_progress(self, task_name, task_index, progress) -> None:
+        self._count("set_task_progress")
+
+
+@contextmanager
+def simulated_environment(runner: SimulatedRunner, work_dir: Path, db_counts: Dict[str, int], db_lock: threading.Lock):
+    """
+    Point every global the phases use at the simulation: command runner, PowerShell host, registry
+    backend and report sink, with the metrics file, duration history, wheelhouse and installer cache
+    in `work_dir`.
+    Everything is put back afterwards.
+    """
+    previous_runner, previous_host, previous_backend = get_command_runner(), get_powershell_host(), get_registry_backend()
+    previous_paths = (run_metrics.path, adaptive_timeouts.path, wheelhouse.path, installer_cache.path, installer_cache._index)
+
+    @contextmanager
+    def checkout():
+        yield CountingConnection(db_counts, db_lock)
+
+    host = SimulatedPowerShellHost(runner)
+    sink = ReportSink(checkout)
+    set_command_runner(runner)
+    set_powershell_host(host)
+    set_registry_backend(PowerShellRegistryBackend(host))
+    previous_sink = set_report_sink(sink)
+    # Waits between retries pass at the simulation's pace too
+    previous_sleep = set_retry_sleep(lambda seconds: time.sleep(seconds * runner.time_scale))
+    run_metrics.path = work_dir / "metrics.prom"
+    adaptive_timeouts.path = work_dir / "durations.json"
+    adaptive_timeouts.reload()
+    wheelhouse.path = work_dir / "wheelhouse"
+    installer_cache.path, installer_cache._index = work_dir / "installers", None
+    inventory.invalidate()
+    try:
+        yield sink
+    finally:
+        sink.close()
+        adaptive_timeouts.save()
+        set_command_runner(previous_runner)
+        set_powershell_host(previous_host)
+        set_registry_backend(previous_backend)
+        set_report_sink(previous_sink)
+        set_retry_sleep(previous_sleep)
+        run_metrics.path, adaptive_timeouts.path, wheelhouse.path, installer_cache.path, installer_cache._index = previous_paths
+        adaptive_timeouts.reload()
+        inventory.invalidate()
+
+
+def git_revision() -> Optional[str]:
+    """Short hash of the checked out commit (with +dirty for local changes), or None outside a git checkout."""
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10)
+        if revision.returncode != 0:
+            return None
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, timeout=10)
+        return revision.stdout.strip() + ("+dirty" if dirty.stdout.strip() else "")
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmark(seed: int = 1, time_scale: float = 0.01, profile_file: Optional[str] = None,
+                  phases: Optional[Sequence[str]] = None, label: str = "") -> Dict[str, Any]:
+    """
+    Run the guided tour end to end against the real catalogs, with every command simulated (see
+    Controller.simulator). Times are real seconds at `time_scale`; the overhead is the wall time during
+    which no simulated command was running, i.e. what the scheduling, logging, UI and report code add.
+    """
+    runner = SimulatedRunner(load_profiles(profile_file), seed=seed, time_scale=time_scale)
+    lock = threading.Lock()
+    ui_counts: Dict[str, int] = {}
+    db_counts = {"execute": 0, "executemany": 0, "rows": 0, "commits": 0}
+    tab_phases = {tab_index: key for tab_index, key, _, _, _ in TOUR_PHASES}
+    views: Dict[int, CountingView] = {}
+
+    def view_for_tab(tab_index: int) -> CountingView:
+        views[tab_index] = CountingView(tab_phases[tab_index], ui_counts, lock)
+        return views[tab_index]
+
+    with tempfile.TemporaryDirectory(prefix="provisioning_bench_") as work_dir:
+        with simulated_environment(runner, Path(work_dir), db_counts, lock) as sink:
+            run_metrics.reset()
+            pipeline = PhasePipeline(build_tour_phases(view_for_tab, phases))
+            started = time.monotonic()
+            # As in the app, installers are downloaded while the earlier phases run
+            start_installer_prefetch()
+            phase_results = pipeline.run()
+            sink.flush()
+            finished = time.monotonic()
+            # Downloads still running would otherwise finish against the real command runner
+            if installer_cache._thread is not None:
+                installer_cache._thread.join()
+    wall = finished - started
+
+    # Inventory refreshes may still be running in the background; only the measured window counts
+    commands = runner.stats(started, finished)
+    tasks: Dict[str, Dict[str, int]] = {}
+    for view in views.values():
+        counts = tasks.setdefault(view.phase, {"success": 0, "failure": 0, "unfinished": 0})
+        for color in view.statuses.values():
+            status = {"#2E7D32": "success", "#C62828": "failure"}.get(color, "unfinished")
+            counts[status] += 1
+    return {
+        "label": label,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "seed": seed,
+        "time_scale": time_scale,
+        "profile_file": profile_file,
+        "phases": list(phases) if phases else [key for _, key, _, _, _ in TOUR_PHASES],
+        "wall_seconds": round(wall, 3),
+        "busy_seconds": commands["busy_seconds"],
+        "overhead_seconds": round(max(0.0, wall - commands["busy_seconds"]), 3),
+        # Wall time as it would be at real command latencies
+        "projected_wall_seconds": round(commands["busy_seconds"] / time_scale + max(0.0, wall - commands["busy_seconds"]), 1),
+        "commands": commands,
+        "phase_seconds": {key: round(value, 3) for key, value in pipeline.durations.items()},
+        "phase_ok": phase_results,
+        "tasks": tasks,
+        "ui_calls": dict(sorted(ui_counts.items())),
+        "db": dict(db_counts),
+        "installer_cache": installer_cache.stats(),
+    }
+
+
+def save_result(result: Dict[str, Any], results_dir: Path = BENCHMARK_DIR) -> Path:
+    """Store a result as <timestamp>-<label>.json in `results_dir`."""
+    results_dir = Path(results_dir)
+    results_dir.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = results_dir / (f"{stamp}-{result['label']}.json" if result["label"] else f"{stamp}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=4, ensure_ascii=False)
+    return path
+
+
+def load_previous(results_dir: Path = BENCHMARK_DIR, exclude: Optional[Path] = None) -> Optional[Dict[str, Any]]:
+    """The most recent stored result, not counting `exclude`."""
+    try:
+        paths = sorted(path for path in Path(results_dir).glob("*.json") if path != exclude)
+    except OSError:
+        return None
+    for path in reversed(paths):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping unreadable benchmark result {path}: {e}", file=Path(__file__).name)
+    return None
+
+
+def compare(result: Dict[str, Any], previous: Dict[str, Any]) -> Dict[str, Any]:
+    """Differences to an earlier result (current minus previous); comparable only with the same seed, scale and profile."""
+    comparable = all(result.get(key) == previous.get(key) for key in ("seed", "time_scale", "profile_file", "phases"))
+    return {
+        "previous": {"timestamp": previous.get("timestamp"), "revision": previous.get("revision"), "label": previous.get("label")},
+        "comparable": comparable,
+        "wall_seconds": round(result["wall_seconds"] - previous.get("wall_seconds", 0.0), 3),
+        "overhead_seconds": round(result["overhead_seconds"] - previous.get("overhead_seconds", 0.0), 3),
+        "phase_seconds": {
+            key: round(value - previous.get("phase_seconds", {}).get(key, 0.0), 3)
+            for key, value in result["phase_seconds"].items()
+        },
+        "db_executemany": result["db"]["executemany"] - previous.get("db", {}).get("executemany", 0),
+    }
@@ -0,0 +1,203 @@
+import argparse
+import json
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from pathlib import Path
+
+from Controller.catalog import catalog_sync
+from Controller.config import config_manager
+from Controller.inventory import inventory
+from Controller.journal import checkpoint_journal
+from Controller.metrics import run_metrics
+from Controller.mysql import open_mysql_connection, close_mysql_connection, flush_reports
+from Controller.pipeline import PhasePipeline
+from Controller.powershell import get_powershell_host
+from Display.phases import TOUR_PHASES, build_tour_phases, start_installer_prefetch
+from provisioning.benchmark import BENCHMARK_DIR, compare, load_previous, run_benchmark, save_result
+from utils.logger import logger
+
+# Task colors the workers report, as event statuses
+COLOR_STATUSES = {'yellow': 'running', '#2E7D32': 'success', '#C62828': 'failure'}
+
+# Exit codes
+EXIT_OK, EXIT_TASKS_FAILED, EXIT_USAGE = 0, 1, 2
+
+
+class EventStream:
+    """Writes newline-delimited JSON events to a stream, one complete line at a time."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def emit(self, event: str, **fields: Any) -> None:
+        record = {"ts": datetime.now().isoformat(timespec="milliseconds"), "event": event}
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+class HeadlessView:
+    """
+    Stands in for MainPage towards one phase worker: UI callbacks run immediately in the worker's
+    thread and task updates become events.
+    """
+
+    def __init__(self, phase: str, events: EventStream, statuses: Dict[str, Dict[str, str]]):
+        self.phase = phase
+        self.events = events
+        self.tasks: List[str] = []
+        self.statuses = statuses.setdefault(phase, {})
+
+    def after(self, ms, func=None, *args):
+        if func is not None:
+            func(*args)
+
+    def update_tasks(self, tasks) -> None:
+        self.tasks = list(tasks)
+        self.events.emit("phase_tasks", phase=self.phase, tasks=self.tasks)
+
+    def set_task_status(self, task_name, task_index, color) -> None:
+        status = COLOR_STATUSES.get(color, str(color))
+        self.statuses[task_name] = status
+        self.events.emit("task", phase=self.phase, task=task_name, index=task_index, status=status)
+
+    def set_task_progress(self, task_name, task_index, progress) -> None:
+        self.events.emit(
+            "task_progress", phase=self.phase, task=task_name, index=task_index,
+            percent=progress.percent, downloaded=progress.downloaded, total=progress.total
+        )
+
+
+def run(args: argparse.Namespace, events: EventStream) -> int:
+    started = time.monotonic()
+    try:
+        windows_key = Path(args.key_file).read_text(encoding="utf-8").strip() if args.key_file else config_manager.get_windows_key()
+    except OSError as e:
+        events.emit("error", message=f"Cannot read key file: {e}")
+        return EXIT_USAGE
+    # Same settings the GUI stores when "Pokreni" is pressed
+    config_manager.update_data({"Naziv računala": args.name})
+    config_manager.update_config({"windows_key": windows_key})
+    logger.set_context(computer=args.name)
+    if config_manager.get_log_json():
+        logger.enable_json_sink()
+    events.emit("run_started", name=args.name, phases=args.phases)
+
+    get_powershell_host().start_async()
+    try:
+        open_mysql_connection()
+    except Exception as e:
+        events.emit("warning", message=f"MySQL not reachable, reports are spooled: {e}")
+    if not args.no_sync:
+        results = catalog_sync.sync(
+            on_progress=lambda name, ok, finished, total: events.emit("catalog", catalog=name, ok=ok, finished=finished, total=total)
+        )
+        if not all(results.values()):
+            events.emit("warning", message="Some catalogs were not synced, using local copies")
+
+    inventory.invalidate()
+    run_metrics.reset()
+    resumed = checkpoint_journal.begin(args.name, resume=args.resume, relaunch=relaunch_command(args) if config_manager.get_resume_after_reboot() else None)
+    if args.resume:
+        events.emit("resume", resumed=resumed)
+    start_installer_prefetch()
+    statuses: Dict[str, Dict[str, str]] = {}
+    tab_phases = {tab_index: key for tab_index, key, _, _, _ in TOUR_PHASES}
+    pipeline = PhasePipeline(build_tour_phases(lambda tab_index: HeadlessView(tab_phases[tab_index], events, statuses), args.phases))
+    phase_results = pipeline.run(on_phase_state=lambda key, state: events.emit("phase", phase=key, state=state))
+    checkpoint_journal.finish(complete=all(phase_results.values()) and run_metrics.succeeded())
+
+    try:
+        flush_reports()
+        close_mysql_connection()
+    except Exception as e:
+        logger.error(f"Error closing MySQL connection: {e}", file=Path(__file__).name)
+    get_powershell_host().stop()
+    run_metrics.write_textfile()
+
+    counts = {"success": 0, "failure": 0, "unfinished": 0}
+    for phase_statuses in statuses.values():
+        for status in phase_statuses.values():
+            # A task still "running" here was abandoned by its worker
+            status = "unfinished" if status == "running" else status
+            counts[status] = counts.get(status, 0) + 1
+    failed_phases = [key for key, ok in phase_results.items() if not ok]
+    exit_code = EXIT_OK if not failed_phases and counts["failure"] == 0 and counts["unfinished"] == 0 else EXIT_TASKS_FAILED
+    events.emit(
+        "summary", exit_code=exit_code, duration_s=round(time.monotonic() - started, 1),
+        tasks=counts, resumed_tasks=sum(1 for record in run_metrics.tasks if record.status == 'resumed'), failed_phases=failed_phases, phase_durations={key: round(value, 1) for key, value in pipeline.durations.items()},
+        slowest_tasks=[
+            {"phase": record.phase, "task": record.task, "duration_ms": record.duration_ms, "exit_code": record.exit_code}
+            for record in sorted(run_metrics.tasks, key=lambda record: record.duration, reverse=True)[:5]
+        ],
+        metrics_file=str(run_metrics.path)
+    )
+    return exit_code
+
+
+def relaunch_command(args: argparse.Namespace) -> List[str]:
+    """The command line that continues this run after a reboot."""
+    command = [sys.executable, "-m", "provisioning", "run", "--name", args.name, "--resume"]
+    if args.key_file:
+        command += ["--key-file", str(Path(args.key_file).resolve())]
+    if args.phases:
+        command += ["--phases", ",".join(args.phases)]
+    if args.no_sync:
+        command.append("--no-sync")
+    return command
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m provisioning", description="Run the provisioning workflow without the GUI.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run all (or the selected) phases and stream NDJSON progress events to stdout")
+    run_parser.add_argument("--name", required=True, help="computer name (Naziv računala)")
+    run_parser.add_argument("--key-file", help="file holding the Windows product key (default: the key in config.json)")
+    run_parser.add_argument(
+        "--phases", type=lambda value: [key.strip() for key in value.split(",") if key.strip()],
+        help=f"comma-separated subset of: {', '.join(key for _, key, _, _, _ in TOUR_PHASES)}"
+    )
+    run_parser.add_argument("--no-sync", action="store_true", help="use the local catalogs, do not sync from MySQL")
+    run_parser.add_argument("--resume", action="store_true", help="continue the unfinished run of this computer, skipping completed tasks")
+    bench_parser = commands.add_parser("bench", help="run the workflow against simulated commands and print timing as JSON")
+    bench_parser.add_argument("--seed", type=int, default=1, help="seed for the simulated latencies and exit codes (default: 1)")
+    bench_parser.add_argument("--time-scale", type=float, default=0.01, help="real seconds per simulated second (default: 0.01)")
+    bench_parser.add_argument("--profile", help="JSON file overriding the command profiles (latency, exit codes) per command type")
+    bench_parser.add_argument(
+        "--phases", type=lambda value: [key.strip() for key in value.split(",") if key.strip()],
+        help="comma-separated subset of the phases, as for run"
+    )
+    bench_parser.add_argument("--label", default="", help="name stored with the result, e.g. the change being measured")
+    bench_parser.add_argument("--results-dir", default=str(BENCHMARK_DIR), help=f"where results are stored (default: {BENCHMARK_DIR})")
+    bench_parser.add_argument("--no-save", action="store_true", help="only print the result, do not store it")
+    return parser
+
+
+def bench(args: argparse.Namespace) -> int:
+    result = run_benchmark(args.seed, args.time_scale, args.profile, args.phases, args.label)
+    saved = None if args.no_save else save_result(result, Path(args.results_dir))
+    previous = load_previous(Path(args.results_dir), exclude=saved)
+    if previous is not None:
+        result["compared_to_previous"] = compare(result, previous)
+    if saved is not None:
+        result["saved_to"] = str(saved)
+    print(json.dumps(result, indent=4, ensure_ascii=False, default=str))
+    return EXIT_OK
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    events = EventStream()
+    known = {key for _, key, _, _, _ in TOUR_PHASES}
+    if args.phases and not set(args.phases) <= known:
+        events.emit("error", message=f"Unknown phases: {sorted(set(args.phases) - known)}")
+        return EXIT_USAGE
+    if args.command == "bench":
+        return bench(args)
+    return run(args, events)
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The modules are imported as in the app, from the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
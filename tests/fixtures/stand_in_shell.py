@@ -0,0 +1,46 @@
+"""
+Stand-in for the PowerShell host loop (Controller/powershell.py HOST_SCRIPT). Reads "<id> <base64>"
+request lines and answers with "@@PSHOST@@ <json>" lines. A script is one command:
+    echo <text>        stdout <text>, rc 0
+    fail <rc> <text>   stderr <text>, rc <rc>
+    sleep <seconds>    waits, then rc 0
+    noise <text>       writes unframed lines around the response, which must be ignored
+    exit               exits without answering
+    pid                stdout is this process's pid
+"""
+import base64
+import json
+import os
+import sys
+import time
+
+
+def respond(request_id, rc=0, stdout="", stderr=""):
+    sys.stdout.write("@@PSHOST@@ " + json.dumps({"id": request_id, "rc": rc, "stdout": stdout, "stderr": stderr}) + "\n")
+    sys.stdout.flush()
+
+
+for line in sys.stdin:
+    parts = line.rstrip("\n").split(" ", 1)
+    if len(parts) < 2:
+        continue
+    request_id, script = parts[0], base64.b64decode(parts[1]).decode("utf-8")
+    command, _, argument = script.partition(" ")
+    if command == "echo":
+        respond(request_id, stdout=argument + "\n")
+    elif command == "fail":
+        rc, _, text = argument.partition(" ")
+        respond(request_id, rc=int(rc), stderr=text + "\n")
+    elif command == "sleep":
+        time.sleep(float(argument))
+        respond(request_id)
+    elif command == "noise":
+        sys.stdout.write("WARNING: some module printed this\n@@PSHOST@@ {not json\n")
+        sys.stdout.flush()
+        respond(request_id, stdout=argument + "\n")
+        sys.stdout.write("trailing output\n")
+        sys.stdout.flush()
+    elif command == "exit":
+        sys.exit(3)
+    elif command == "pid":
+        respond(request_id, stdout=str(os.getpid()))
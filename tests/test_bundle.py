@@ -0,0 +1,48 @@
+import json
+import struct
+
+from Controller.bundle import _HEADER, BUNDLE_MAGIC, BUNDLE_FORMAT, load_bundle, write_bundle
+
+CATALOGS = {"GroupPolicy.json": [{"id": 1, "name": "Telemetrija", "enable": True}]}
+
+
+def write_exports(directory):
+    for file_name, data in CATALOGS.items():
+        (directory / file_name).write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "catalog.bundle"
+    written = write_bundle(CATALOGS, {"POLICIES": 123}, path=path)
+    assert load_bundle(path) == written
+    assert written["version"] == 1 and written["checksums"] == {"POLICIES": 123}
+
+
+def test_bundle_from_other_python_is_rebuilt_from_json(tmp_path):
+    path = tmp_path / "catalog.bundle"
+    write_exports(tmp_path)
+    write_bundle({"GroupPolicy.json": []}, {"POLICIES": 123}, path=path)
+    raw = path.read_bytes()
+    # Same payload, header of a bundle written by Python 2.7 with marshal version 2
+    path.write_bytes(_HEADER.pack(BUNDLE_MAGIC, BUNDLE_FORMAT, 2, 2, 7) + raw[_HEADER.size:])
+
+    bundle = load_bundle(path)
+    assert bundle["catalogs"] == CATALOGS
+    # Checksums are dropped, so the next sync fetches every table again
+    assert bundle["checksums"] == {}
+    assert load_bundle(path) == bundle
+
+
+def test_corrupt_payload_is_rebuilt_from_json(tmp_path):
+    path = tmp_path / "catalog.bundle"
+    write_exports(tmp_path)
+    write_bundle(CATALOGS, {}, path=path)
+    path.write_bytes(path.read_bytes()[:_HEADER.size + 5])
+    assert load_bundle(path)["catalogs"] == CATALOGS
+
+
+def test_old_format_without_exports(tmp_path):
+    path = tmp_path / "catalog.bundle"
+    path.write_bytes(struct.pack("<4sHH", BUNDLE_MAGIC, 1, 4) + b"\x00" * 16)
+    assert load_bundle(path) is None
+    assert load_bundle(tmp_path / "missing.bundle") is None
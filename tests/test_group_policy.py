@@ -0,0 +1,108 @@
+import subprocess
+
+import pytest
+
+from Controller.registry import InMemoryRegistryBackend, plan_group_policy
+from Controller.repository import Catalog
+from Controller.timeouts import AdaptiveTimeouts
+
+POLICIES = r"HKLM:\SOFTWARE\Policies\Microsoft\Windows"
+
+CATALOG = [
+    {"name": "Telemetry off", "regPath": POLICIES + r"\DataCollection", "regName": "AllowTelemetry", "regValue": 0},
+    {"name": "No Cortana", "regPath": POLICIES + r"\Windows Search", "regName": "AllowCortana", "regValue": "0"},
+    {"name": "Wallpaper", "regPath": r"HKCU:\Control Panel\Desktop", "regName": "Wallpaper",
+     "regValue": r"C:\Wallpaper.jpg", "type": "String"},
+    {"name": "Disabled", "regPath": POLICIES, "regName": "Unused", "regValue": 1, "enable": False},
+]
+
+# Telemetry and Cortana are set already (the registry reports DWORDs as numbers), the wallpaper differs
+COMPLIANT_REGISTRY = {
+    (POLICIES + r"\DataCollection", "AllowTelemetry"): 0,
+    (POLICIES + r"\Windows Search", "AllowCortana"): 0,
+}
+
+
+def test_plan_only_writes_what_differs():
+    backend = InMemoryRegistryBackend(COMPLIANT_REGISTRY)
+    to_apply, compliant = plan_group_policy(CATALOG[:3], backend)
+    assert [entry["name"] for entry in compliant] == ["Telemetry off", "No Cortana"]
+    assert [entry["name"] for entry in to_apply] == ["Wallpaper"]
+    # All values are read in one batch
+    assert backend.reads == 1 and backend.writes == []
+
+
+def test_unreadable_registry_applies_everything():
+    class Unreadable(InMemoryRegistryBackend):
+        def read_values(self, keys):
+            raise RuntimeError("PowerShell is not available")
+
+    to_apply, compliant = plan_group_policy(CATALOG[:3], Unreadable())
+    assert (len(to_apply), compliant) == (3, [])
+
+
+class Page:
+    """The Group Policy page: status updates are run at once instead of on the Tk loop."""
+
+    def __init__(self):
+        self.statuses = {}
+
+    def after(self, ms, func):
+        func()
+
+    def set_task_status(self, name, index, color):
+        self.statuses[name] = color
+
+
+class Catalogs:
+    def get(self, file_name):
+        return Catalog(CATALOG)
+
+
+class Runner:
+    def __init__(self):
+        self.commands = []
+
+    def run(self, args, timeout=None, on_output=None, max_lines=None):
+        self.commands.append(args)
+        return subprocess.CompletedProcess(args, 0, "", "")
+
+
+@pytest.fixture
+def worker(tmp_path, monkeypatch):
+    # The phase writes its reports through Controller.mysql
+    pytest.importorskip("mysql.connector")
+    import Display.GroupPolicy as group_policy
+
+    reports = []
+    runner = Runner()
+    monkeypatch.setattr(group_policy, "catalog_repository", Catalogs())
+    monkeypatch.setattr(group_policy, "adaptive_timeouts", AdaptiveTimeouts(tmp_path / "durations.json"))
+    monkeypatch.setattr(group_policy, "get_command_runner", lambda: runner)
+    monkeypatch.setattr(group_policy, "insert_report", lambda computer, phase, task, status, *args: reports.append((task, status)))
+
+    def run(registry):
+        backend = InMemoryRegistryBackend(registry)
+        monkeypatch.setattr(group_policy, "get_registry_backend", lambda: backend)
+        group_policy._apply_group_policy_worker(Page(), [entry["name"] for entry in CATALOG])
+        return backend, reports, runner.commands
+
+    return run
+
+
+def test_compliant_values_are_reported_and_not_written(worker):
+    backend, reports, commands = worker(COMPLIANT_REGISTRY)
+    assert reports == [
+        ("Telemetry off", "already compliant"), ("No Cortana", "already compliant"),
+        ("Wallpaper", "success"), ("Disabled", "failure"),
+    ]
+    assert backend.writes == [(r"HKCU:\Control Panel\Desktop", "Wallpaper", r"C:\Wallpaper.jpg", "String")]
+    assert commands == [["gpupdate", "/force"]]
+
+
+def test_gpupdate_is_skipped_when_nothing_changed(worker):
+    registry = dict(COMPLIANT_REGISTRY)
+    registry[(r"HKCU:\Control Panel\Desktop", "Wallpaper")] = r"C:\Wallpaper.jpg"
+    backend, reports, commands = worker(registry)
+    assert [status for _, status in reports[:3]] == ["already compliant"] * 3
+    assert backend.writes == [] and commands == []
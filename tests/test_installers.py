@@ -0,0 +1,51 @@
+import subprocess
+
+from Controller.installers import parse_installer_manifest, silent_install_command, split_switches
+
+MANIFEST = """\
+PackageIdentifier: Example.App
+InstallerType: exe
+InstallerSwitches:
+  Custom: /LOG="C:\\Temp\\app install.log"
+Installers:
+- Architecture: x64
+  InstallerType: inno
+  Scope: machine
+  InstallerSwitches:
+    Silent: /VERYSILENT /DIR="C:\\Program Files\\Example App"
+  InstallerSha256: ABCDEF
+"""
+
+
+def test_manifest_fields():
+    assert parse_installer_manifest(MANIFEST) == {
+        "type": "inno",
+        "scope": "machine",
+        "sha256": "abcdef",
+        "silent": '/VERYSILENT /DIR="C:\\Program Files\\Example App"',
+        "custom": '/LOG="C:\\Temp\\app install.log"',
+    }
+
+
+def test_switches_split_like_a_windows_command_line():
+    assert split_switches('/S  /D="C:\\Program Files\\App" ') == ["/S", "/D=C:\\Program Files\\App"]
+    assert split_switches('TARGETDIR="C:\\Apps\\\\" NAME=\\"x\\"') == ["TARGETDIR=C:\\Apps\\", 'NAME="x"']
+    assert split_switches("") == []
+    # Joining the arguments again gives a command line that splits back into the same arguments
+    for text in ('/DIR="C:\\Program Files\\App"', 'A="x y\\\\" B=\\"q\\"', "/quiet /norestart"):
+        args = split_switches(text)
+        assert split_switches(subprocess.list2cmdline(args)) == args
+
+
+def test_commands_are_argument_lists():
+    manifest = parse_installer_manifest(MANIFEST)
+    assert silent_install_command("C:\\cache\\app.exe", manifest) == [
+        "C:\\cache\\app.exe", "/VERYSILENT", "/DIR=C:\\Program Files\\Example App", "/LOG=C:\\Temp\\app install.log"
+    ]
+    assert silent_install_command("C:\\cache\\app.msi", {"type": "msi", "scope": "machine"}) == [
+        "msiexec", "/i", "C:\\cache\\app.msi", "/passive", "/norestart", "ALLUSERS=1"
+    ]
+    assert silent_install_command("app.exe", {"type": "nullsoft", "custom": "/NCRC"}) == ["app.exe", "/S", "/NCRC"]
+    # Left to winget: exe installers without switches and types winget unpacks itself
+    assert silent_install_command("app.exe", {"type": "exe"}) is None
+    assert silent_install_command("app.msix", {"type": "msix"}) is None
@@ -0,0 +1,92 @@
+import subprocess
+from pathlib import Path
+
+from Controller.inventory import InventoryIndex, parse_winget_export, parse_winget_list
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def read_fixture(name):
+    # newline="" keeps winget's carriage returns (spinner, CRLF) as they were captured
+    with open(FIXTURES / name, "r", encoding="utf-8-sig", newline="") as f:
+        return f.read()
+
+
+class FixtureRunner:
+    """Answers `winget export` by writing a fixture to the -o path and `winget list` with a fixture table."""
+
+    def __init__(self, export=None, listing=None):
+        self.export = export
+        self.listing = listing
+        self.commands = []
+
+    def run(self, args, timeout=None, on_output=None, max_lines=None):
+        self.commands.append(args)
+        if args[1] == "export" and self.export:
+            (Path(args[args.index("-o") + 1])).write_bytes((FIXTURES / self.export).read_bytes())
+        stdout = read_fixture(self.listing) if args[1] == "list" and self.listing else ""
+        return subprocess.CompletedProcess(args, 0, stdout, "")
+
+
+def test_list_ids_and_versions():
+    index = parse_winget_list(read_fixture("winget_list.txt"))
+    assert index == {
+        "7zip.7zip": "23.01",
+        "Microsoft.VisualStudio.2022.Community": "17.9.6",
+        "Microsoft.VCRedist.2015+.x64": "14.38.33135.0",
+        "ARP\\Machine\\X64\\IntelGraphicsCC": "1.100.5185.0",
+        "Foxit.FoxitReader": "2024.1.0.23997",
+        "Tencent.WeChat": "3.9.10.19",
+        "Hidemaru.Hidemaru": "9.25",
+    }
+
+
+def test_list_skips_truncated_ids():
+    index = parse_winget_list(read_fixture("winget_list.txt"))
+    assert not any(package_id.endswith("…") for package_id in index)
+    assert not any(package_id.startswith("Microsoft.VisualStudio.2022.BuildTools") for package_id in index)
+
+
+def test_list_with_localized_header():
+    index = parse_winget_list(read_fixture("winget_list_de.txt"))
+    assert index == {"Mozilla.Firefox": "125.0.3", "Contoso.Übersetzer": "1.2", "Git.Git": "2.44.0"}
+
+
+def test_list_without_table():
+    assert parse_winget_list("") == {}
+    assert parse_winget_list("No installed package found matching input criteria.\n") == {}
+
+
+def test_export_several_sources():
+    index = parse_winget_export(read_fixture("winget_export.json"))
+    assert index == {
+        "7zip.7zip": "23.01",
+        "Microsoft.VisualStudio.2022.Community": "17.9.6",
+        "Microsoft.VCRedist.2015+.x64": "14.38.33135.0",
+        "Tencent.WeChat": "3.9.10.19",
+        "9WZDNCRFJ3TJ": "",
+        "9NBLGGH4NNS1": "",
+        "Contoso.Übersetzer": "1.2",
+    }
+
+
+def test_is_installed_from_export():
+    inventory = InventoryIndex()
+    inventory.ensure_loaded(FixtureRunner(export="winget_export.json"))
+    assert inventory.is_installed("7zip.7zip")
+    assert inventory.is_installed("microsoft.visualstudio.2022.community")
+    assert inventory.is_installed("9WZDNCRFJ3TJ")
+    assert inventory.is_installed("Contoso.Übersetzer")
+    assert not inventory.is_installed("Microsoft.VisualStudio.2022.BuildTools")
+    assert inventory.get_version("Tencent.WeChat") == "3.9.10.19"
+
+
+def test_is_installed_falls_back_to_list():
+    runner = FixtureRunner(listing="winget_list.txt")
+    inventory = InventoryIndex()
+    inventory.ensure_loaded(runner)
+    assert [args[1] for args in runner.commands] == ["export", "list"]
+    assert inventory.is_installed("Hidemaru.Hidemaru")
+    assert inventory.is_installed("Foxit.FoxitReader")
+    assert inventory.get_version("Microsoft.VisualStudio.2022.Community") == "17.9.6"
+    assert not inventory.is_installed("Microsoft.VisualStudio.2022.BuildTools.Preview")
@@ -0,0 +1,107 @@
+import threading
+import time
+
+import pytest
+
+from Controller.metrics import run_metrics
+from Controller.pipeline import DONE, FAILED, Phase, PhasePipeline
+
+
+@pytest.fixture(autouse=True)
+def metrics_in_tmp(tmp_path, monkeypatch):
+    # Every finished phase writes the metrics textfile
+    monkeypatch.setattr(run_metrics, "path", tmp_path / "metrics.prom")
+
+
+class Recorder:
+    """Phase callables that log when they start and end and track how many overlap per resource."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.events = []
+        self.active = {}
+        self.peak = {}
+
+    def phase(self, key, seconds=0.05, resources=(), ok=True, depends_on=()):
+        def run():
+            with self.lock:
+                self.events.append(("start", key, time.monotonic()))
+                for name in resources:
+                    self.active[name] = self.active.get(name, 0) + 1
+                    self.peak[name] = max(self.peak.get(name, 0), self.active[name])
+            time.sleep(seconds)
+            with self.lock:
+                for name in resources:
+                    self.active[name] -= 1
+                self.events.append(("end", key, time.monotonic()))
+            if ok == "raise":
+                raise RuntimeError(f"{key} broke")
+            return ok
+        return Phase(key, run, depends_on, resources)
+
+    def time_of(self, kind, key):
+        return next(at for event, phase, at in self.events if event == kind and phase == key)
+
+
+def test_topological_order_and_cycles():
+    recorder = Recorder()
+    pipeline = PhasePipeline([
+        recorder.phase("programs", depends_on=("dependencies",)),
+        recorder.phase("dependencies", depends_on=("uninstall",)),
+        recorder.phase("uninstall"),
+        recorder.phase("python", depends_on=("dependencies",)),
+    ])
+    order = pipeline.order
+    assert order.index("uninstall") < order.index("dependencies") < order.index("programs")
+    assert order.index("dependencies") < order.index("python")
+
+    with pytest.raises(ValueError, match="cycle"):
+        PhasePipeline([recorder.phase("a", depends_on=("b",)), recorder.phase("b", depends_on=("a",))])
+    with pytest.raises(ValueError, match="unknown"):
+        PhasePipeline([recorder.phase("a", depends_on=("missing",))])
+
+
+def test_resource_limits():
+    recorder = Recorder()
+    phases = [recorder.phase(f"msi{i}", seconds=0.1, resources=("msi",)) for i in range(3)]
+    phases += [recorder.phase(f"net{i}", seconds=0.1, resources=("network",)) for i in range(4)]
+    results = PhasePipeline(phases).run()
+    assert all(results.values())
+    assert recorder.peak == {"msi": 1, "network": 2}
+
+
+def test_independent_phases_overlap():
+    recorder = Recorder()
+    started = time.monotonic()
+    PhasePipeline([
+        recorder.phase("group_policy", seconds=0.3, resources=("registry",)),
+        recorder.phase("uninstall_programs", seconds=0.3, resources=("msi",)),
+    ]).run()
+    assert time.monotonic() - started < 0.55
+
+
+def test_dependent_starts_when_its_dependency_finishes():
+    recorder = Recorder()
+    PhasePipeline([
+        recorder.phase("uninstall", seconds=0.05),
+        recorder.phase("slow", seconds=0.6),
+        recorder.phase("dependencies", seconds=0.05, depends_on=("uninstall",)),
+    ]).run()
+    assert recorder.time_of("start", "dependencies") >= recorder.time_of("end", "uninstall")
+    # It does not wait for the unrelated slow phase
+    assert recorder.time_of("end", "dependencies") < recorder.time_of("end", "slow")
+
+
+def test_failed_phase_still_releases_its_dependents():
+    recorder = Recorder()
+    states = []
+    pipeline = PhasePipeline([
+        recorder.phase("uninstall", ok=False, resources=("msi",)),
+        recorder.phase("dependencies", resources=("msi",), depends_on=("uninstall",)),
+        recorder.phase("programs", ok="raise", depends_on=("dependencies",)),
+        recorder.phase("python", depends_on=("programs",)),
+    ])
+    results = pipeline.run(on_phase_state=lambda key, state: states.append((key, state)))
+    assert results == {"uninstall": False, "dependencies": True, "programs": False, "python": True}
+    assert pipeline.states == {"uninstall": FAILED, "dependencies": DONE, "programs": FAILED, "python": DONE}
+    assert ("uninstall", FAILED) in states
@@ -0,0 +1,96 @@
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from Controller.powershell import PowerShellHost, PowerShellHostPool
+
+STAND_IN = [sys.executable, str(Path(__file__).parent / "fixtures" / "stand_in_shell.py")]
+
+
+@pytest.fixture
+def host():
+    host = PowerShellHost(STAND_IN)
+    yield host
+    host.stop()
+
+
+def test_round_trip(host):
+    result = host.run("echo Zdravo svijete")
+    assert (result.returncode, result.stdout, result.stderr) == (0, "Zdravo svijete\n", "")
+    result = host.run("fail 5 Access is denied")
+    assert (result.returncode, result.stdout, result.stderr) == (5, "", "Access is denied\n")
+
+
+def test_timeout_restarts_the_shell(host):
+    pid = host.run("pid").stdout
+    with pytest.raises(subprocess.TimeoutExpired):
+        host.run("sleep 5", timeout=0.5)
+    result = host.run("pid")
+    assert result.returncode == 0 and result.stdout != pid
+
+
+def test_shell_exiting_mid_request(host):
+    pid = host.run("pid").stdout
+    result = host.run("exit", timeout=10)
+    assert result.returncode == -1
+    assert "exited" in result.stderr
+    result = host.run("pid")
+    assert result.returncode == 0 and result.stdout != pid
+
+
+def test_unframed_output_is_ignored(host):
+    assert host.run("noise first").stdout == "first\n"
+    assert host.run("echo second").stdout == "second\n"
+
+
+def test_concurrent_callers_get_their_own_responses(host):
+    results = {}
+
+    def call(index):
+        results[index] = host.run(f"echo {index}", timeout=10).stdout
+
+    threads = [threading.Thread(target=call, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {index: f"{index}\n" for index in range(8)}
+
+
+def test_pool_runs_commands_side_by_side():
+    pool = PowerShellHostPool(size=3, command=STAND_IN)
+    try:
+        pool.run("echo warm")
+        started = time.monotonic()
+        threads = [threading.Thread(target=pool.run, args=("sleep 0.6",)) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # One shell would take 1.8 s
+        assert time.monotonic() - started < 1.5
+        assert len({pool.run("pid").stdout for _ in range(3)}) == 1
+    finally:
+        pool.stop()
+
+
+def test_pool_timeout_restarts_only_that_session():
+    pool = PowerShellHostPool(size=2, command=STAND_IN)
+    results = []
+    try:
+        other = threading.Thread(target=lambda: results.append(pool.run("sleep 1")))
+        other.start()
+        time.sleep(0.3)
+        busy_pid = pool._hosts[0]._process.pid
+        with pytest.raises(subprocess.TimeoutExpired):
+            pool.run("sleep 5", timeout=0.3)
+        other.join()
+        assert results[0].returncode == 0
+        assert pool._hosts[0]._process.pid == busy_pid
+        assert pool._hosts[1]._process is None
+    finally:
+        pool.stop()
@@ -0,0 +1,195 @@
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+
+from Controller.reports import REPORT_BASE_COLUMNS, REPORT_TIMING_COLUMNS, REPORT_UUID_COLUMN, ReportSink
+from Controller.spool import ReportSpool
+
+ALL_COLUMNS = REPORT_BASE_COLUMNS + REPORT_TIMING_COLUMNS + (REPORT_UUID_COLUMN,)
+
+
+class Database:
+    """
+    DB-API stand-in for MySQL with a REPORT table of the given columns. INSERT IGNORE skips rows whose
+    report_uuid is stored already and INSERT ... WHERE NOT EXISTS rows with the same base columns.
+    While `reachable` is False, checkout raises like a failed connection.
+    """
+
+    def __init__(self, columns=ALL_COLUMNS):
+        self.columns = columns
+        self.rows = []
+        self.executemany_calls = 0
+        self.checkouts = 0
+        self.reachable = True
+        self.lock = threading.Lock()
+        self.delay = 0.0
+
+    @contextmanager
+    def checkout(self):
+        with self.lock:
+            self.checkouts += 1
+        if not self.reachable:
+            raise ConnectionError("MySQL server has gone away")
+        yield Connection(self)
+
+
+class Connection:
+    def __init__(self, database):
+        self.database = database
+        self.result = []
+
+    def cursor(self):
+        return self
+
+    def execute(self, statement, params=None):
+        assert "information_schema.COLUMNS" in statement
+        self.result = [(name.upper(),) for name in self.database.columns]
+
+    def fetchall(self):
+        return self.result
+
+    def executemany(self, statement, params):
+        database = self.database
+        time.sleep(database.delay)
+        names = re.search(r"INTO REPORT \(([^)]*)\)", statement).group(1).split(", ")
+        assert set(names) <= set(database.columns), f"{names} are not all in REPORT"
+        with database.lock:
+            database.executemany_calls += 1
+            for values in params:
+                row = dict(zip(names, values))
+                if "IGNORE" in statement and any(stored[REPORT_UUID_COLUMN] == row[REPORT_UUID_COLUMN] for stored in database.rows):
+                    continue
+                if "NOT EXISTS" in statement:
+                    assert values[len(names):] == tuple(row[name] for name in REPORT_BASE_COLUMNS)
+                    if any(all(stored[name] == row[name] for name in REPORT_BASE_COLUMNS) for stored in database.rows):
+                        continue
+                database.rows.append(row)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def put_rows(sink, count, status="success"):
+    for index in range(count):
+        sink.put("PC-01", "install", f"Program {index}", status, 1200, 0, 1)
+
+
+@pytest.fixture
+def spool(tmp_path):
+    return ReportSpool(tmp_path / "report_spool.sqlite3")
+
+
+def test_rows_are_written_in_batches():
+    database = Database()
+    sink = ReportSink(database.checkout, max_batch=10, flush_interval=0.3)
+    put_rows(sink, 25)
+    # Two full batches, and the rest once the interval is over
+    deadline = time.monotonic() + 5
+    while len(database.rows) < 25 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    sink.close()
+    assert database.executemany_calls == 3
+    assert [row["report_task_name"] for row in database.rows] == [f"Program {index}" for index in range(25)]
+    assert sink.stats()["flushed"] == 25 and sink.stats()["pending"] == 0
+
+
+@pytest.mark.parametrize("columns", [REPORT_BASE_COLUMNS, REPORT_BASE_COLUMNS + REPORT_TIMING_COLUMNS])
+def test_rows_match_the_detected_columns(columns):
+    database = Database(columns)
+    sink = ReportSink(database.checkout, flush_interval=0.1)
+    assert sink.detect_columns() == (columns != REPORT_BASE_COLUMNS)
+    put_rows(sink, 2)
+    sink.close()
+    assert [sorted(row) for row in database.rows] == [sorted(columns)] * 2
+
+
+def test_unreachable_database_spools_and_replays_once(spool):
+    database = Database()
+    sink = ReportSink(database.checkout, max_batch=10, flush_interval=0.1, spool=spool)
+    sink.detect_columns()
+    database.reachable = False
+    put_rows(sink, 15, status="failure")
+    sink.close()
+    assert database.rows == [] and spool.count() == 15
+    assert sink.stats()["spooled"] == 15
+
+    # A batch the server committed before its connection failed is already in REPORT
+    database.reachable = True
+    with database.checkout() as connection:
+        connection.executemany(
+            "INSERT INTO REPORT (" + ", ".join(ALL_COLUMNS) + ")",
+            [row[1:] for row in spool_rows(spool)[:4]]
+        )
+    assert sink.replay_spool() == 15
+    assert spool.count() == 0
+    assert sorted(row["report_task_name"] for row in database.rows) == sorted(f"Program {index}" for index in range(15))
+
+
+def test_replay_without_uuid_column_uses_not_exists(spool):
+    database = Database(REPORT_BASE_COLUMNS + REPORT_TIMING_COLUMNS)
+    sink = ReportSink(database.checkout, flush_interval=0.1, spool=spool)
+    database.reachable = False
+    put_rows(sink, 3)
+    sink.close()
+    database.reachable = True
+    # Written before, e.g. by a replay whose connection failed after the commit
+    sink._write_spooled(spool_rows(spool))
+    assert sink.replay_spool() == 3
+    assert len(database.rows) == 3
+
+
+def test_only_one_replay_runs_at_a_time(spool):
+    database = Database()
+    sink = ReportSink(database.checkout, max_batch=1, flush_interval=0.1, spool=spool)
+    sink.detect_columns()
+    database.reachable = False
+    put_rows(sink, 20)
+    sink.close()
+    database.reachable = True
+    database.delay = 0.02
+    started = []
+    original = sink.replay_spool
+
+    def replay_spool():
+        started.append(threading.current_thread())
+        return original()
+
+    sink.replay_spool = replay_spool
+    # Written one per batch now that the sink is closed; every write finds the spool non-empty and asks for a replay
+    put_rows(sink, 10)
+    sink.flush()
+    deadline = time.monotonic() + 10
+    while spool.count() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    sink._replay_thread.join(timeout=10)
+    assert len(started) == 1
+    assert len(database.rows) == 30 and sink.stats()["replayed"] == 20
+
+
+def test_spool_is_compacted_at_its_size_cap(tmp_path):
+    spool = ReportSpool(tmp_path / "report_spool.sqlite3", max_bytes=64 * 1024)
+    for batch in range(40):
+        spool.append([("PC-01", "install", f"Program {batch}-{index}", "failure", f"2026-10-18 10:{batch:02d}:{index % 60:02d}")
+                      for index in range(50)])
+    assert (tmp_path / "report_spool.sqlite3").stat().st_size <= 2 * 64 * 1024
+    remaining = spool_rows(spool)
+    assert 0 < len(remaining) < 40 * 50
+    # The oldest rows were dropped, the newest kept
+    assert remaining[-1][3] == "Program 39-49"
+    assert "Program 0-0" not in {row[3] for row in remaining}
+
+
+def spool_rows(spool):
+    """The spooled rows, oldest first, as ReportSpool.replay hands them out."""
+    with sqlite3.connect(str(spool.path)) as connection:
+        return connection.execute(
+            "SELECT key, computer_name, task_type, task_name, status, timestamp, duration_ms, exit_code, attempt, uuid"
+            " FROM spool ORDER BY created, rowid"
+        ).fetchall()
@@ -0,0 +1,73 @@
+import random
+import time
+
+from Controller.repository import Catalog
+
+
+def linear_find(entries, name):
+    # The scan the workers did before the catalog was indexed
+    return next((entry for entry in entries if entry.get("Name", entry.get("name")) == name), None)
+
+
+def make_programs(size, seed=0):
+    rng = random.Random(seed)
+    categories = ["Instalacija programa", "Dodaci", "Razvoj"]
+    data = {}
+    for i in range(size):
+        name = f"Program {i}"
+        winget = f"Vendor.Program{i}"
+        if i % 5 == 0:
+            # Entries that install several packages, some shared with another entry
+            winget += f", Vendor.Shared{i % 3}"
+        data[name] = {"Name": name, "category": rng.choice(categories), "winget": winget}
+    return data
+
+
+def test_lookups_match_linear_scan():
+    data = make_programs(500)
+    catalog = Catalog(data)
+    entries = list(data.values())
+    for name in [f"Program {i}" for i in range(0, 600, 7)]:
+        assert catalog.find(name) is linear_find(entries, name)
+    for category in ["Instalacija programa", "Dodaci", "Razvoj", "Nepostojeća"]:
+        assert catalog.in_category(category) == [entry for entry in entries if entry["category"] == category]
+    for winget_id in ["Vendor.Program42", "vendor.shared1", "VENDOR.SHARED2", "Vendor.Missing"]:
+        expected = [
+            entry for entry in entries
+            if winget_id.lower() in (part.strip().lower() for part in entry["winget"].split(","))
+        ]
+        assert catalog.find_by_winget_id(winget_id) == expected
+
+
+def test_first_entry_wins_for_duplicate_names():
+    data = [{"name": "Defender", "value": 1}, {"name": "Defender", "value": 2}, {"name": "Telemetry"}]
+    catalog = Catalog(data)
+    assert catalog.find("Defender") is linear_find(data, "Defender")
+    assert catalog.find("Defender")["value"] == 1
+
+
+def test_python_dependencies():
+    catalog = Catalog({"dependencies": ["requests", "numpy"]})
+    assert [entry["name"] for entry in catalog.entries] == ["requests", "numpy"]
+    assert catalog.find("numpy") == {"name": "numpy"}
+    assert catalog.find("pandas") is None
+
+
+def test_indexed_lookup_is_faster_than_linear_scan():
+    data = make_programs(10000)
+    catalog = Catalog(data)
+    entries = list(data.values())
+    names = [f"Program {(i * 7919) % 10000}" for i in range(200)]
+
+    started = time.perf_counter()
+    for name in names:
+        catalog.find(name)
+    indexed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for name in names:
+        linear_find(entries, name)
+    linear = time.perf_counter() - started
+
+    # Orders of magnitude apart in practice; the ratio is loose so a busy machine does not fail it
+    assert indexed * 10 < linear
@@ -0,0 +1,103 @@
+import os
+import subprocess
+import sys
+import textwrap
+import time
+
+import pytest
+
+from Controller.runner import Progress, SubprocessRunner, WingetProgressParser
+
+
+def python(script):
+    """A fake child process: this interpreter running `script`."""
+    return [sys.executable, "-c", textwrap.dedent(script)]
+
+
+def is_running(pid):
+    # A killed process that nobody reaped yet is a zombie, which counts as gone
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def test_lines_arrive_while_the_child_runs(tmp_path):
+    go = tmp_path / "go"
+    seen = []
+
+    def on_output(stream, line):
+        seen.append((stream, line))
+        if line == "waiting":
+            # The child only exits once it sees this file, so this line must arrive before the exit
+            go.touch()
+
+    result = SubprocessRunner().run(python(f"""
+        import os, sys, time
+        print("waiting", flush=True)
+        print("to stderr", file=sys.stderr, flush=True)
+        deadline = time.monotonic() + 10
+        while not os.path.exists({str(go)!r}):
+            if time.monotonic() > deadline:
+                sys.exit(7)
+            time.sleep(0.01)
+        print("done")
+    """), timeout=20, on_output=on_output)
+    assert result.returncode == 0
+    assert ("stdout", "waiting") in seen and ("stderr", "to stderr") in seen and ("stdout", "done") in seen
+    assert result.stdout == "waiting\ndone\n"
+    assert result.stderr == "to stderr\n"
+
+
+def test_only_the_tail_is_kept():
+    result = SubprocessRunner().run(python("""
+        for i in range(1000):
+            print(f"line {i}")
+    """), max_lines=5)
+    assert result.stdout.splitlines() == [f"line {i}" for i in range(995, 1000)]
+    everything = SubprocessRunner().run(python("for i in range(1000): print(i)"), max_lines=None)
+    assert len(everything.stdout.splitlines()) == 1000
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="checks processes through /proc")
+def test_timeout_kills_the_whole_tree():
+    started = time.monotonic()
+    with pytest.raises(subprocess.TimeoutExpired) as raised:
+        SubprocessRunner().run(python("""
+            import subprocess, sys, time
+            child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+            print(child.pid, flush=True)
+            time.sleep(60)
+        """), timeout=1)
+    assert time.monotonic() - started < 10
+    grandchild = int(raised.value.output.split()[0])
+    deadline = time.monotonic() + 5
+    while is_running(grandchild) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not is_running(grandchild)
+
+
+def test_winget_progress_lines():
+    events = []
+    parser = WingetProgressParser(events.append)
+    # winget redraws its bar with "\r" and shows a spinner between steps
+    result = SubprocessRunner().run(python(r"""
+        import sys
+        out = sys.stdout
+        out.write("Found Mozilla Firefox [Mozilla.Firefox]\n")
+        out.write("\r-\r\\\r|\r/")
+        for done in ("1.00 MB", "1.02 MB", "2.00 MB", "4.00 MB"):
+            out.write(f"\r  ██████▒▒▒▒▒▒  {done} / 4.00 MB")
+        out.write("\n\r  ████▒▒▒▒  40%\r  ██████████  100%\n")
+        out.write("Successfully installed\n")
+    """), on_output=parser)
+    mb = 1024 ** 2
+    assert events == [
+        Progress(25, mb, 4 * mb), Progress(50, 2 * mb, 4 * mb), Progress(100, 4 * mb, 4 * mb),
+        Progress(40), Progress(100),
+    ]
+    # Progress and spinner lines are not kept for error reports
+    assert [line for line in result.stdout.splitlines() if line.strip()] == [
+        "Found Mozilla Firefox [Mozilla.Firefox]", "Successfully installed"
+    ]
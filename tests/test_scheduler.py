@@ -0,0 +1,103 @@
+import threading
+import time
+
+from Controller.scheduler import TaskScheduler
+
+
+class Overlap:
+    """Counts how many callers are inside at once."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+
+    def visit(self, seconds=0.05):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(seconds)
+        with self.lock:
+            self.active -= 1
+
+
+def run_threads(count, target):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_resource_limits():
+    scheduler = TaskScheduler(max_workers=8, resource_limits={"network": 2})
+    for name, limit in (("msi", 1), ("network", 2)):
+        overlap = Overlap()
+
+        def hold():
+            with scheduler.resource(name):
+                overlap.visit()
+
+        run_threads(6, hold)
+        assert overlap.peak == limit
+    # No resource, or one without a limit, does not wait
+    overlap = Overlap()
+
+    def free():
+        with scheduler.resource(None), scheduler.resource("registry"):
+            overlap.visit()
+
+    run_threads(4, free)
+    assert overlap.peak == 4
+
+
+def test_exclusive_is_per_key():
+    scheduler = TaskScheduler()
+    overlaps = {"Mozilla.Firefox": Overlap(), "7zip.7zip": Overlap()}
+
+    def install(key):
+        with scheduler.exclusive(key):
+            overlaps[key].visit(0.1)
+
+    threads = [threading.Thread(target=install, args=(key,)) for key in overlaps for _ in range(3)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [overlap.peak for overlap in overlaps.values()] == [1, 1]
+    # The two keys ran side by side: 3 turns each, not 6 in a row
+    assert time.monotonic() - started < 0.5
+
+
+def test_run_groups():
+    scheduler = TaskScheduler(max_workers=4)
+    overlap = Overlap()
+    calls = []
+    in_callback = Overlap()
+
+    def work(item):
+        overlap.visit(0.05)
+        if item == "boom":
+            raise RuntimeError("installer crashed")
+        return item != "fail"
+
+    def on_start(key):
+        in_callback.visit(0.01)
+        calls.append(("start", key))
+
+    def on_done(key, ok):
+        in_callback.visit(0.01)
+        calls.append(("done", key, ok))
+
+    groups = [("browsers", ["a", "b"]), ("editors", ["c", "fail"]), ("tools", ["boom"]), ("empty", [])]
+    results = scheduler.run_groups(groups, work, on_start, on_done)
+    assert results == {"browsers": True, "editors": False, "tools": False, "empty": False}
+    assert overlap.peak == 4
+    # Callbacks run one at a time, once per group, start before done
+    assert in_callback.peak == 1
+    for key, _ in groups:
+        assert calls.count(("start", key)) == 1
+        done = [call for call in calls if call[0] == "done" and call[1] == key]
+        assert len(done) == 1 and calls.index(("start", key)) < calls.index(done[0])
+        assert done[0][2] == results[key]
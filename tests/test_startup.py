@@ -0,0 +1,114 @@
+import json
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Time from the first line of main.py to the first painted frame
+FIRST_FRAME_BUDGET_MS = 1500
+
+# Loaded where they are first needed, after the window has painted
+LAZY_MODULES = [
+    "mysql.connector",
+    "Controller.mysql",
+    "Controller.catalog",
+    "Controller.pipeline",
+    "Controller.installers",
+    "Controller.winget",
+    "Controller.pythondeps",
+    "Display.MainPage",
+    "Display.phases",
+    "Display.mysqlPage",
+    "Display.InstallProgramsPage",
+]
+
+# Runs in a fresh interpreter, so modules imported by other tests do not count. tkinter and
+# ttkbootstrap are replaced by widgets that do nothing; the window "paints" when mainloop starts.
+STARTUP_SCRIPT = textwrap.dedent("""
+    import json, sys, types
+    sys.path.insert(0, {root!r})
+
+    class Widget:
+        def __init__(self, *args, **kwargs):
+            pass
+        def __getattr__(self, name):
+            return lambda *args, **kwargs: None
+        def winfo_children(self):
+            return []
+
+    class StringVar(Widget):
+        def get(self):
+            return ""
+
+    class Window(Widget):
+        def __init__(self, *args, **kwargs):
+            self.binds, self.queue, self.modules_at_first_frame = [], [], None
+        def bind(self, event, func, add=None):
+            self.binds.append((event, func))
+        def after(self, ms, func=None, *args):
+            self.queue.append(lambda: func(*args))
+        def after_idle(self, func, *args):
+            self.after(0, func, *args)
+        def mainloop(self):
+            self.modules_at_first_frame = sorted(sys.modules)
+            for event, func in self.binds:
+                if event == "<Expose>":
+                    func(None)
+            while self.queue:
+                self.queue.pop(0)()
+
+    tkinter = types.ModuleType("tkinter")
+    tkinter.StringVar, tkinter.Tk = StringVar, Widget
+    ttkbootstrap = types.ModuleType("ttkbootstrap")
+    ttkbootstrap.Window = Window
+    for name in ("Frame", "Label", "Entry", "Button", "Notebook"):
+        setattr(ttkbootstrap, name, Widget)
+    constants = types.ModuleType("ttkbootstrap.constants")
+    constants.SUCCESS = "success"
+    ttkbootstrap.constants = constants
+    sys.modules.update({{"tkinter": tkinter, "ttkbootstrap": ttkbootstrap, "ttkbootstrap.constants": constants}})
+
+    import main
+
+    class PowerShellHost:
+        def start_async(self):
+            pass
+        def stop(self):
+            pass
+
+    main.is_admin = lambda: True
+    main.get_powershell_host = lambda: PowerShellHost()
+    main.main()
+    print(json.dumps({{
+        "first_frame_ms": main.profiler.elapsed("first frame") * 1000,
+        "modules": main.root.modules_at_first_frame,
+    }}))
+""")
+
+
+def start_app(tmp_path):
+    # A MySQL config without a port: the main screen is built but no catalog sync is started
+    storage = tmp_path / "Storage"
+    storage.mkdir()
+    (storage / "config.json").write_text(json.dumps({
+        "mysql_host": "db", "mysql_user": "user", "mysql_password": "secret", "mysql_database": "automation",
+    }), encoding="utf-8")
+    result = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT.format(root=str(ROOT))],
+        cwd=tmp_path, capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_first_frame_within_budget(tmp_path):
+    startup = start_app(tmp_path)
+    assert startup["first_frame_ms"] <= FIRST_FRAME_BUDGET_MS
+
+
+def test_heavy_modules_are_imported_after_first_frame(tmp_path):
+    modules = set(start_app(tmp_path)["modules"])
+    assert "main" in modules
+    assert [name for name in LAZY_MODULES if name in modules] == []
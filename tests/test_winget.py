@@ -0,0 +1,130 @@
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+import Controller.winget as winget
+from Controller.config import config_manager
+from Controller.exitcodes import set_retry_sleep
+from Controller.installers import InstallerCache
+from Controller.inventory import InventoryIndex
+from Controller.scheduler import TaskScheduler
+from Controller.timeouts import AdaptiveTimeouts
+
+# 0x8A150102, "another installation is in progress", as cmd.exe reports it
+IN_PROGRESS_SIGNED = 0x8A150102 - 2 ** 32
+
+
+class FakeRunner:
+    """
+    Plays winget and the installers. `winget download` stages an installer of the given type; installs
+    exit with the scripted codes of their package (then 0) and count how many MSI installs overlap.
+    """
+
+    def __init__(self, types=None, exit_codes=None, seconds=0.0):
+        self.types = types or {}
+        self.exit_codes = {key: list(codes) for key, codes in (exit_codes or {}).items()}
+        self.seconds = seconds
+        self.commands = []
+        self.lock = threading.Lock()
+        self.active_msi = 0
+        self.peak_msi = 0
+
+    def run(self, args, timeout=None, on_output=None, max_lines=None):
+        with self.lock:
+            self.commands.append(args)
+        if args[:2] == ["winget", "download"]:
+            winget_id = args[args.index("--id") + 1]
+            folder = Path(args[args.index("--download-directory") + 1])
+            folder.mkdir(parents=True)
+            (folder / f"{winget_id}.yaml").write_text(f"InstallerType: {self.types[winget_id]}\n", encoding="utf-8")
+            (folder / f"{winget_id}.bin").write_bytes(winget_id.encode())
+            return subprocess.CompletedProcess(args, 0, "", "")
+        if args[0] == "winget":
+            winget_id = args[args.index("--id") + 1]
+        else:
+            winget_id = Path(args[2] if args[0] == "msiexec" else args[0]).stem
+        msi = args[0] == "msiexec" or self.types.get(winget_id) in ("msi", "wix", "burn")
+        with self.lock:
+            if msi:
+                self.active_msi += 1
+                self.peak_msi = max(self.peak_msi, self.active_msi)
+            codes = self.exit_codes.get(winget_id)
+            code = codes.pop(0) if codes else 0
+        time.sleep(self.seconds)
+        with self.lock:
+            if msi:
+                self.active_msi -= 1
+        return subprocess.CompletedProcess(args, code, "", "")
+
+    def installs(self, winget_id):
+        return [args for args in self.commands if args[:2] == ["winget", "install"] and winget_id in args]
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    """Empty inventory and installer cache, no saved timeouts, no retry waits."""
+    monkeypatch.setattr(winget, "inventory", InventoryIndex())
+    monkeypatch.setattr(winget, "installer_cache", InstallerCache(tmp_path / "installers"))
+    monkeypatch.setattr(winget, "adaptive_timeouts", AdaptiveTimeouts(tmp_path / "durations.json"))
+    monkeypatch.setattr(config_manager, "_config_cache", {"retry_attempts": 3})
+    previous = set_retry_sleep(lambda seconds: None)
+    yield winget
+    set_retry_sleep(previous)
+
+
+def test_installed_packages_are_skipped(env):
+    env.inventory.record_install("Mozilla.Firefox", "128.0")
+    runner = FakeRunner()
+    assert winget.install_winget_id("mozilla.firefox", TaskScheduler(), runner)
+    assert runner.commands == []
+
+
+def test_cache_hit_and_fallback(env):
+    runner = FakeRunner(types={"7zip.7zip": "msi", "Git.Git": "inno"}, exit_codes={"Git.Git": [1603]})
+    for winget_id in ("7zip.7zip", "Git.Git"):
+        assert env.installer_cache.fetch(winget_id, runner)
+    # Hit: the staged MSI runs through msiexec, winget install is not needed
+    assert winget.install_winget_id("7zip.7zip", TaskScheduler(), runner)
+    assert runner.commands[-1][:2] == ["msiexec", "/i"] and runner.installs("7zip.7zip") == []
+    # Hit, but the installer fails: winget install takes over
+    assert winget.install_winget_id("Git.Git", TaskScheduler(), runner)
+    assert runner.commands[-2][0].endswith("Git.Git.bin") and len(runner.installs("Git.Git")) == 1
+    # Miss: not downloaded in this run
+    assert winget.install_winget_id("Notepad++.Notepad++", TaskScheduler(), runner)
+    assert len(runner.installs("Notepad++.Notepad++")) == 1
+    assert env.installer_cache.stats() == {"hits": 2, "misses": 1}
+    assert env.inventory.is_installed("Notepad++.Notepad++")
+
+
+@pytest.mark.parametrize("code", [1618, 0x8A150102, IN_PROGRESS_SIGNED])
+def test_another_installation_in_progress_is_retried(env, code):
+    runner = FakeRunner(exit_codes={"Mozilla.Firefox": [code, code]})
+    assert winget.install_winget_id("Mozilla.Firefox", TaskScheduler(), runner)
+    assert len(runner.installs("Mozilla.Firefox")) == 3
+
+
+def test_retries_are_limited_and_permanent_failures_are_not_retried(env):
+    runner = FakeRunner(exit_codes={"Mozilla.Firefox": [1618] * 5, "Git.Git": [1603]})
+    assert not winget.install_winget_id("Mozilla.Firefox", TaskScheduler(), runner)
+    assert len(runner.installs("Mozilla.Firefox")) == 3
+    assert not winget.install_winget_id("Git.Git", TaskScheduler(), runner)
+    assert len(runner.installs("Git.Git")) == 1
+
+
+def test_msi_installers_never_overlap(env):
+    types = {f"Msi.{i}": "msi" for i in range(4)}
+    types.update({f"Exe.{i}": "nullsoft" for i in range(4)})
+    runner = FakeRunner(types=types, seconds=0.1)
+    for winget_id in types:
+        assert env.installer_cache.fetch(winget_id, runner)
+    scheduler = TaskScheduler(max_workers=8)
+    started = time.monotonic()
+    results = scheduler.run_groups([(winget_id, [winget_id]) for winget_id in types],
+                                   lambda winget_id: winget.install_winget_id(winget_id, scheduler, runner))
+    assert all(results.values())
+    assert runner.peak_msi == 1
+    # The other installers ran beside them: four MSIs in a row take 0.4 s
+    assert time.monotonic() - started < 0.7
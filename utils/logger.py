@@ -1,84 +1,242 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
+import sys
+import tempfile
+import time
 from pathlib import Path
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, Optional
+
+# app.log (and app.log.jsonl) are rotated at this size, keeping this many old files
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record: time, level, source file, message and the record's fields (task, phase, duration, computer, ...)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "source": getattr(record, "source", ""),
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _InProcessQueueHandler(logging.handlers.QueueHandler):
+    """Queues records as they are: the listener in this process formats them, not the logging thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
 
 class AppLogger:
-    """Centralized logging for the application."""
-    
-    def __init__(self, name: str = "SoftwareAutomation", log_file: Optional[str] = None):
+    """
+    Centralized logging for the application. Messages take lazy %-style arguments and are only
+    formatted if their level is logged; writing happens in a background listener thread, so worker
+    threads never wait for the console or the log file.
+    """
+
+    def __init__(self, name: str = "SoftwareAutomation", log_file: Optional[str] = None, console: bool = True):
         self.logger = logging.getLogger(name)
         self.logger.setLevel(logging.DEBUG)
-        
+        self.log_file = Path(log_file) if log_file else Path(__file__).parent.parent / "app.log"
+        # Fields added to every record, e.g. the computer name once it is known
+        self.context: Dict[str, Any] = {}
+        self._listener: Optional[logging.handlers.QueueListener] = None
+        self._json_handler: Optional[logging.Handler] = None
+
         # Prevent duplicate handlers
         if not self.logger.handlers:
-            self._setup_handlers(log_file)
-    
-    def _setup_handlers(self, log_file: Optional[str] = None):
-        """Setup logging handlers."""
+            self._setup_handlers(console)
+
+    def _setup_handlers(self, console: bool = True):
+        """Setup logging handlers behind a queue."""
         formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            '%(asctime)s - %(name)s - %(levelname)s - [%(source)s] %(message)s',
             datefmt='%Y-%m-%d %H:%M:%S'
         )
-        
+        handlers = []
+
         # Console handler
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.INFO)
-        console_handler.setFormatter(formatter)
-        self.logger.addHandler(console_handler)
-        
-        # File handler
-        if log_file is None:
-            log_file = Path(__file__).parent.parent / "app.log"
-        
-        file_handler = logging.FileHandler(log_file, encoding='utf-8')
+        if console:
+            console_handler = logging.StreamHandler()
+            console_handler.setLevel(logging.INFO)
+            console_handler.setFormatter(formatter)
+            handlers.append(console_handler)
+
+        # File handler, rotated by size so re-runs do not grow it without limit
+        file_handler = logging.handlers.RotatingFileHandler(
+            self.log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8', delay=True
+        )
         file_handler.setLevel(logging.DEBUG)
         file_handler.setFormatter(formatter)
-        self.logger.addHandler(file_handler)
-    
-    def info(self, message: str, file: str) -> None:
+        handlers.append(file_handler)
+
+        log_queue = queue.SimpleQueue()
+        self.logger.addHandler(_InProcessQueueHandler(log_queue))
+        self._listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        self._listener.start()
+        atexit.register(self.shutdown)
+
+    def enable_json_sink(self, path: Optional[str] = None) -> Path:
+        """Also write every record as a JSON line (default: app.log.jsonl next to app.log), rotated like app.log."""
+        path = Path(path) if path else self.log_file.with_name(self.log_file.name + ".jsonl")
+        if self._json_handler is None and self._listener is not None:
+            handler = logging.handlers.RotatingFileHandler(
+                path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8', delay=True
+            )
+            handler.setLevel(logging.DEBUG)
+            handler.setFormatter(JsonLinesFormatter())
+            self._json_handler = handler
+            self._listener.handlers = self._listener.handlers + (handler,)
+        return path
+
+    def set_context(self, **fields: Any) -> None:
+        """Add fields (e.g. computer=...) to every following record."""
+        self.context = {**self.context, **fields}
+
+    def shutdown(self) -> None:
+        """Write out everything still queued. Called at exit."""
+        if self._listener is not None:
+            listener, self._listener = self._listener, None
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+
+    def _log(self, level: int, message: str, args: tuple, file: str, fields: Dict[str, Any]) -> None:
+        if not self.logger.isEnabledFor(level):
+            return
+        if self.context:
+            fields = {**self.context, **fields}
+        # The caller's file is passed in, so the record is built without Logger.findCaller's stack walk
+        record = self.logger.makeRecord(
+            self.logger.name, level, file, 0, message, args, None, extra={"source": file, "fields": fields}
+        )
+        self.logger.handle(record)
+
+    def info(self, message: str, *args: Any, file: str, **fields: Any) -> None:
         """Log info message."""
-        self.logger.info(f"[{file}] {message}")
-    
-    def debug(self, message: str, file: str) -> None:
+        self._log(logging.INFO, message, args, file, fields)
+
+    def debug(self, message: str, *args: Any, file: str, **fields: Any) -> None:
         """Log debug message."""
-        self.logger.debug(f"[{file}] {message}")
-    
-    def warning(self, message: str, file: str) -> None:
+        self._log(logging.DEBUG, message, args, file, fields)
+
+    def warning(self, message: str, *args: Any, file: str, **fields: Any) -> None:
         """Log warning message."""
-        self.logger.warning(f"[{file}] {message}")
-    
-    def error(self, message: str, file: str) -> None:
+        self._log(logging.WARNING, message, args, file, fields)
+
+    def error(self, message: str, *args: Any, file: str, **fields: Any) -> None:
         """Log error message."""
-        self.logger.error(f"[{file}] {message}")
-    
-    def critical(self, message: str, file: str) -> None:
+        self._log(logging.ERROR, message, args, file, fields)
+
+    def critical(self, message: str, *args: Any, file: str, **fields: Any) -> None:
         """Log critical message."""
-        self.logger.critical(f"[{file}] {message}")
-    
+        self._log(logging.CRITICAL, message, args, file, fields)
+
     def log_startup(self, file: str = Path(__file__).name) -> None:
         """Log application startup."""
-        self.info(f"--- App started at {datetime.now()} ---", file=file)
-    
+        self.info("--- App started at %s ---", datetime.now(), file=file)
+
     def log_mysql_connection(self, status: str, details: str = "", file: str = Path(__file__).name) -> None:
         """Log MySQL connection status."""
         if details:
-            self.info(f"MySQL connection {status}: {details}", file=file)
+            self.info("MySQL connection %s: %s", status, details, file=file)
         else:
-            self.info(f"MySQL connection {status}", file=file)
-    
+            self.info("MySQL connection %s", status, file=file)
+
     def log_task_execution(self, task_name: str, command: str, status: str, details: str = "", file: str = Path(__file__).name) -> None:
         """Log task execution details."""
-        message = f"Task '{task_name}' ({command}): {status}"
-        if details:
-            message += f" - {details}"
-        
+        message = "Task '%s' (%s): %s" + (" - %s" if details else "")
+        args = (task_name, command, status) + ((details,) if details else ())
+
         if status == "success":
-            self.info(message, file=file)
+            self.info(message, *args, file=file, task=task_name)
         elif status == "failure":
-            self.error(message, file=file)
+            self.error(message, *args, file=file, task=task_name)
         else:
-            self.warning(message, file=file)
+            self.warning(message, *args, file=file, task=task_name)
+
+
+def _delay_writes(handler: logging.Handler, seconds: float) -> None:
+    """Make a handler's writes take `seconds` longer, like a slow or scanned disk."""
+    if seconds > 0:
+        emit = handler.emit
+        handler.emit = lambda record: (time.sleep(seconds), emit(record))
+
+
+def benchmark(tasks: int = 2000, write_latency_ms: float = 0.0) -> Dict[str, float]:
+    """
+    Per-task logging cost seen by a worker thread, for the messages a worker logs per task (start,
+    two debug lines, result, completion) plus, for every tenth task, a failed uninstall with its
+    STDOUT/STDERR dump: the old synchronous f-string logger against the queued one, with and without
+    the JSON sink. `write_latency_ms` is added to every file write. Microseconds per task.
+    """
+    # winget output of a failed command, as dumped by the uninstall worker
+    output = "\n".join(f"Found package {i}  Vendor.Package{i}  1.0.{i}" for i in range(60))
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        # What AppLogger used to do: format first, then write to the file in the calling thread
+        sync_logger = logging.getLogger("LoggerBenchmark.sync")
+        sync_logger.setLevel(logging.DEBUG)
+        sync_logger.propagate = False
+        sync_handler = logging.FileHandler(Path(directory) / "sync.log", encoding='utf-8')
+        sync_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        _delay_writes(sync_handler, write_latency_ms / 1000)
+        sync_logger.addHandler(sync_handler)
+        started = time.perf_counter()
+        for i in range(tasks):
+            task_name = f"Task {i}"
+            sync_logger.info(f"[bench.py] Installing {task_name} (installer type: msi)...")
+            sync_logger.debug(f"[bench.py] Installer cache miss for {task_name}")
+            sync_logger.debug(f"[bench.py] Not prefetching {task_name}: installer type msi")
+            sync_logger.info(f"[bench.py] Successfully installed or already present: {task_name}.")
+            sync_logger.info(f"[bench.py] Task '{task_name}' completed with status: success")
+            if i % 10 == 0:
+                sync_logger.error(f"[bench.py] Failed to uninstall {task_name} (winget).\n--- Winget Output ---\nSTDOUT: {output}\nSTDERR: {output}\n---------------------")
+        results["sync"] = (time.perf_counter() - started) / tasks * 1e6
+        sync_handler.close()
+
+        for name, json_sink in (("queued", False), ("queued+json", True)):
+            bench = AppLogger(f"LoggerBenchmark.{name}", log_file=str(Path(directory) / f"{name}.log"), console=False)
+            bench.logger.propagate = False
+            if json_sink:
+                bench.enable_json_sink()
+            for handler in bench._listener.handlers:
+                _delay_writes(handler, write_latency_ms / 1000)
+            bench.set_context(computer="BENCH-PC")
+            started = time.perf_counter()
+            for i in range(tasks):
+                task_name = f"Task {i}"
+                bench.info("Installing %s (installer type: %s)...", task_name, "msi", file="bench.py")
+                bench.debug("Installer cache miss for %s", task_name, file="bench.py")
+                bench.debug("Not prefetching %s: installer type %s", task_name, "msi", file="bench.py")
+                bench.info("Successfully installed or already present: %s.", task_name, file="bench.py")
+                bench.info("Task '%s' completed with status: %s", task_name, "success", file="bench.py", task=task_name, phase="bench")
+                if i % 10 == 0:
+                    bench.error("Failed to uninstall %s (winget).\n--- Winget Output ---\nSTDOUT: %s\nSTDERR: %s\n---------------------", task_name, output, output, file="bench.py")
+            results[name] = (time.perf_counter() - started) / tasks * 1e6
+            # Until everything is written, for comparison with the synchronous total
+            bench.shutdown()
+            results[f"{name} (incl. drain)"] = (time.perf_counter() - started) / tasks * 1e6
+    return results
+
 
 # Global logger instance
 logger = AppLogger()
+
+
+if __name__ == "__main__":
+    # python -m utils.logger [tasks] [write latency in ms]
+    tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    write_latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    for mode, micros in benchmark(tasks, write_latency_ms).items():
+        print(f"{mode:<28} {micros:8.1f} µs per task")
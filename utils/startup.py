@@ -0,0 +1,36 @@
+import sys
+import time
+from typing import List, Optional, Tuple
+
+
+class StartupProfiler:
+    """
+    Records named marks during startup: time since the profiler was created, time since the
+    previous mark and how many modules were imported in between.
+    """
+
+    def __init__(self, started: Optional[float] = None, enabled: bool = False):
+        self.started = started if started is not None else time.perf_counter()
+        self.enabled = enabled
+        self.marks: List[Tuple[str, float, float, int]] = []
+        self._last = self.started
+        self._modules = len(sys.modules)
+
+    def mark(self, name: str) -> float:
+        """Record a mark and return the seconds since startup."""
+        now = time.perf_counter()
+        modules = len(sys.modules)
+        self.marks.append((name, now - self.started, now - self._last, modules - self._modules))
+        self._last, self._modules = now, modules
+        return now - self.started
+
+    def elapsed(self, name: str) -> Optional[float]:
+        """Seconds since startup at the given mark, or None if it was not reached."""
+        return next((at for mark, at, _, _ in self.marks if mark == name), None)
+
+    def report(self, stream=None) -> None:
+        stream = stream or sys.stderr
+        stream.write(f"{'startup step':<40} {'at ms':>9} {'step ms':>9} {'modules':>8}\n")
+        for name, at, step, modules in self.marks:
+            stream.write(f"{name:<40} {at * 1000:9.1f} {step * 1000:9.1f} {modules:8d}\n")
+        stream.flush()